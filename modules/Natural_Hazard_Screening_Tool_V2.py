@@ -55,19 +55,25 @@ def main() -> None:
         if STARTUP_TASKS_ENABLED:
             run_startup_tasks(advanced_settings)
         if DATABASE_CONNECTION_ENABLED:
-            db_engine = connect_to_database(advanced_settings['database_url'])
+            db_engine = connect_to_database(advanced_settings['database_url'], advanced_settings.get('session_profiles'))
         if COLLECT_DATA_ENABLED:
             data_source_manager = collect_primary_data(
                 SOURCE_DATA_PATH,
                 SOURCE_DATA_CONFIG,
                 db_engine,
-                sources_to_collect=basic_settings['sources_to_collect']
+                sources_to_collect=basic_settings['sources_to_collect'],
+                force_collect=basic_settings.get('force_collect'),
+                collection_settings=advanced_settings.get('collection'),
+                prepared_data_config=PREPARED_DATA_CONFIG,
+                intersection_tables_config=INTERSECTION_TABLES_CONFIG
             )
         if PREPARE_DATA_ENABLED:
             data_processing_manager = prepare_data(
                 PREPARED_DATA_CONFIG,
                 db_engine,
-                data_to_prepare=basic_settings['data_to_prepare']
+                data_to_prepare=basic_settings['data_to_prepare'],
+                preparation_settings=advanced_settings.get('preparation'),
+                force_prepare=basic_settings.get('force_prepare')
             )
         if INTERSECTION_TABLES_ENABLED:
             intersection_tables_manager = intersect_data(
@@ -1,6 +1,8 @@
 import logging
-from modules.infrastructure.other_ops.arcgis_operations import ArcGISFeatureLayerQuery, ArcGISOAuth2
-from modules.data_management.sql_utils.sql_ops import validate_geometry
+import os
+from modules.infrastructure.other_ops.arcgis_operations import ArcGISFeatureLayerQuery, ArcGISOAuth2, ArcGISTransport, screening_generalization
+from modules.infrastructure.other_ops.response_cache import ResponseCache
+from modules.data_management.sql_utils.sql_ops import validate_geometry, resolve_load_method
 
 logger = logging.getLogger(__name__)
 
@@ -11,8 +13,23 @@ class method_fl_query:
     Attributes:
         method_configs (dict): Configuration dictionary for the method.
         db_engine (Engine): SQLAlchemy engine connected to the database.
-        batch_size (int): Number of records to fetch in each batch.
-        max_simultaneous_requests (int): Maximum number of simultaneous requests.
+        batch_size (int): Number of records to fetch in each batch. The starting page size when adaptive paging is on.
+        max_simultaneous_requests (int): Maximum number of simultaneous requests. The starting concurrency when adaptive paging is on.
+        load_method (str): How fetched batches are loaded into the database ('copy' or 'executemany').
+        writer_threads (int): Number of database writer threads loading batches while pages are fetched.
+        commit_chunk_size (int): Number of rows each writer inserts between commits.
+        pagination (str): How pages are requested: 'offset', 'objectid_range' or 'objectid_list'.
+        response_cache (ResponseCache): On-disk cache of page responses, or None if caching is not configured.
+        checkpoints (bool): Whether completed pages are checkpointed so an interrupted collection can resume.
+        staging (bool): Whether pages are loaded into a staging table that replaces the source table once complete.
+        adaptive_limits (dict): Limits for adaptive page sizing and concurrency, or None if adaptive paging is off.
+        response_format (str): Format pages are requested in: 'geojson' or 'pbf'.
+        transport (ArcGISTransport): Pooled HTTP transport shared by the source's queries, adding the access token if a client_id is set.
+        decode_processes (int): Number of processes pages are decoded in, or 0 to decode them on the fetching threads.
+        shards (dict): How the layer is split into shards collected in parallel, or None to collect it as one stream.
+        repair (bool or str): Whether an incomplete collection is repaired by ObjectID, or the table column holding the ObjectIDs.
+        generalize (bool): Whether geometries are generalized on the server to the source's screening tolerance.
+        screening_tolerance (float): Distance in meters geometries can be generalized by without changing a screening result, or None.
     """
     def __init__(self, data_source, db_engine, data_sources_folder):
         """
@@ -27,18 +44,197 @@ class method_fl_query:
         self.method_configs = data_source.source_config['method_configs']
         self.query_params = self.method_configs['query_params']
         self.query_params['f'] = 'geojson'
-        if self.method_configs['client_id']:
-            self.query_params['token'] = ArcGISOAuth2(self.method_configs['client_id']).token
+        self.generalize = self.method_configs.get('generalize', True)
+        self.screening_tolerance = data_source.screening_tolerance
+        self._apply_screening_generalization()
         self.table_name = data_source.table_name
         self.table_columns = list(data_source.table_columns.keys())
+        self.table_column_types = dict(data_source.table_columns)
+        self.table_signature = ','.join(f"{name} {column_type}" for name, column_type in data_source.table_columns.items())
         if 'id' in self.table_columns:
             self.table_columns.remove('id')
         self.db_engine = db_engine
-        self.batch_size = 250
-        self.max_simultaneous_requests = 10
+        self.batch_size = self.method_configs.get('batch_size', 250)
+        self.max_simultaneous_requests = self.method_configs.get('max_simultaneous_requests', 10)
+        self.load_method = resolve_load_method(self.method_configs.get('load_method', 'copy'))
+        self.writer_threads = self.method_configs.get('writer_threads', 1)
+        self.commit_chunk_size = self.method_configs.get('commit_chunk_size', 5000)
+        self.pagination = self.method_configs.get('pagination', 'offset')
+        self.response_cache = self._build_response_cache(data_sources_folder)
+        self.checkpoints = self.method_configs.get('checkpoints', True)
+        self.staging = self.method_configs.get('staging', True)
+        self.adaptive_limits = self._build_adaptive_limits()
+        self.shards = self.method_configs.get('shards')
+        self.repair = self.method_configs.get('repair', False)
+        self.response_format = self.method_configs.get('response_format', 'geojson')
+        self.transport = self._build_transport()
+        self.decode_processes = self.method_configs.get('decode_processes', 0)
 
         logger.debug(f"Initialized method_fl_query for data source: {self.name}")
 
+    def _apply_screening_generalization(self):
+        """
+        Sets the query's maxAllowableOffset and geometryPrecision from the source's screening tolerance, replacing
+        the configured values, so the server only returns the vertices that can change a screening result.
+
+        Sources without a screening tolerance, or with generalize set to False, keep the configured query parameters.
+        """
+        if not self.generalize or not self.screening_tolerance:
+            return
+        generalization = screening_generalization(self.screening_tolerance, self.query_params.get('outSR', 4326))
+        if generalization:
+            logger.debug(
+                f"Generalizing {self.name} to a {self.screening_tolerance:.1f} m screening tolerance: maxAllowableOffset "
+                f"{self.query_params.get('maxAllowableOffset')} -> {generalization['maxAllowableOffset']}, geometryPrecision "
+                f"{self.query_params.get('geometryPrecision')} -> {generalization['geometryPrecision']}"
+            )
+            self.query_params.update(generalization)
+
+    def _build_response_cache(self, data_sources_folder):
+        """
+        Builds the response cache from the optional 'cache' method config.
+
+        The config is either True or a dict with 'ttl_hours' (entries older than this are fetched again, default 24)
+        and 'max_size_mb' (total size of the shared cache folder, default 2048). All sources share the
+        response_cache folder under the data sources folder.
+
+        Args:
+            data_sources_folder (str): Path to the folder for storing data if necessary.
+
+        Returns:
+            ResponseCache: The response cache, or None if caching is not configured.
+        """
+        cache_configs = self.method_configs.get('cache')
+        if not cache_configs:
+            return None
+        if not isinstance(cache_configs, dict):
+            cache_configs = {}
+        ttl_hours = cache_configs.get('ttl_hours', 24)
+        return ResponseCache(
+            cache_folder=os.path.join(data_sources_folder, 'response_cache'),
+            ttl_seconds=ttl_hours * 3600 if ttl_hours is not None else None,
+            max_size_bytes=int(cache_configs.get('max_size_mb', 2048) * 1024 ** 2)
+        )
+
+    def _build_adaptive_limits(self):
+        """
+        Builds the adaptive paging limits from the optional 'adaptive' method config.
+
+        Adaptive paging is on unless the config is set to False. The config may be True or a dict with any of
+        min_batch_size, max_batch_size, min_concurrency, max_concurrency, target_page_seconds and max_page_mb.
+
+        Returns:
+            dict: Limits for the AdaptivePageController, or None if adaptive paging is off.
+        """
+        adaptive_configs = self.method_configs.get('adaptive', True)
+        if not adaptive_configs:
+            return None
+        if not isinstance(adaptive_configs, dict):
+            adaptive_configs = {}
+        limits = {
+            key: adaptive_configs[key]
+            for key in ('min_batch_size', 'max_batch_size', 'min_concurrency', 'max_concurrency', 'target_page_seconds')
+            if key in adaptive_configs
+        }
+        if 'max_page_mb' in adaptive_configs:
+            limits['max_page_bytes'] = int(adaptive_configs['max_page_mb'] * 1024 ** 2)
+        return limits
+
+    def _build_transport(self):
+        """
+        Builds the HTTP transport from the optional 'retries' and 'timeout' method configs.
+
+        'retries' is a dict with 'max_attempts' (default 5), 'backoff_base' (ceiling of the first retry delay in
+        seconds, default 2) and 'backoff_max' (largest retry delay in seconds, default 60). The connection pool is
+        sized to the largest number of concurrent requests the source can make, across all of its shards.
+
+        Returns:
+            ArcGISTransport: The transport.
+        """
+        retry_configs = self.method_configs.get('retries') or {}
+        pool_size = self.max_simultaneous_requests
+        if self.adaptive_limits is not None:
+            pool_size = max(pool_size, self.adaptive_limits.get('max_concurrency', 16))
+        if self.shards:
+            pool_size *= max(1, int(self.shards.get('parallel', 4)))
+        client_id = self.method_configs.get('client_id')
+        return ArcGISTransport(
+            pool_size=pool_size + 2,
+            auth=ArcGISOAuth2(client_id) if client_id else None,
+            max_attempts=retry_configs.get('max_attempts', 5),
+            backoff_base=retry_configs.get('backoff_base', 2.0),
+            backoff_max=retry_configs.get('backoff_max', 60.0),
+            timeout=self.method_configs.get('timeout', 300)
+        )
+
+    def _build_query(self):
+        """
+        Builds the ArcGIS Feature Layer query for this data source.
+
+        Returns:
+            ArcGISFeatureLayerQuery: Query configured from the method configs.
+        """
+        return ArcGISFeatureLayerQuery(
+            url=self.method_configs['query_url'],
+            query_params=self.query_params,
+            table_name=self.table_name,
+            table_columns=self.table_columns,
+            db_engine=self.db_engine,
+            batch_size=self.batch_size,
+            max_simultaneous_requests=self.max_simultaneous_requests,
+            load_method=self.load_method,
+            writer_threads=self.writer_threads,
+            commit_chunk_size=self.commit_chunk_size,
+            pagination=self.pagination,
+            response_cache=self.response_cache,
+            checkpoints=self.checkpoints,
+            table_signature=self.table_signature,
+            adaptive_limits=self.adaptive_limits,
+            response_format=self.response_format,
+            transport=self.transport,
+            staging_columns=self.table_column_types if self.staging else None,
+            decode_processes=self.decode_processes,
+            shards=self.shards,
+            repair=self.repair
+        )
+
+    def get_source_fingerprint(self):
+        """
+        Reads the hosted layer's last edit date and feature count, used to skip collection when nothing has changed.
+
+        Returns:
+            dict: Fingerprint with 'last_edit_date' and 'feature_count', or None if it could not be read.
+        """
+        try:
+            fingerprint = self._build_query().get_source_fingerprint()
+            logger.debug(f"Source fingerprint for {self.name}: {fingerprint}")
+            return fingerprint
+        except Exception as e:
+            logger.warning(f"Failed to read source fingerprint for data source {self.name}: {e}")
+            return None
+
+    def uses_staging_table(self):
+        """
+        Checks whether this source loads into a staging table, in which case its table must not be recreated before collection.
+
+        Returns:
+            bool: True if the collection builds the table itself and swaps it in once complete.
+        """
+        return self.staging
+
+    def can_resume(self):
+        """
+        Checks whether an interrupted collection of this source can resume into its existing table.
+
+        Returns:
+            bool: True if the table should be kept and the collection resumed, False if it should be rebuilt.
+        """
+        try:
+            return self.checkpoints and self._build_query().can_resume()
+        except Exception as e:
+            logger.warning(f"Failed to check for resumable collection for data source {self.name}: {e}")
+            return False
+
     def collect_data(self):
         """
         Runs the ArcGIS Feature Layer query with the given parameters.
@@ -48,15 +244,7 @@ class method_fl_query:
         """
         logger.debug(f"Starting data collection for data source: {self.name}")
         try:
-            arcgis_query = ArcGISFeatureLayerQuery(
-                url=self.method_configs['query_url'], 
-                query_params=self.query_params, 
-                table_name=self.table_name,
-                table_columns=self.table_columns,
-                db_engine=self.db_engine,
-                batch_size=self.batch_size,
-                max_simultaneous_requests=self.max_simultaneous_requests
-            )
+            arcgis_query = self._build_query()
             success = arcgis_query.fetch_data()
             #logger.debug(f"Data collection successful for data source: {self.name}")
 
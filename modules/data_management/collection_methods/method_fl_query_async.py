@@ -0,0 +1,65 @@
+import logging
+from modules.data_management.collection_methods.method_fl_query import method_fl_query
+from modules.infrastructure.other_ops.arcgis_async_operations import AsyncArcGISFeatureLayerQuery
+
+logger = logging.getLogger(__name__)
+
+class method_fl_query_async(method_fl_query):
+    """
+    Class to run an ArcGIS Feature Layer query with asyncio instead of a thread pool.
+
+    Uses the same method_configs as method_fl_query. Requests run on a single event loop, so
+    max_concurrent_requests can be set in the hundreds without starting a thread per request.
+
+    Attributes:
+        max_concurrent_requests (int): Maximum number of requests in flight at once.
+    """
+    def __init__(self, data_source, db_engine, data_sources_folder):
+        """
+        Initializes the method_fl_query_async class with the given configurations and database engine.
+
+        Args:
+            data_source (DataSource): DataSource instance containing the configuration.
+            db_engine (Engine): SQLAlchemy engine connected to the database.
+            data_sources_folder (str): Path to the folder for storing data if necessary.
+        """
+        super().__init__(data_source, db_engine, data_sources_folder)
+        self.max_concurrent_requests = self.method_configs.get('max_concurrent_requests', 100)
+        # The async collector does not write checkpoints, so it always rebuilds the table
+        self.checkpoints = False
+        # nor load into a staging table, so it truncates and reloads the source table in place
+        self.staging = False
+        if self.shards:
+            logger.warning(f"Data source {self.name} is configured with shards, which the async collector does not use; collecting it as one stream")
+
+        logger.debug(f"Initialized method_fl_query_async for data source: {self.name}")
+
+    def collect_data(self):
+        """
+        Runs the ArcGIS Feature Layer query with the given parameters on an asyncio event loop.
+
+        Returns:
+            bool: True if the query is successful, False otherwise.
+        """
+        logger.debug(f"Starting async data collection for data source: {self.name}")
+        try:
+            arcgis_query = AsyncArcGISFeatureLayerQuery(
+                url=self.method_configs['query_url'],
+                query_params=self.query_params,
+                table_name=self.table_name,
+                table_columns=self.table_columns,
+                db_engine=self.db_engine,
+                batch_size=self.batch_size,
+                max_concurrent_requests=self.max_concurrent_requests,
+                load_method=self.load_method,
+                writer_threads=self.writer_threads,
+                commit_chunk_size=self.commit_chunk_size,
+                response_cache=self.response_cache,
+                transport=self.transport,
+                decode_processes=self.decode_processes
+            )
+            return arcgis_query.fetch_data()
+
+        except Exception as e:
+            logger.error(f"Failed to run async ArcGIS Feature Layer query for data source {self.name}: {e}")
+            return False
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from modules.infrastructure.other_ops.vector_file_operations import VectorFileReader, build_geometry_transform
+from modules.data_management.sql_utils.sql_copy_encoders import ArrowRowEncoder
+from modules.data_management.sql_utils.sql_writers import DatabaseWriterPool
+from modules.data_management.sql_utils.sql_ops import (
+    create_staging_table,
+    create_spatial_indexes,
+    swap_in_staging_table,
+    drop_table,
+    get_table_row_count,
+    resolve_load_method
+)
+
+logger = logging.getLogger(__name__)
+
+class method_local_file:
+    """
+    Class to load a local vector file, such as a national file geodatabase, GeoPackage or GeoParquet file, into the source table.
+
+    The layer is read in record batches through GDAL's Arrow stream, each batch is encoded column by column into
+    binary COPY tuples and the tuples are loaded by database writer threads while the next batch is read.
+
+    Attributes:
+        method_configs (dict): Configuration dictionary for the method.
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        file_path (str): Path of the file, relative paths being resolved against the data sources folder.
+        layer (str): Name or index of the layer to load, or None for the first layer.
+        where (str): Attribute filter applied while reading, in the OGR SQL dialect, or None.
+        bbox (list): (xmin, ymin, xmax, ymax) filter applied while reading, in the layer's coordinate system, or None.
+        field_map (dict): Source field read into each table column whose name differs from its field.
+        batch_size (int): Number of features read and encoded at a time.
+        load_method (str): How batches are loaded into the database ('binary', 'copy' or 'executemany').
+        writer_threads (int): Number of database writer threads loading batches while the file is read.
+        commit_chunk_size (int): Number of rows each writer inserts between commits.
+        staging (bool): Whether the file is loaded into a staging table that replaces the source table once complete.
+    """
+    def __init__(self, data_source, db_engine, data_sources_folder):
+        """
+        Initializes the method_local_file class with the given configurations and database engine.
+
+        Args:
+            data_source (DataSource): DataSource instance containing the configuration.
+            db_engine (Engine): SQLAlchemy engine connected to the database.
+            data_sources_folder (str): Path to the folder relative file paths are resolved against.
+        """
+        self.name = data_source.name
+        self.method_configs = data_source.source_config['method_configs']
+        self.table_name = data_source.table_name
+        self.table_column_types = dict(data_source.table_columns)
+        self.db_engine = db_engine
+        self.file_path = os.path.join(data_sources_folder, self.method_configs['file_path'])
+        self.layer = self.method_configs.get('layer')
+        self.where = self.method_configs.get('where')
+        self.bbox = self.method_configs.get('bbox')
+        self.field_map = self.method_configs.get('field_map') or {}
+        self.batch_size = self.method_configs.get('batch_size', 65536)
+        self.load_method = resolve_load_method(self.method_configs.get('load_method', 'binary'))
+        self.writer_threads = self.method_configs.get('writer_threads', 2)
+        self.commit_chunk_size = self.method_configs.get('commit_chunk_size', 100000)
+        self.staging = self.method_configs.get('staging', True)
+        self.load_table = f"{self.table_name}__staging" if self.staging else self.table_name
+
+        logger.debug(f"Initialized method_local_file for data source: {self.name}")
+
+    def _build_reader(self):
+        """
+        Builds the reader for the configured layer and filters.
+
+        Returns:
+            VectorFileReader: Reader of the layer.
+        """
+        return VectorFileReader(self.file_path, layer=self.layer, where=self.where, bbox=self.bbox, batch_size=self.batch_size)
+
+    def get_source_fingerprint(self):
+        """
+        Reads the file's modification time and the layer's feature count, used to skip collection when nothing has changed.
+
+        The fingerprint's config_hash covers the reader's file, layer and filters, the field map and the table's
+        column types, so a source read with other settings is not treated as unchanged.
+
+        Returns:
+            dict: Fingerprint with 'last_edit_date', 'feature_count' and 'config_hash', or None if it could not be read.
+        """
+        try:
+            fingerprint = self._build_reader().fingerprint()
+            config = [fingerprint['config_hash'], self.field_map, self.table_column_types]
+            fingerprint['config_hash'] = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            logger.debug(f"Source fingerprint for {self.name}: {fingerprint}")
+            return fingerprint
+        except Exception as e:
+            logger.warning(f"Failed to read source fingerprint for data source {self.name}: {e}")
+            return None
+
+    def uses_staging_table(self):
+        """
+        Checks whether this source loads into a staging table, in which case its table must not be recreated before collection.
+
+        Returns:
+            bool: True if the collection builds the table itself and swaps it in once complete.
+        """
+        return self.staging
+
+    def collect_data(self):
+        """
+        Loads the configured layer of the file into the source table.
+
+        Returns:
+            bool: True if every feature read was loaded, False otherwise.
+        """
+        logger.debug(f"Starting data collection for data source: {self.name}")
+        try:
+            if self.staging and not create_staging_table(self.db_engine, self.load_table, self.table_column_types):
+                return False
+            rows_read = self._load_file()
+            if rows_read is None:
+                return False
+            return self._finish_load(rows_read)
+        except Exception as e:
+            logger.error(f"Failed to load file {self.file_path} for data source {self.name}: {e}")
+            return False
+
+    def _map_fields(self, source_fields, geometry_field):
+        """
+        Matches each table column to the source field it is filled from.
+
+        Columns listed in field_map use the field given there. Geometry and geography columns use the layer's
+        geometry. Every other column uses the field with the same name, compared case-insensitively.
+
+        Args:
+            source_fields (list): Names of the layer's attribute fields.
+            geometry_field (str): Name of the geometry field in the record batches.
+
+        Returns:
+            dict: Source field name for each table column other than 'id'.
+
+        Raises:
+            ValueError: If a column has no matching field.
+        """
+        fields_by_name = {field.lower(): field for field in source_fields}
+        mapping = {}
+        missing = []
+        for column_name, column_type in self.table_column_types.items():
+            if column_name == 'id':
+                continue
+            if column_name in self.field_map:
+                mapping[column_name] = self.field_map[column_name]
+            elif str(column_type).strip().lower().startswith(('geometry', 'geography')):
+                mapping[column_name] = geometry_field
+            elif column_name.lower() in fields_by_name:
+                mapping[column_name] = fields_by_name[column_name.lower()]
+            else:
+                missing.append(column_name)
+        if missing:
+            raise ValueError(f"No field in {self.file_path} for columns {', '.join(missing)}; map them with field_map")
+        return mapping
+
+    def _load_file(self):
+        """
+        Streams the layer into the load table through the database writer pool.
+
+        Returns:
+            int: Number of features read, or None if loading failed.
+        """
+        reader = self._build_reader()
+        info = reader.info()
+        geometry_field = info.get('geometry_name') or 'wkb_geometry'
+        source_fields = self._map_fields(list(info['fields']), geometry_field)
+        attribute_fields = sorted({field for field in source_fields.values() if field != geometry_field})
+
+        with reader.open(columns=attribute_fields) as (meta, batches):
+            source_fields = {
+                column_name: meta['geometry_field'] if field == geometry_field else field
+                for column_name, field in source_fields.items()
+            }
+            encoder = ArrowRowEncoder(self.table_column_types, source_fields)
+            target_srid = next(iter(encoder.geometry_columns.values()), None)
+            encoder.geometry_transform = build_geometry_transform(meta.get('crs'), target_srid)
+            load_method = self.load_method
+            if load_method == 'binary' and not encoder.supports_binary:
+                logger.warning(f"Table {self.table_name} has columns without a binary COPY encoding; loading with text COPY")
+                load_method = 'copy'
+
+            writer_pool = DatabaseWriterPool(
+                db_engine=self.db_engine,
+                table_name=self.load_table,
+                columns=encoder.columns,
+                num_writers=self.writer_threads,
+                commit_chunk_size=self.commit_chunk_size,
+                load_method=load_method
+            )
+            start_time = time.perf_counter()
+            rows_read = 0
+            writer_pool.start()
+            try:
+                for batch in batches:
+                    batch_start = time.perf_counter()
+                    rows = encoder.encode(batch, load_method)
+                    writer_pool.stats.add(pages_fetched=1, fetch_seconds=time.perf_counter() - batch_start)
+                    writer_pool.put(rows)
+                    rows_read += batch.num_rows
+                    logger.debug(f"Read {rows_read} features from {self.file_path}")
+            finally:
+                written = writer_pool.close()
+
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"Pipeline summary for {self.table_name}: {writer_pool.stats.summary(elapsed, 1, writer_pool.num_writers)}")
+        if not written:
+            return None
+        return rows_read
+
+    def _finish_load(self, rows_read):
+        """
+        Verifies the load table against the number of features read and swaps a staging table in for the source table.
+
+        If the counts differ the staging table is dropped and the source table is left as it was.
+
+        Args:
+            rows_read (int): Number of features read from the file.
+
+        Returns:
+            bool: True if the load table holds every feature read and is in place, False otherwise.
+        """
+        table_count = get_table_row_count(self.db_engine, self.load_table)
+        if table_count != rows_read:
+            logger.error(f"Table {self.load_table} has {table_count} rows but {rows_read} features were read; loaded rows discarded")
+            if self.staging:
+                drop_table(self.db_engine, self.load_table)
+            return False
+        if self.staging:
+            if not create_spatial_indexes(self.db_engine, self.load_table, self.table_column_types):
+                return False
+            if not swap_in_staging_table(self.db_engine, self.load_table, self.table_name):
+                return False
+        logger.info(f"Loaded {rows_read} features from {self.file_path} into {self.table_name}")
+        return True
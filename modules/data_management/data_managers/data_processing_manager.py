@@ -4,20 +4,58 @@ data_processing_manager.py
 Manages the processing of primary data tables by executing SQL actions defined in configuration files.
 """
 
+import hashlib
+import json
 import logging
-from typing import Dict, Any, Optional, List
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, List, Set
 from sqlalchemy.engine import Engine
-from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from modules.infrastructure.other_ops.file_operations import read_yaml_file
+from modules.data_management.sql_utils.sql_script_runner import SqlScriptRunner, StatementResult
+from modules.data_management.sql_utils.sql_spatial_ops import subdivision_sql
+from modules.data_management.sql_utils.sql_geometry_validation import GeometryValidator
+from modules.data_management.sql_utils.sql_ops import (
+    table_exists,
+    get_table_state,
+    get_preparation_catalog_entry,
+    record_preparation_catalog_entry,
+    delete_preparation_catalog_entry
+)
 
 logger = logging.getLogger(__name__)
 
+_READ_TABLE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][\w.]*)', re.IGNORECASE)
+_CREATED_TABLE = re.compile(r'\bCREATE\s+(?:TEMP(?:ORARY)?\s+|UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([A-Za-z_][\w.]*)', re.IGNORECASE)
+
 class PreparedData:
     """
     Holds information about each prepared data table and executes SQL actions.
+
+    Attributes:
+        table_name (str): Name of the prepared data table.
+        sql_actions (str): SQL actions to be executed for this table.
+        validate (Dict[str, Any]): Settings of the geometry validation run after the SQL actions, or None.
+        validator (GeometryValidator): Validator repairing the table's invalid geometries, or None.
+        subdivide (Dict[str, Any]): Settings of the subdivision of large polygons run after the validation, or None.
+        subdivision_script (str): SQL of the subdivision stage, or None.
+        depends_on (List[str]): Prepared tables listed in the configuration as built before this one.
+        explain_threshold_seconds (float): Statements slower than this have their EXPLAIN (ANALYZE, BUFFERS) plan logged, or None.
+        elapsed_seconds (float): Time taken by the last execution of the SQL actions, or None if not executed.
+        statement_results (List[StatementResult]): Time taken and rows affected by each statement of the last execution.
     """
-    def __init__(self, table_name: str, sql_actions: str, db_engine: Engine) -> None:
+    def __init__(
+        self,
+        table_name: str,
+        sql_actions: str,
+        db_engine: Engine,
+        depends_on: Optional[List[str]] = None,
+        explain_threshold_seconds: Optional[float] = None,
+        subdivide: Optional[Dict[str, Any]] = None,
+        validate: Optional[Dict[str, Any]] = None
+    ) -> None:
         """
         Initialize the PreparedData object.
 
@@ -25,49 +63,138 @@ class PreparedData:
             table_name (str): Name of the prepared data table.
             sql_actions (str): SQL actions to be executed for this table.
             db_engine (Engine): SQLAlchemy database engine.
+            depends_on (Optional[List[str]]): Prepared tables that must be built before this one.
+            explain_threshold_seconds (Optional[float]): Statements slower than this have their plan logged.
+                If None, statements are run without EXPLAIN.
+            subdivide (Optional[Dict[str, Any]]): Settings of subdivision_sql (geometry_column, max_vertices,
+                id_column, feature_id_column) to split large polygons after the SQL actions. None to not subdivide.
+            validate (Optional[Dict[str, Any]]): Settings of GeometryValidator (geometry_column, id_column, repair,
+                chunk_size, max_workers) to repair invalid geometries after the SQL actions. None to not validate.
+
+        Raises:
+            ValueError: If the subdivision or validation settings are invalid.
         """
         self.table_name: str = table_name
         self.sql_actions: str = sql_actions
         self.db_engine: Engine = db_engine
+        self.validate: Optional[Dict[str, Any]] = validate
+        self.validator: Optional[GeometryValidator] = None
+        if validate is not None:
+            self.validator = GeometryValidator(db_engine, table_name, **validate)
+        self.subdivide: Optional[Dict[str, Any]] = subdivide
+        self.subdivision_script: Optional[str] = None
+        if subdivide is not None:
+            self.subdivision_script = subdivision_sql(table_name, **subdivide)
+        self.depends_on: List[str] = list(depends_on or [])
+        self.explain_threshold_seconds: Optional[float] = explain_threshold_seconds
+        self.elapsed_seconds: Optional[float] = None
+        self.statement_results: List[StatementResult] = []
+
+    def references(self, table_name: str) -> bool:
+        """
+        Check whether the SQL actions mention a table.
+
+        Args:
+            table_name (str): Name of the table.
+
+        Returns:
+            bool: True if the table name appears as a whole word in the SQL actions.
+        """
+        return re.search(rf'(?<![\w.]){re.escape(table_name)}(?!\w)', self.sql_actions, re.IGNORECASE) is not None
+
+    def source_tables(self) -> List[str]:
+        """
+        Find the tables the SQL actions read from: those named after FROM or JOIN, and the tables listed in
+        depends_on, other than this table and the tables the SQL actions create.
+
+        Returns:
+            List[str]: Sorted names of the source tables.
+        """
+        created = {name.lower() for name in _CREATED_TABLE.findall(self.sql_actions)}
+        created.add(self.table_name.lower())
+        read = {name.lower() for name in _READ_TABLE.findall(self.sql_actions)}
+        read.update(name.lower() for name in self.depends_on)
+        return sorted(read - created)
+
+    def fingerprint(self) -> str:
+        """
+        Build a fingerprint of the SQL actions, the validation and subdivision stages and the current contents of the source tables.
+
+        Returns:
+            str: SHA-256 hash of the SQL actions, the stage settings and the state of each source table.
+        """
+        stages = json.dumps([self.sql_actions, self.validate, self.subdivision_script], sort_keys=True)
+        state = {
+            'sql': hashlib.sha256(stages.encode('utf-8')).hexdigest(),
+            'sources': {table_name: get_table_state(self.db_engine, table_name) for table_name in self.source_tables()}
+        }
+        return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
 
     def execute_sql(self) -> bool:
         """
         Execute the SQL actions using the provided database engine.
 
+        The statements are run in one transaction, and the time taken and rows affected by each are kept. Once
+        they are committed, invalid geometries are repaired in committed chunks if validation is configured, and
+        large polygons are then subdivided in a transaction of their own if subdivision is configured.
+
         Returns:
-            bool: True if all SQL actions executed successfully, False otherwise.
-        """
-        try:
-            with self.db_engine.connect() as connection:
-                trans = connection.begin()
-                try:
-                    for sql_action in self.sql_actions.split('\n'):
-                        if sql_action.strip():
-                            logger.debug(f"Executing SQL for {self.table_name}: {sql_action.strip()}")
-                            connection.execute(text(sql_action.strip()))
-                    trans.commit()
-                    return True
-                except SQLAlchemyError as e:
-                    trans.rollback()
-                    logger.error(f"Error executing SQL for {self.table_name}: {e}")
-        except SQLAlchemyError as e:
-            logger.error(f"Error connecting to the database for {self.table_name}: {e}")
-        return False
+            bool: True if all SQL actions and stages executed successfully, False otherwise.
+        """
+        runner = SqlScriptRunner(self.db_engine, self.explain_threshold_seconds)
+        start_time = time.perf_counter()
+        success = runner.run(self.sql_actions, self.table_name)
+        self.statement_results = list(runner.results)
+        if success and self.validator is not None:
+            success = self.validator.validate() is not None
+        if success and self.subdivision_script is not None:
+            success = runner.run(self.subdivision_script, f"{self.table_name} subdivision")
+            self.statement_results.extend(runner.results)
+        self.elapsed_seconds = time.perf_counter() - start_time
+        if success and self.statement_results:
+            slowest = max(self.statement_results, key=lambda result: result.seconds)
+            logger.info(f"Slowest SQL for {self.table_name} was {slowest.describe()}")
+        return success
 
 class DataProcessingManager:
     """
     Manages the processing of primary data and prepares it for further processing.
+
+    A prepared table is built after the prepared tables its SQL actions mention and those listed in its depends_on
+    configuration. Tables that do not depend on each other are built at the same time, each on its own connection,
+    up to max_parallel_preparations at once.
+
+    A table is skipped when it exists and neither its SQL actions nor the contents of its source tables have
+    changed since it was last built, as recorded in the preparation catalog.
+
+    Attributes:
+        max_parallel_preparations (int): Maximum number of prepared tables built at once.
+        explain_threshold_seconds (float): Statements slower than this have their EXPLAIN (ANALYZE, BUFFERS) plan logged, or None.
+        validation_defaults (Dict[str, Any]): Chunk size and number of connections of geometry validations not setting their own.
+        skipped_tables (List[str]): Tables skipped as unchanged by the last call to prepare_data.
     """
-    def __init__(self, prepared_data_config_path: str, db_engine: Engine) -> None:
+    def __init__(self, prepared_data_config_path: str, db_engine: Engine, preparation_settings: Optional[Dict[str, Any]] = None) -> None:
         """
         Initialize the DataProcessingManager object.
 
         Args:
             prepared_data_config_path (str): Path to the YAML configuration file for processed data.
             db_engine (Engine): SQLAlchemy database engine.
+            preparation_settings (Optional[Dict[str, Any]]): Preparation settings: max_parallel_preparations,
+                explain_slower_than_seconds, validation_chunk_size and validation_workers.
         """
         self.prepared_data_config_path: str = prepared_data_config_path
         self.db_engine: Engine = db_engine
+        preparation_settings = preparation_settings or {}
+        self.max_parallel_preparations: int = max(1, int(preparation_settings.get('max_parallel_preparations') or 1))
+        explain_threshold = preparation_settings.get('explain_slower_than_seconds')
+        self.explain_threshold_seconds: Optional[float] = None if explain_threshold is None else float(explain_threshold)
+        self.validation_defaults: Dict[str, Any] = {
+            name: preparation_settings[setting]
+            for name, setting in (('chunk_size', 'validation_chunk_size'), ('max_workers', 'validation_workers'))
+            if preparation_settings.get(setting)
+        }
+        self.skipped_tables: List[str] = []
         self.prepared_data_config: Dict[str, Any] = self.load_prepared_data_configs()
         self.processed_sources: Dict[str, PreparedData] = self.create_processed_sources()
 
@@ -79,14 +206,42 @@ class DataProcessingManager:
     def create_processed_sources(self) -> Dict[str, PreparedData]:
         processed_sources: Dict[str, PreparedData] = {}
         logger.info("Creating processed sources")
-        for table_name, sql_actions in self.prepared_data_config.items():
+        for table_name, table_config in self.prepared_data_config.items():
             try:
-                processed_sources[table_name] = PreparedData(table_name, sql_actions, self.db_engine)
+                if isinstance(table_config, dict):
+                    sql_actions = table_config['sql']
+                    depends_on = table_config.get('depends_on')
+                    subdivide = self._stage_settings(table_config.get('subdivide'))
+                    validate = self._stage_settings(table_config.get('validate'), self.validation_defaults)
+                else:
+                    sql_actions, depends_on, subdivide, validate = table_config, None, None, None
+                processed_sources[table_name] = PreparedData(
+                    table_name, sql_actions, self.db_engine, depends_on, self.explain_threshold_seconds, subdivide, validate
+                )
                 logger.debug(f"Created PreparedData object for {table_name}")
             except Exception as e:
                 logger.error(f"Failed to create PreparedData object for {table_name}: {e}")
         return processed_sources
 
+    @staticmethod
+    def _stage_settings(stage_config: Any, defaults: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read the settings of an optional preparation stage, given as True, False or a mapping of settings.
+
+        Args:
+            stage_config (Any): Configured value of the stage.
+            defaults (Optional[Dict[str, Any]]): Settings used where the configuration does not give them.
+
+        Returns:
+            Optional[Dict[str, Any]]: Settings of the stage, or None if the stage is not configured.
+        """
+        if stage_config is None or stage_config is False:
+            return None
+        settings = dict(defaults or {})
+        if isinstance(stage_config, dict):
+            settings.update(stage_config)
+        return settings
+
     def _determine_prepared_data_names(self, processed_data_names: Optional[List[str]]) -> List[str]:
         """
         Determine which processed data should be prepared.
@@ -104,29 +259,179 @@ class DataProcessingManager:
             return list(self.processed_sources.keys())
         return [name for name in processed_data_names if name in self.processed_sources]
 
-    def prepare_data(self, processed_data_names: Optional[List[str]] = None) -> None:
+    def _determine_dependencies(self, names_to_prepare: List[str]) -> Dict[str, Set[str]]:
+        """
+        Determine which of the tables being prepared each one must wait for.
+
+        A table depends on the tables in its depends_on list and on every other prepared table its SQL actions
+        mention. Dependencies that are not being prepared in this run are assumed to exist already.
+
+        Args:
+            names_to_prepare (List[str]): Names of the tables being prepared.
+
+        Returns:
+            Dict[str, Set[str]]: Names of the tables each table waits for, by table name.
+        """
+        dependencies: Dict[str, Set[str]] = {}
+        for table_name in names_to_prepare:
+            prepared_data = self.processed_sources[table_name]
+            for name in prepared_data.depends_on:
+                if name not in self.processed_sources:
+                    logger.warning(f"Dependency {name} of {table_name} is not a prepared data table; ignoring it")
+            dependencies[table_name] = {
+                name for name in names_to_prepare
+                if name != table_name and (name in prepared_data.depends_on or prepared_data.references(name))
+            }
+            if dependencies[table_name]:
+                logger.debug(f"{table_name} is prepared after {', '.join(sorted(dependencies[table_name]))}")
+        return dependencies
+
+    def prepare_data(self, processed_data_names: Optional[List[str]] = None, force_names: Optional[List[str]] = None) -> None:
         """
         Execute the SQL actions for the specified processed data names.
 
+        Tables are built in dependency order, with independent tables built at once on separate connections
+        up to max_parallel_preparations. The time saved over building them one after another is logged.
+        Tables whose SQL actions and source tables are unchanged since they were last built are skipped.
+
         Args:
             processed_data_names (Optional[List[str]]): Names of the processed data to run.
                 If None, no data will be prepared.
                 If 'prepare_all' is in the list, all PreparedData objects will be prepared.
                 Otherwise, only the specified names will be prepared.
+            force_names (Optional[List[str]]): Names of the processed data to rebuild even if unchanged.
+                'force_all' forces every table.
         """
         names_to_prepare = self._determine_prepared_data_names(processed_data_names)
         logger.info(f"Preparing the following data: {names_to_prepare}")
 
-        for table_name in names_to_prepare:
-            prepared_data = self.processed_sources[table_name]
-            success = prepared_data.execute_sql()
-            if success:
-                logger.info(f"Prepared data successfully: {table_name}")
-            else:
-                logger.error(f"Failed to prepare data: {table_name}")
+        if names_to_prepare:
+            dependencies = self._determine_dependencies(names_to_prepare)
+            num_workers = min(self.max_parallel_preparations, len(names_to_prepare))
+            start_time = time.perf_counter()
+            self.skipped_tables = []
+            results = self._run_preparations(names_to_prepare, dependencies, num_workers, force_names or [])
+            elapsed = time.perf_counter() - start_time
+            for table_name in names_to_prepare:
+                if table_name in self.skipped_tables:
+                    logger.info(f"Prepared data unchanged since last built, skipped: {table_name}")
+                elif results.get(table_name):
+                    logger.info(f"Prepared data successfully: {table_name}")
+                else:
+                    logger.error(f"Failed to prepare data: {table_name}")
+            self._log_preparation_timing(names_to_prepare, elapsed, num_workers)
 
         # Log any names requested but not found
         if processed_data_names is not None and 'prepare_all' not in processed_data_names:
             not_found = [name for name in processed_data_names if name not in self.processed_sources]
             for name in not_found:
-                logger.warning(f"Processed data table name {name} not found in processed sources configuration")
\ No newline at end of file
+                logger.warning(f"Processed data table name {name} not found in processed sources configuration")
+
+    def _prepare_table(self, table_name: str, forced: bool) -> bool:
+        """
+        Build a prepared table, unless it exists and its fingerprint matches the one recorded when it was last built.
+
+        The fingerprint is only computed when it is used: before building to check whether the table is unchanged,
+        or, for a forced build, once the table has been built.
+
+        Args:
+            table_name (str): Name of the prepared table.
+            forced (bool): Whether to build the table even if unchanged.
+
+        Returns:
+            bool: True if the table was built or skipped as unchanged, False otherwise.
+        """
+        prepared_data = self.processed_sources[table_name]
+        fingerprint = None
+        if not forced:
+            try:
+                fingerprint = prepared_data.fingerprint()
+                entry = get_preparation_catalog_entry(self.db_engine, table_name)
+                if entry and entry['fingerprint'] == fingerprint and table_exists(self.db_engine, table_name):
+                    self.skipped_tables.append(table_name)
+                    return True
+            except SQLAlchemyError as e:
+                logger.warning(f"Could not check whether {table_name} is unchanged; preparing it: {e}")
+
+        # The table no longer matches the catalog until this preparation succeeds
+        delete_preparation_catalog_entry(self.db_engine, table_name)
+        if not prepared_data.execute_sql():
+            return False
+        record_preparation_catalog_entry(self.db_engine, table_name, fingerprint or prepared_data.fingerprint())
+        return True
+
+    def _run_preparations(self, names_to_prepare: List[str], dependencies: Dict[str, Set[str]], num_workers: int, force_names: List[str]) -> Dict[str, bool]:
+        """
+        Build the prepared tables on a pool of worker threads, starting each once the tables it depends on are built.
+
+        Tables are started in the order given whenever a worker is free and their dependencies have succeeded.
+        Tables depending on a table that failed, or on a dependency cycle, are not built.
+
+        Args:
+            names_to_prepare (List[str]): Names of the tables to prepare, in order.
+            dependencies (Dict[str, Set[str]]): Names of the tables each table waits for.
+            num_workers (int): Maximum number of tables built at once.
+            force_names (List[str]): Names of the tables to build even if unchanged. 'force_all' forces every table.
+
+        Returns:
+            Dict[str, bool]: Whether each table was prepared or skipped as unchanged, by table name.
+        """
+        results: Dict[str, bool] = {}
+        pending = list(names_to_prepare)
+        running = {}
+        if num_workers > 1:
+            logger.info(f"Preparing up to {num_workers} tables at once")
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='data_preparer') as executor:
+            while pending or running:
+                for table_name in list(pending):
+                    failed = [name for name in dependencies[table_name] if results.get(name) is False]
+                    if failed:
+                        logger.error(f"Skipping {table_name} because {', '.join(sorted(failed))} could not be prepared")
+                        results[table_name] = False
+                        pending.remove(table_name)
+                    elif len(running) < num_workers and all(results.get(name) for name in dependencies[table_name]):
+                        logger.debug(f"Preparing {table_name}")
+                        forced = 'force_all' in force_names or table_name in force_names
+                        running[executor.submit(self._prepare_table, table_name, forced)] = table_name
+                        pending.remove(table_name)
+                if not running:
+                    if pending:
+                        logger.error(f"Dependency cycle between prepared tables {', '.join(pending)}; they will not be prepared")
+                        results.update({table_name: False for table_name in pending})
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table_name = running.pop(future)
+                    try:
+                        results[table_name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error preparing {table_name}: {e}")
+                        results[table_name] = False
+        return results
+
+    def _log_preparation_timing(self, names_to_prepare: List[str], elapsed: float, num_workers: int) -> None:
+        """
+        Log how long the preparations took, and how much time building tables at once saved over building them one after another.
+
+        Args:
+            names_to_prepare (List[str]): Names of the prepared tables.
+            elapsed (float): Wall-clock time of all the preparations, in seconds.
+            num_workers (int): Maximum number of tables built at once.
+        """
+        durations = {
+            table_name: self.processed_sources[table_name].elapsed_seconds
+            for table_name in names_to_prepare
+            if table_name not in self.skipped_tables and self.processed_sources[table_name].elapsed_seconds is not None
+        }
+        for table_name, seconds in durations.items():
+            logger.debug(f"Prepared {table_name} in {seconds:.1f}s")
+        sequential = sum(durations.values())
+        if self.skipped_tables:
+            logger.info(f"Skipped {len(self.skipped_tables)} unchanged tables")
+        if num_workers > 1:
+            logger.info(
+                f"Prepared {len(durations)} tables in {elapsed:.1f}s with up to {num_workers} at once; "
+                f"one after another they took {sequential:.1f}s, saving {max(0.0, sequential - elapsed):.1f}s"
+            )
+        else:
+            logger.info(f"Prepared {len(durations)} tables in {elapsed:.1f}s")
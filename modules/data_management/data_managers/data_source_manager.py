@@ -268,15 +268,27 @@ data_source_manager.py
 Manages data source configurations, instantiates data source objects, and coordinates data collection and table management for each source.
 """
 
+import hashlib
+import json
 import logging
+import math
 import os
 import importlib
+import re
 import geopandas as gpd
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 from sqlalchemy.engine import Engine
 
 from modules.infrastructure.other_ops.file_operations import read_yaml_file
-from modules.data_management.sql_utils.sql_ops import drop_and_rebuild_table
+from modules.infrastructure.other_ops.request_limits import configure_request_limits
+from modules.data_management.sql_utils.sql_ops import (
+    drop_and_rebuild_table,
+    table_exists,
+    get_collection_catalog_entry,
+    record_collection_catalog_entry,
+    delete_collection_catalog_entry
+)
 
 logger = logging.getLogger(__name__)
 
@@ -291,6 +303,8 @@ class DataSource:
         collection_method (object): Instance of the collection method class.
         table_name (str): Name of the database table for the data source.
         table_columns (dict): Dictionary of columns for the database table.
+        screening_tolerance (float): Distance in meters the source's geometries can be generalized by without
+            changing a screening result, or None if the source is not intersected with buffered sites.
     """
     def __init__(self, name: str, source_config: Dict[str, Any], db_engine: Engine) -> None:
         """
@@ -313,6 +327,7 @@ class DataSource:
         self.collection_method: Optional[Any] = self._initialize_collection_method()
         self.table_name: str = self.source_config['table']['table_name']
         self.table_columns: Dict[str, str] = self.source_config['table']['table_columns']
+        self.screening_tolerance: Optional[float] = None
 
         logger.debug(f"DataSource '{self.name}' initialized successfully.")
 
@@ -365,6 +380,30 @@ class DataSource:
 
         return None
 
+    def config_hash(self, collector_config_hash: Optional[str] = None) -> str:
+        """
+        Hash the effective configuration of the data source, so a collection made with another configuration is not
+        treated as unchanged.
+
+        The hash covers the collection method, its configs, including query parameters the collector has set such as
+        maxAllowableOffset and geometryPrecision, the table and its columns, the screening tolerance, and the hash of
+        the settings the collector resolved from them, such as a local file's full path.
+
+        Args:
+            collector_config_hash (str, optional): Hash of the collector's settings, reported in its fingerprint.
+
+        Returns:
+            str: SHA-256 hex digest of the configuration.
+        """
+        effective_config = {
+            'method': self.source_config['method'],
+            'method_configs': self.source_config['method_configs'],
+            'table': self.source_config['table'],
+            'screening_tolerance': self.screening_tolerance,
+            'collector_config': collector_config_hash
+        }
+        return hashlib.sha256(json.dumps(effective_config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
     def update_table(self) -> None:
         """
         Build or update the table for the data source based on its configuration.
@@ -395,8 +434,22 @@ class DataSourceManager:
         sources_configs (dict): Dictionary of DataSource configurations loaded from the YAML file.
         data_sources (dict): Dictionary of DataSource instances created from the configurations.
         sources_to_collect_names (list): List of data source names to be collected.
+        max_parallel_sources (int): Maximum number of sources collected at once.
+        max_requests_total (int): Maximum number of requests in flight across all sources collected in parallel.
+        max_requests_per_host (int): Maximum number of requests in flight to one host across all sources collected in parallel.
+        requests_per_second_per_host (float): Maximum sustained request rate to one host across all sources, or None for no limit.
+        prepared_data_config_path (str): Path to the prepared data configuration file, or None.
+        intersection_config_path (str): Path to the intersection configuration file, or None.
     """
-    def __init__(self, data_sources_folder: str, source_data_config_path: str, db_engine: Engine) -> None:
+    def __init__(
+        self,
+        data_sources_folder: str,
+        source_data_config_path: str,
+        db_engine: Engine,
+        collection_settings: Optional[Dict[str, Any]] = None,
+        prepared_data_config_path: Optional[str] = None,
+        intersection_config_path: Optional[str] = None
+    ) -> None:
         """
         Initialize the DataSourceManager with folder paths.
 
@@ -404,6 +457,13 @@ class DataSourceManager:
             data_sources_folder (str): Path to the folder for storing data if necessary.
             source_data_config_path (str): Path to the folder containing source data configurations.
             db_engine (Engine): SQLAlchemy engine connected to the database.
+            collection_settings (dict, optional): Collection settings: max_parallel_sources, max_requests_total,
+                max_requests_per_host and requests_per_second_per_host. Sources are collected one after another
+                without request limits if not given.
+            prepared_data_config_path (str, optional): Path to the prepared data configuration file. Used with
+                intersection_config_path to find the sources each hazard is prepared from.
+            intersection_config_path (str, optional): Path to the intersection configuration file. Used to set
+                each hazard source's screening tolerance from the buffer distances of the sites it is intersected with.
 
         Raises:
             FileNotFoundError: If the source data configuration file does not exist.
@@ -411,6 +471,13 @@ class DataSourceManager:
         self.data_sources_folder: str = data_sources_folder
         self.source_data_config_path: str = source_data_config_path
         self.db_engine: Engine = db_engine
+        collection_settings = collection_settings or {}
+        self.max_parallel_sources: int = collection_settings.get('max_parallel_sources') or 1
+        self.max_requests_total: int = collection_settings.get('max_requests_total') or 32
+        self.max_requests_per_host: int = collection_settings.get('max_requests_per_host') or 16
+        self.requests_per_second_per_host: Optional[float] = collection_settings.get('requests_per_second_per_host')
+        self.prepared_data_config_path: Optional[str] = prepared_data_config_path
+        self.intersection_config_path: Optional[str] = intersection_config_path
 
         self._validate_config_path()
 
@@ -418,6 +485,7 @@ class DataSourceManager:
         self.sources_configs: Dict[str, Any] = self.load_source_configs()
         self.data_sources: Dict[str, DataSource] = self.create_datasources()
         self.sources_to_collect_names: List[str] = []
+        self.set_screening_tolerances()
 
         logger.debug("DataSourceManager initialization complete.")
 
@@ -468,6 +536,50 @@ class DataSourceManager:
                 logger.error(f"Failed to create DataSource '{name}': {e}")
         return data_sources
 
+    def set_screening_tolerances(self) -> None:
+        """
+        Set the screening tolerance of each source that hazards are prepared from.
+
+        Intersection tables buffer each site with ST_Buffer, which approximates the circle with 4 * quad_segs
+        segments whose midpoints lie buffer_distance * (1 - cos(pi / (4 * quad_segs))) inside it. A hazard boundary
+        moved by less than that distance cannot change a screening result by more than the buffer's own
+        approximation already does, so it is the tolerance the hazard can be generalized by when it is collected.
+        A source is matched to a hazard if the hazard's prepared table is the source table or is built by a prepared
+        data query that reads from it. A source used by several intersection tables takes the smallest tolerance.
+
+        Sources keep no tolerance if either configuration path is not set or cannot be read.
+        """
+        if not self.prepared_data_config_path or not self.intersection_config_path:
+            return
+        try:
+            prepared_configs = read_yaml_file(self.prepared_data_config_path)
+            intersection_configs = read_yaml_file(self.intersection_config_path)
+        except Exception as e:
+            logger.warning(f"Could not read the prepared data or intersection configurations; sources are collected without screening tolerances: {e}")
+            return
+
+        hazard_configs = intersection_configs.get('hazards') or {}
+        tolerances: Dict[str, float] = {}
+        for table_config in (intersection_configs.get('intersection_tables') or {}).values():
+            buffer_distance = table_config.get('buffer_distance')
+            if not buffer_distance:
+                continue
+            quad_segs = table_config.get('buffer_quadrant_segments') or 8
+            tolerance = buffer_distance * (1 - math.cos(math.pi / (4 * quad_segs)))
+            for hazard_name in table_config.get('hazards') or []:
+                hazard_table = (hazard_configs.get(hazard_name) or {}).get('source_table')
+                if not hazard_table:
+                    continue
+                prepared_config = prepared_configs.get(hazard_table) or ''
+                prepared_sql = str(prepared_config.get('sql') or '') if isinstance(prepared_config, dict) else str(prepared_config)
+                for data_source in self.data_sources.values():
+                    if data_source.table_name == hazard_table or re.search(rf"\b{re.escape(data_source.table_name)}\b", prepared_sql):
+                        tolerances[data_source.name] = min(tolerance, tolerances.get(data_source.name, tolerance))
+
+        for name, tolerance in tolerances.items():
+            self.data_sources[name].screening_tolerance = tolerance
+            logger.debug(f"Screening tolerance for '{name}': {tolerance:.2f} m")
+
     def determine_collection_sources(self, source_names: Optional[List[str]] = None) -> bool:
         """
         Determine which data sources should be collected based on the provided source names.
@@ -501,36 +613,168 @@ class DataSourceManager:
             logger.error(f"Failed to determine sources to collect: {e}")
             return False
 
-    def collect_data_sources(self, source_names: Optional[List[str]] = None) -> List[str]:
+    def collect_data_sources(self, source_names: Optional[List[str]] = None, force_sources: Optional[List[str]] = None) -> List[str]:
         """
         Collect data from the specified data sources and save it to the database.
 
+        Sources whose collection method can report a fingerprint of the hosted layer (last edit date and feature count)
+        are skipped when the fingerprint matches the one recorded at their last successful collection and their table
+        still exists. Skipped sources count as collected. Sources whose collection method reports a resumable
+        interrupted collection keep their table and continue from their checkpoints instead of being rebuilt.
+
+        With max_parallel_sources above 1, up to that many sources are collected at once on worker threads. Each
+        source loads its own table on its own connections, and requests across all sources are capped in total and
+        per host by a shared request limiter. The per-host request rate limit applies whether or not sources are
+        collected in parallel.
+
         Args:
             source_names (list, optional): Names of the data sources to collect data from. If None, no sources will be collected.
+            force_sources (list, optional): Names of the data sources to collect even if unchanged. 'force_all' forces every source.
 
         Returns:
-            list: List of successfully collected data source names.
+            list: List of successfully collected data source names, in the order the sources were specified.
         """
         collected_sources: List[str] = []
+        force_sources = force_sources or []
         try:
             if self.determine_collection_sources(source_names):
                 logger.info(f"Collecting primary source(s): {', '.join(self.sources_to_collect_names)}")
 
-                for data_source_name in self.sources_to_collect_names:
-                    data_source = self.data_sources[data_source_name]
-                    try:
-                        logger.info(f"Attempting to collect data for: {data_source.name}")
-                        source_collector = data_source.collection_method(data_source, self.db_engine, self.data_sources_folder)
-                        data_source.update_table()
-                        success = source_collector.collect_data()
-                        if success:
-                            logger.info(f"Data collection successful for: {data_source.name}")
-                            collected_sources.append(data_source.name)
-                        else:
-                            logger.error(f"Data collection failed for: {data_source.name}")
-                    except Exception as e:
-                        logger.error(f"Error collecting data for: {data_source.name}: {e}")
+                parallel = self.max_parallel_sources > 1 and len(self.sources_to_collect_names) > 1
+                configure_request_limits(
+                    self.max_requests_total if parallel else None,
+                    self.max_requests_per_host if parallel else None,
+                    self.requests_per_second_per_host
+                )
+                try:
+                    if parallel:
+                        results = self._collect_sources_in_parallel(force_sources)
+                    else:
+                        results = {
+                            data_source_name: self._collect_source(self.data_sources[data_source_name], force_sources)
+                            for data_source_name in self.sources_to_collect_names
+                        }
+                finally:
+                    configure_request_limits()
+                collected_sources = [name for name in self.sources_to_collect_names if results.get(name)]
             return collected_sources
         except Exception as e:
             logger.error(f"Error collecting data sources: {e}")
-            return collected_sources
\ No newline at end of file
+            return collected_sources
+
+    def _collect_sources_in_parallel(self, force_sources: List[str]) -> Dict[str, bool]:
+        """
+        Collect the sources to collect on a pool of worker threads.
+
+        Args:
+            force_sources (list): Names of the data sources to collect even if unchanged. 'force_all' forces every source.
+
+        Returns:
+            dict: Whether each source was collected, by source name.
+        """
+        num_workers = min(self.max_parallel_sources, len(self.sources_to_collect_names))
+        logger.info(f"Collecting up to {num_workers} sources at once")
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='source_collector') as executor:
+            futures = {
+                data_source_name: executor.submit(self._collect_source, self.data_sources[data_source_name], force_sources)
+                for data_source_name in self.sources_to_collect_names
+            }
+            return {data_source_name: future.result() for data_source_name, future in futures.items()}
+
+    def _collect_source(self, data_source: DataSource, force_sources: List[str]) -> bool:
+        """
+        Collect a single data source, skipping it if unchanged and resuming it if interrupted. Sources loaded
+        through a staging table keep their existing table until the collection swaps the new one in.
+
+        Args:
+            data_source (DataSource): The data source.
+            force_sources (list): Names of the data sources to collect even if unchanged. 'force_all' forces every source.
+
+        Returns:
+            bool: True if the source was collected or skipped as unchanged, False otherwise.
+        """
+        try:
+            logger.info(f"Attempting to collect data for: {data_source.name}")
+            source_collector = data_source.collection_method(data_source, self.db_engine, self.data_sources_folder)
+            forced = 'force_all' in force_sources or data_source.name in force_sources
+            fingerprint = self._get_source_fingerprint(data_source, source_collector)
+            # Taken after the collector is built, since it sets query parameters such as the generalization
+            config_hash = data_source.config_hash(fingerprint.get('config_hash') if fingerprint else None)
+            resumable = hasattr(source_collector, 'can_resume') and source_collector.can_resume()
+            if not forced and not resumable and self._is_source_unchanged(data_source, fingerprint, config_hash):
+                logger.info(f"Source unchanged since last collection, skipping: {data_source.name}")
+                return True
+
+            # The table no longer matches the catalog until this collection succeeds
+            delete_collection_catalog_entry(self.db_engine, data_source.name)
+            if resumable:
+                logger.info(f"Resuming interrupted collection for: {data_source.name}")
+            elif hasattr(source_collector, 'uses_staging_table') and source_collector.uses_staging_table():
+                logger.debug(f"Collecting {data_source.name} into a staging table; {data_source.table_name} is kept until it is replaced")
+            else:
+                data_source.update_table()
+            success = source_collector.collect_data()
+            if success:
+                logger.info(f"Data collection successful for: {data_source.name}")
+                if fingerprint:
+                    record_collection_catalog_entry(
+                        self.db_engine,
+                        data_source.name,
+                        data_source.table_name,
+                        fingerprint.get('last_edit_date'),
+                        fingerprint.get('feature_count'),
+                        config_hash
+                    )
+                return True
+            logger.error(f"Data collection failed for: {data_source.name}")
+        except Exception as e:
+            logger.error(f"Error collecting data for: {data_source.name}: {e}")
+        return False
+
+    def _get_source_fingerprint(self, data_source: DataSource, source_collector: Any) -> Optional[Dict[str, Any]]:
+        """
+        Get the fingerprint of a data source's hosted layer from its collector, if the collection method supports it.
+
+        The fingerprint is taken before collecting, so edits made to the layer during a collection are picked up by the next run.
+
+        Args:
+            data_source (DataSource): The data source.
+            source_collector (object): Collection method instance for the data source.
+
+        Returns:
+            dict: Fingerprint with 'last_edit_date', 'feature_count' and optionally 'config_hash', or None if unavailable.
+        """
+        if not hasattr(source_collector, 'get_source_fingerprint'):
+            return None
+        fingerprint = source_collector.get_source_fingerprint()
+        if fingerprint:
+            logger.debug(f"Fingerprint for '{data_source.name}': {fingerprint}")
+        return fingerprint
+
+    def _is_source_unchanged(self, data_source: DataSource, fingerprint: Optional[Dict[str, Any]], config_hash: str) -> bool:
+        """
+        Compare a data source's fingerprint and configuration with those recorded at its last successful collection.
+
+        A layer that does not report a last edit date, or a source whose configuration has changed, is always
+        treated as changed.
+
+        Args:
+            data_source (DataSource): The data source.
+            fingerprint (dict, optional): Current fingerprint of the hosted layer.
+            config_hash (str): Hash of the source's current configuration.
+
+        Returns:
+            bool: True if the source is unchanged and its table still exists.
+        """
+        if not fingerprint or fingerprint.get('last_edit_date') is None:
+            return False
+        catalog_entry = get_collection_catalog_entry(self.db_engine, data_source.name)
+        if not catalog_entry:
+            return False
+        return (
+            catalog_entry['table_name'] == data_source.table_name
+            and catalog_entry['last_edit_date'] == fingerprint['last_edit_date']
+            and catalog_entry['feature_count'] == fingerprint['feature_count']
+            and catalog_entry.get('config_hash') == config_hash
+            and table_exists(self.db_engine, data_source.table_name)
+        )
@@ -0,0 +1,292 @@
+"""
+sql_copy_encoders.py
+
+Contains the ArrowRowEncoder class, which turns Arrow record batches read from vector files into rows for a
+PostGIS table: tuples encoded in the PostgreSQL binary COPY format, or value tuples for the text COPY and
+executemany load methods. Columns are converted a whole batch at a time, so no per-feature objects are built.
+"""
+
+import logging
+import re
+import struct
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import shapely
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct('>i').pack
+_NULL_FIELD = _LENGTH(-1)
+
+# PostgreSQL stores dates and timestamps relative to 2000-01-01
+_POSTGRES_EPOCH_DAYS = 10957
+_POSTGRES_EPOCH_MICROSECONDS = _POSTGRES_EPOCH_DAYS * 86400 * 10 ** 6
+
+# Column type: (binary dtype, Arrow type the values are cast to, offset subtracted from the cast values)
+_FIXED_WIDTH_TYPES = {
+    'smallint': ('>i2', pa.int16(), 0),
+    'int2': ('>i2', pa.int16(), 0),
+    'integer': ('>i4', pa.int32(), 0),
+    'int': ('>i4', pa.int32(), 0),
+    'int4': ('>i4', pa.int32(), 0),
+    'serial': ('>i4', pa.int32(), 0),
+    'bigint': ('>i8', pa.int64(), 0),
+    'int8': ('>i8', pa.int64(), 0),
+    'bigserial': ('>i8', pa.int64(), 0),
+    'real': ('>f4', pa.float32(), 0),
+    'float4': ('>f4', pa.float32(), 0),
+    'double precision': ('>f8', pa.float64(), 0),
+    'float8': ('>f8', pa.float64(), 0),
+    'float': ('>f8', pa.float64(), 0),
+    'boolean': ('?', pa.bool_(), 0),
+    'bool': ('?', pa.bool_(), 0),
+    'date': ('>i4', pa.date32(), _POSTGRES_EPOCH_DAYS),
+    'timestamp': ('>i8', pa.timestamp('us'), _POSTGRES_EPOCH_MICROSECONDS),
+    'timestamp without time zone': ('>i8', pa.timestamp('us'), _POSTGRES_EPOCH_MICROSECONDS),
+    'timestamptz': ('>i8', pa.timestamp('us'), _POSTGRES_EPOCH_MICROSECONDS),
+    'timestamp with time zone': ('>i8', pa.timestamp('us'), _POSTGRES_EPOCH_MICROSECONDS),
+}
+_TEXT_TYPES = ('text', 'varchar', 'character varying', 'char', 'character', 'bpchar')
+_GEOMETRY_TYPE = re.compile(r'^(geometry|geography)\s*(?:\(\s*([a-z]+)\s*(?:,\s*(\d+))?\s*\))?$')
+
+# Shapely type ids of single part geometries and the multi part types they are promoted to
+_MULTI_TYPE_IDS = {0: 4, 1: 5, 3: 6}
+_MULTI_CONSTRUCTORS = {4: shapely.multipoints, 5: shapely.multilinestrings, 6: shapely.multipolygons}
+
+class ArrowRowEncoder:
+    """
+    Converts Arrow record batches into rows for the columns of a PostGIS table.
+
+    Each table column is filled from one field of the batch, cast to the column's declared type. Geometry and
+    geography columns are read from WKB and, following the column's type modifier, reprojected by the optional
+    geometry_transform, reduced to two dimensions, promoted from single to multi part and given the column's SRID.
+    The binary COPY format is supported for integer, floating point, boolean, date, timestamp, text and spatial
+    columns; tables with other column types can only be loaded as value rows.
+
+    Attributes:
+        columns (list): Ordered names of the table columns the rows are built for.
+        source_fields (dict): Name of the batch field each table column is filled from.
+        geometry_transform (callable): Function applied to each array of geometries before it is fitted to its column, or None.
+        supports_binary (bool): Whether every column can be encoded in the binary COPY format.
+        geometry_columns (dict): SRID declared by each geometry or geography column, or None if it declares none.
+    """
+    def __init__(self, table_columns, source_fields, geometry_transform=None):
+        """
+        Initializes the ArrowRowEncoder.
+
+        Args:
+            table_columns (dict): Column names and declared types of the table. An 'id' column is skipped.
+            source_fields (dict): Name of the batch field each table column is filled from.
+            geometry_transform (callable, optional): Function taking and returning an array of shapely geometries,
+                applied before the geometries are fitted to their column, for example to reproject them.
+        """
+        self.columns = [column_name for column_name in table_columns if column_name != 'id']
+        self.source_fields = source_fields
+        self.geometry_transform = geometry_transform
+        self._column_specs = {column_name: self._column_spec(table_columns[column_name]) for column_name in self.columns}
+        self.geometry_columns = {column_name: spec[2] for column_name, spec in self._column_specs.items() if spec[0] == 'spatial'}
+        unsupported = [column_name for column_name, spec in self._column_specs.items() if spec[0] == 'other']
+        self.supports_binary = not unsupported
+        if unsupported:
+            logger.debug(f"Columns {', '.join(unsupported)} have no binary COPY encoding; rows must be loaded as values")
+
+    def encode(self, batch, load_method):
+        """
+        Converts a record batch into rows for the given load method.
+
+        Args:
+            batch (pyarrow.RecordBatch): Batch holding the source fields.
+            load_method (str): 'binary' for binary COPY tuples, otherwise value tuples for 'copy' or 'executemany'.
+
+        Returns:
+            list: One row per record, as bytes for 'binary' or as a tuple of values.
+        """
+        if load_method == 'binary':
+            return self.binary_rows(batch)
+        return self.value_rows(batch)
+
+    def binary_rows(self, batch):
+        """
+        Encodes a record batch as tuples of the PostgreSQL binary COPY format.
+
+        Args:
+            batch (pyarrow.RecordBatch): Batch holding the source fields.
+
+        Returns:
+            list: One bytes object per record, holding its field count and length-prefixed fields.
+
+        Raises:
+            ValueError: If a column has no binary encoding.
+        """
+        if not self.supports_binary:
+            raise ValueError("Table has columns without a binary COPY encoding")
+        tuple_header = struct.pack('>h', len(self.columns))
+        fields = [self._binary_fields(self._source_array(batch, column_name), self._column_specs[column_name]) for column_name in self.columns]
+        return [tuple_header + b''.join(row) for row in zip(*fields)]
+
+    def value_rows(self, batch):
+        """
+        Converts a record batch into tuples of Python values, with geometries as hex-encoded EWKB.
+
+        Args:
+            batch (pyarrow.RecordBatch): Batch holding the source fields.
+
+        Returns:
+            list: One tuple per record, ordered like columns.
+        """
+        values = [self._values(self._source_array(batch, column_name), self._column_specs[column_name]) for column_name in self.columns]
+        return list(zip(*values))
+
+    def _source_array(self, batch, column_name):
+        """
+        Gets the batch field a table column is filled from.
+
+        Args:
+            batch (pyarrow.RecordBatch): Batch holding the source fields.
+            column_name (str): Name of the table column.
+
+        Returns:
+            pyarrow.Array: Values of the field.
+        """
+        return batch.column(self.source_fields[column_name])
+
+    @staticmethod
+    def _column_spec(column_type):
+        """
+        Parses a declared column type into the encoding used for it.
+
+        Args:
+            column_type (str): Declared type, such as 'int4', 'varchar(50)' or 'Geometry(MULTIPOLYGON, 4326)'.
+
+        Returns:
+            tuple: ('fixed', dtype, arrow type, offset), ('text',), ('spatial', geometry type, srid) or ('other',).
+        """
+        declared = ' '.join(str(column_type).strip().lower().split())
+        spatial = _GEOMETRY_TYPE.match(declared)
+        if spatial:
+            kind, geometry_type, srid = spatial.groups()
+            if srid is None and kind == 'geography':
+                srid = 4326
+            return ('spatial', geometry_type, int(srid) if srid is not None else None)
+        base_type = re.sub(r'\s*\(.*\)', '', declared)
+        if base_type in _FIXED_WIDTH_TYPES:
+            return ('fixed',) + _FIXED_WIDTH_TYPES[base_type]
+        if base_type in _TEXT_TYPES:
+            return ('text',)
+        return ('other',)
+
+    def _binary_fields(self, array, spec):
+        """
+        Encodes the values of one column as length-prefixed binary COPY fields.
+
+        Args:
+            array (pyarrow.Array): Source values.
+            spec (tuple): Encoding of the column, from _column_spec.
+
+        Returns:
+            list: One bytes field per record.
+        """
+        if spec[0] == 'fixed':
+            _, dtype, arrow_type, offset = spec
+            values, nulls = self._fixed_width_values(array, arrow_type)
+            packed = np.empty(len(values), dtype=[('length', '>i4'), ('value', dtype)])
+            packed['length'] = np.dtype(dtype).itemsize
+            packed['value'] = values - offset if offset else values
+            data = packed.tobytes()
+            size = packed.itemsize
+            fields = [data[start:start + size] for start in range(0, len(data), size)]
+            for index in np.flatnonzero(nulls):
+                fields[index] = _NULL_FIELD
+            return fields
+        if spec[0] == 'text':
+            values = pc.cast(pc.cast(array, pa.string()), pa.binary()).to_pylist()
+        else:
+            values = shapely.to_wkb(self._geometries(array, spec), include_srid=True).tolist()
+        return [_NULL_FIELD if value is None else _LENGTH(len(value)) + value for value in values]
+
+    def _values(self, array, spec):
+        """
+        Converts the values of one column into Python values for the text COPY and executemany load methods.
+
+        Args:
+            array (pyarrow.Array): Source values.
+            spec (tuple): Encoding of the column, from _column_spec.
+
+        Returns:
+            list: One value per record, None for nulls.
+        """
+        if spec[0] == 'fixed':
+            return pc.cast(array, spec[2]).to_pylist()
+        if spec[0] == 'spatial':
+            return shapely.to_wkb(self._geometries(array, spec), hex=True, include_srid=True).tolist()
+        if spec[0] == 'text' or pa.types.is_dictionary(array.type):
+            return pc.cast(array, pa.string()).to_pylist()
+        return array.to_pylist()
+
+    @staticmethod
+    def _fixed_width_values(array, arrow_type):
+        """
+        Casts a column to a fixed width type and converts it to a NumPy array.
+
+        Dates and timestamps are converted to their integer day and microsecond counts since 1970-01-01.
+
+        Args:
+            array (pyarrow.Array): Source values.
+            arrow_type (pyarrow.DataType): Type to cast to. Casts that would overflow or truncate raise an error.
+
+        Returns:
+            tuple: (numpy.ndarray of values with nulls set to zero, numpy.ndarray of null flags).
+        """
+        if pa.types.is_timestamp(arrow_type) and pa.types.is_timestamp(array.type) and array.type.tz is not None:
+            arrow_type = pa.timestamp('us', tz=array.type.tz)
+        array = pc.cast(array, arrow_type)
+        if pa.types.is_date32(arrow_type):
+            array = pc.cast(array, pa.int32())
+        elif pa.types.is_timestamp(arrow_type):
+            array = pc.cast(array, pa.int64())
+        nulls = array.is_null().to_numpy(zero_copy_only=False)
+        fill_value = pa.scalar(False) if pa.types.is_boolean(array.type) else pa.scalar(0, array.type)
+        return array.fill_null(fill_value).to_numpy(zero_copy_only=False), nulls
+
+    def _geometries(self, array, spec):
+        """
+        Reads a column of WKB geometries and fits them to their table column.
+
+        Args:
+            array (pyarrow.Array): WKB values.
+            spec (tuple): Encoding of the column, from _column_spec.
+
+        Returns:
+            numpy.ndarray: Shapely geometries, None for nulls.
+        """
+        _, geometry_type, srid = spec
+        geometries = shapely.from_wkb(array.to_numpy(zero_copy_only=False))
+        if self.geometry_transform is not None:
+            geometries = self.geometry_transform(geometries)
+        if geometry_type and geometry_type != 'geometry':
+            if not geometry_type.endswith(('z', 'm')):
+                geometries = shapely.force_2d(geometries)
+            if geometry_type.startswith('multi'):
+                geometries = _promote_to_multi(geometries)
+        if srid is not None:
+            geometries = shapely.set_srid(geometries, srid)
+        return geometries
+
+def _promote_to_multi(geometries):
+    """
+    Wraps single part points, lines and polygons in their multi part type.
+
+    Args:
+        geometries (numpy.ndarray): Shapely geometries.
+
+    Returns:
+        numpy.ndarray: Geometries with every single part geometry replaced by a one part multi geometry.
+    """
+    type_ids = shapely.get_type_id(geometries)
+    for single_type_id, multi_type_id in _MULTI_TYPE_IDS.items():
+        single = type_ids == single_type_id
+        if single.any():
+            geometries[single] = _MULTI_CONSTRUCTORS[multi_type_id](geometries[single][:, np.newaxis])
+    return geometries
@@ -0,0 +1,228 @@
+"""
+sql_geometry_validation.py
+
+Contains the GeometryValidator class, which finds and repairs the invalid geometries of a PostGIS table in
+chunks of ids. The chunks are checked and repaired at the same time on separate connections, each committed on
+its own, so no single transaction rewrites the whole table. A report of the geometries checked, found invalid
+and repaired is logged and recorded in the geometry validation report table.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from modules.data_management.sql_utils.sql_ops import get_table_row_count, record_geometry_validation_report
+
+logger = logging.getLogger(__name__)
+
+REPAIR_METHODS = ('make_valid', 'buffer')
+_INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+# Dimension passed to ST_CollectionExtract for each family of geometry types
+_COLLECTION_TYPES = {'POINT': 1, 'MULTIPOINT': 1, 'LINESTRING': 2, 'MULTILINESTRING': 2, 'POLYGON': 3, 'MULTIPOLYGON': 3}
+
+class GeometryValidator:
+    """
+    Repairs the invalid geometries of a table, one range of ids at a time on several connections.
+
+    Invalid geometries are repaired with ST_MakeValid, keeping only the parts that match the column's geometry
+    type, or with a zero-width ST_Buffer, which only suits polygons. Tables without an integer id column are
+    checked in a single chunk.
+
+    Attributes:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+        geometry_column (str): Name of the geometry column to validate.
+        id_column (str): Integer column the table is split on.
+        repair (str): Repair method, 'make_valid' or 'buffer'.
+        chunk_size (int): Width of each range of ids.
+        max_workers (int): Maximum number of chunks validated at once.
+    """
+    def __init__(
+        self,
+        db_engine: Engine,
+        table_name: str,
+        geometry_column: str = 'geometry_transformed',
+        id_column: str = 'id',
+        repair: str = 'make_valid',
+        chunk_size: int = 50000,
+        max_workers: int = 2
+    ) -> None:
+        """
+        Initializes the GeometryValidator.
+
+        Args:
+            db_engine (Engine): SQLAlchemy engine connected to the database.
+            table_name (str): Name of the table.
+            geometry_column (str): Name of the geometry column to validate.
+            id_column (str): Integer column the table is split on.
+            repair (str): Repair method, 'make_valid' or 'buffer'.
+            chunk_size (int): Width of each range of ids.
+            max_workers (int): Maximum number of chunks validated at once, each on its own connection.
+
+        Raises:
+            ValueError: If the repair method is unknown.
+        """
+        if repair not in REPAIR_METHODS:
+            raise ValueError(f"Unknown geometry repair method {repair}; use one of {', '.join(REPAIR_METHODS)}")
+        self.db_engine: Engine = db_engine
+        self.table_name: str = table_name
+        self.geometry_column: str = geometry_column
+        self.id_column: str = id_column
+        self.repair: str = repair
+        self.chunk_size: int = max(1, int(chunk_size))
+        self.max_workers: int = max(1, int(max_workers))
+
+    def validate(self) -> Optional[Dict[str, Any]]:
+        """
+        Repairs the invalid geometries of the table and records a report of the results.
+
+        Returns:
+            dict: Report with rows_checked, invalid, repaired, still_invalid, chunks and seconds, or None if a
+                chunk could not be validated. Chunks validated before a failure stay committed.
+        """
+        start_time = time.perf_counter()
+        try:
+            repair_expression = self._repair_expression()
+            id_ranges = self._id_ranges()
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to read table {self.table_name} to validate its geometries: {e}")
+            return None
+
+        num_workers = min(self.max_workers, max(1, len(id_ranges)))
+        logger.debug(f"Validating {self.table_name}.{self.geometry_column} in {len(id_ranges)} chunks on {num_workers} connections")
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='geometry_validator') as executor:
+            chunk_results = list(executor.map(lambda id_range: self._validate_chunk(repair_expression, id_range), id_ranges))
+        failed_chunks = sum(1 for result in chunk_results if result is None)
+        if failed_chunks:
+            logger.error(f"Failed to validate {failed_chunks} of {len(id_ranges)} chunks of {self.table_name}")
+            return None
+
+        report = {
+            'table_name': self.table_name,
+            'geometry_column': self.geometry_column,
+            'repair_method': self.repair,
+            'rows_checked': get_table_row_count(self.db_engine, self.table_name),
+            'invalid': sum(invalid for invalid, _ in chunk_results),
+            'repaired': sum(repaired for _, repaired in chunk_results),
+            'chunks': len(id_ranges),
+            'seconds': round(time.perf_counter() - start_time, 3)
+        }
+        report['still_invalid'] = report['invalid'] - report['repaired']
+        message = (
+            f"Validated {report['rows_checked']} geometries of {self.table_name}.{self.geometry_column} in "
+            f"{report['chunks']} chunks in {report['seconds']:.1f}s: {report['invalid']} invalid, "
+            f"{report['repaired']} repaired with {self.repair}, {report['still_invalid']} still invalid"
+        )
+        if report['still_invalid']:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        record_geometry_validation_report(self.db_engine, report)
+        return report
+
+    def _repair_expression(self) -> str:
+        """
+        Builds the SQL expression that repairs a geometry of the column, keeping the column's geometry type.
+
+        Returns:
+            str: Repair expression.
+        """
+        with self.db_engine.connect() as conn:
+            geometry_type = conn.execute(text("""
+                SELECT upper(postgis_typmod_type(atttypmod))
+                FROM pg_attribute
+                WHERE attrelid = to_regclass(:table_name) AND attname = :column_name AND attnum > 0 AND NOT attisdropped
+            """), {"table_name": self.table_name, "column_name": self.geometry_column}).scalar()
+        geometry_type = (geometry_type or 'GEOMETRY').rstrip('ZM')
+
+        if self.repair == 'buffer':
+            expression = f"ST_Buffer({self.geometry_column}, 0, 'quad_segs=5')"
+        else:
+            expression = f"ST_MakeValid({self.geometry_column})"
+            if geometry_type in _COLLECTION_TYPES:
+                expression = f"ST_CollectionExtract({expression}, {_COLLECTION_TYPES[geometry_type]})"
+        if geometry_type.startswith('MULTI'):
+            expression = f"ST_Multi({expression})"
+        return expression
+
+    def _id_ranges(self) -> List[Optional[Tuple[int, int]]]:
+        """
+        Splits the table's ids into ranges of chunk_size ids, indexing the id column first if it has no index, so
+        each chunk reads only its own rows instead of scanning the table.
+
+        Returns:
+            list: (low, high) ranges including low and excluding high, or [None] to check the table in one chunk.
+        """
+        with self.db_engine.connect() as conn:
+            id_type = conn.execute(text("""
+                SELECT format_type(atttypid, atttypmod)
+                FROM pg_attribute
+                WHERE attrelid = to_regclass(:table_name) AND attname = :column_name AND attnum > 0 AND NOT attisdropped
+            """), {"table_name": self.table_name, "column_name": self.id_column}).scalar()
+            if id_type not in _INTEGER_TYPES:
+                logger.warning(f"Table {self.table_name} has no integer column {self.id_column}; validating its geometries in one chunk")
+                return [None]
+            self._ensure_id_index(conn)
+            low, high = conn.execute(text(f"SELECT min({self.id_column}), max({self.id_column}) FROM {self.table_name}")).one()
+        if low is None:
+            return []
+        return [(start, min(start + self.chunk_size, high + 1)) for start in range(low, high + 1, self.chunk_size)]
+
+    def _ensure_id_index(self, conn) -> None:
+        """
+        Creates a btree index on the id column unless an index already starts with it. Tables built with
+        CREATE TABLE AS have no index on their id column.
+
+        Args:
+            conn (Connection): SQLAlchemy connection. The index is committed on it.
+        """
+        indexed = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1
+                FROM pg_index
+                JOIN pg_attribute ON attrelid = indrelid AND attnum = indkey[0]
+                WHERE indrelid = to_regclass(:table_name) AND attname = :column_name
+            )
+        """), {"table_name": self.table_name, "column_name": self.id_column}).scalar()
+        if indexed:
+            return
+        index_name = f"idx_{self.table_name.replace('.', '_')}_{self.id_column}"
+        logger.debug(f"Indexing {self.table_name}.{self.id_column} to validate its geometries by ranges of ids")
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self.table_name} ({self.id_column})"))
+        conn.commit()
+
+    def _validate_chunk(self, repair_expression: str, id_range: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """
+        Repairs the invalid geometries of one range of ids and commits.
+
+        Args:
+            repair_expression (str): SQL expression repairing a geometry.
+            id_range (tuple): (low, high) range of ids, or None for the whole table.
+
+        Returns:
+            tuple: (number of invalid geometries, number valid after repair), or None if the chunk failed.
+        """
+        range_filter = f"{self.id_column} >= :low AND {self.id_column} < :high AND " if id_range else ""
+        parameters = {"low": id_range[0], "high": id_range[1]} if id_range else {}
+        try:
+            with self.db_engine.connect() as conn:
+                invalid, repaired = conn.execute(text(f"""
+                    WITH repaired AS (
+                        UPDATE {self.table_name}
+                        SET {self.geometry_column} = {repair_expression}
+                        WHERE {range_filter}NOT ST_IsValid({self.geometry_column})
+                        RETURNING ST_IsValid({self.geometry_column}) AS valid
+                    )
+                    SELECT count(*), count(*) FILTER (WHERE valid) FROM repaired
+                """), parameters).one()
+                conn.commit()
+                if invalid:
+                    logger.debug(f"Repaired {repaired} of {invalid} invalid geometries of {self.table_name} in ids {id_range or 'all'}")
+                return invalid, repaired
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to validate geometries of {self.table_name} in ids {id_range or 'all'}: {e}")
+            return None
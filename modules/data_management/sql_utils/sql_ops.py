@@ -1,5 +1,8 @@
 import logging
-import json
+import io
+import numpy as np
+import shapely
+from shapely.geometry import shape
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
@@ -277,37 +280,893 @@ def clear_table(db_engine, table_name):
         logger.error(f"Failed to clear table {table_name}: {e}")
         return False
 
-def geojson_to_postgis(db_engine, table_name, columns, features):
-    """Insert GeoJSON features into a specified PostGIS table dynamically."""
+def table_exists(db_engine, table_name):
+    """
+    Checks whether a table exists in the database.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+
+    Returns:
+        bool: True if the table exists, False otherwise.
+    """
+    with db_engine.connect() as conn:
+        return bool(conn.execute(text("SELECT to_regclass(:table_name) IS NOT NULL"), {"table_name": table_name}).scalar())
+
+COLLECTION_CATALOG_TABLE = 'source_collection_catalog'
+
+def _ensure_collection_catalog(conn):
+    """
+    Creates the collection catalog table if it does not exist.
+
+    Args:
+        conn (Connection): SQLAlchemy connection.
+    """
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {COLLECTION_CATALOG_TABLE} (
+            source_name varchar PRIMARY KEY,
+            table_name varchar NOT NULL,
+            last_edit_date bigint,
+            feature_count bigint,
+            collected_at timestamptz NOT NULL DEFAULT now()
+        )
+    """))
+    conn.execute(text(f"ALTER TABLE {COLLECTION_CATALOG_TABLE} ADD COLUMN IF NOT EXISTS config_hash varchar"))
+
+def get_collection_catalog_entry(db_engine, source_name):
+    """
+    Reads the catalog entry recorded for a data source at its last successful collection.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        source_name (str): Name of the data source.
+
+    Returns:
+        dict: Catalog entry with table_name, last_edit_date, feature_count, config_hash and collected_at, or None if there is none.
+    """
     try:
         with db_engine.connect() as conn:
-            for feature in features:
-                geojson_geom = json.dumps(feature["geometry"])  # Convert geometry to JSON string
-                props = feature["properties"]
+            _ensure_collection_catalog(conn)
+            conn.commit()
+            result = conn.execute(
+                text(f"SELECT table_name, last_edit_date, feature_count, config_hash, collected_at FROM {COLLECTION_CATALOG_TABLE} WHERE source_name = :source_name"),
+                {"source_name": source_name}
+            ).mappings().first()
+            return dict(result) if result else None
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to read collection catalog entry for {source_name}: {e}")
+        return None
 
-                # Modify placeholders: Apply ST_GeomFromGeoJSON only to the geometry column
-                placeholders = [f"ST_SetSRID(ST_GeomFromGeoJSON(:{col}), 4326)" if col == "geometry" else f":{col}" for col in columns]
-                #placeholders = [f"ST_SetSRID(ST_GeomFromGeoJSON(:{col}), 3857)" if col == "geometry" else f":{col}" for col in columns]
-            
-                sql = text(f"""
-                    INSERT INTO {table_name} ({', '.join(columns)}) 
-                    VALUES ({', '.join(placeholders)})
-                """)
+def record_collection_catalog_entry(db_engine, source_name, table_name, last_edit_date, feature_count, config_hash=None):
+    """
+    Records the state of a data source's hosted layer after a successful collection.
 
-                # Create dictionary of parameters, ensuring missing values are handled
-                params = {col: (geojson_geom if col == "geometry" else props.get(col)) for col in columns}
-            
-                conn.execute(sql, params)
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        source_name (str): Name of the data source.
+        table_name (str): Name of the table the source was collected into.
+        last_edit_date (int): Last edit date reported by the layer, in epoch milliseconds.
+        feature_count (int): Number of features reported by the layer.
+        config_hash (str, optional): Hash of the source configuration the source was collected with.
 
+    Returns:
+        bool: True if the entry was recorded, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            _ensure_collection_catalog(conn)
+            conn.execute(text(f"""
+                INSERT INTO {COLLECTION_CATALOG_TABLE} (source_name, table_name, last_edit_date, feature_count, config_hash, collected_at)
+                VALUES (:source_name, :table_name, :last_edit_date, :feature_count, :config_hash, now())
+                ON CONFLICT (source_name) DO UPDATE SET
+                    table_name = EXCLUDED.table_name,
+                    last_edit_date = EXCLUDED.last_edit_date,
+                    feature_count = EXCLUDED.feature_count,
+                    config_hash = EXCLUDED.config_hash,
+                    collected_at = EXCLUDED.collected_at
+            """), {
+                "source_name": source_name,
+                "table_name": table_name,
+                "last_edit_date": last_edit_date,
+                "feature_count": feature_count,
+                "config_hash": config_hash
+            })
             conn.commit()
-        logger.debug(f"Inserted {len(features)} features into table {table_name}")
-        return True
+            logger.debug(f"Recorded collection catalog entry for {source_name}")
+            return True
     except SQLAlchemyError as e:
-        logger.error(f"Failed to insert features into table {table_name}: {e}")
+        logger.error(f"Failed to record collection catalog entry for {source_name}: {e}")
         return False
-    except Exception as e:
-        logger.error(f"Unexpected error during insertion: {e}")
+
+def delete_collection_catalog_entry(db_engine, source_name):
+    """
+    Removes a data source's catalog entry, so it is not treated as unchanged while its table is being rebuilt.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        source_name (str): Name of the data source.
+
+    Returns:
+        bool: True if the entry was removed or did not exist, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            _ensure_collection_catalog(conn)
+            conn.execute(text(f"DELETE FROM {COLLECTION_CATALOG_TABLE} WHERE source_name = :source_name"), {"source_name": source_name})
+            conn.commit()
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to delete collection catalog entry for {source_name}: {e}")
+        return False
+
+PREPARATION_CATALOG_TABLE = 'prepared_data_catalog'
+
+def _ensure_preparation_catalog(conn):
+    """
+    Creates the preparation catalog table if it does not exist.
+
+    Args:
+        conn (Connection): SQLAlchemy connection.
+    """
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {PREPARATION_CATALOG_TABLE} (
+            table_name varchar PRIMARY KEY,
+            fingerprint varchar NOT NULL,
+            prepared_at timestamptz NOT NULL DEFAULT now()
+        )
+    """))
+
+def get_preparation_catalog_entry(db_engine, table_name):
+    """
+    Reads the fingerprint recorded for a prepared table when it was last built.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the prepared table.
+
+    Returns:
+        dict: Catalog entry with fingerprint and prepared_at, or None if there is none.
+    """
+    try:
+        with db_engine.connect() as conn:
+            _ensure_preparation_catalog(conn)
+            conn.commit()
+            result = conn.execute(
+                text(f"SELECT fingerprint, prepared_at FROM {PREPARATION_CATALOG_TABLE} WHERE table_name = :table_name"),
+                {"table_name": table_name}
+            ).mappings().first()
+            return dict(result) if result else None
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to read preparation catalog entry for {table_name}: {e}")
+        return None
+
+def record_preparation_catalog_entry(db_engine, table_name, fingerprint):
+    """
+    Records the fingerprint of the SQL and source tables a prepared table was built from.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the prepared table.
+        fingerprint (str): Fingerprint of the SQL actions and source tables.
+
+    Returns:
+        bool: True if the entry was recorded, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            _ensure_preparation_catalog(conn)
+            conn.execute(text(f"""
+                INSERT INTO {PREPARATION_CATALOG_TABLE} (table_name, fingerprint, prepared_at)
+                VALUES (:table_name, :fingerprint, now())
+                ON CONFLICT (table_name) DO UPDATE SET
+                    fingerprint = EXCLUDED.fingerprint,
+                    prepared_at = EXCLUDED.prepared_at
+            """), {"table_name": table_name, "fingerprint": fingerprint})
+            conn.commit()
+            logger.debug(f"Recorded preparation catalog entry for {table_name}")
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to record preparation catalog entry for {table_name}: {e}")
+        return False
+
+def delete_preparation_catalog_entry(db_engine, table_name):
+    """
+    Removes a prepared table's catalog entry, so it is not treated as unchanged while it is being rebuilt.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the prepared table.
+
+    Returns:
+        bool: True if the entry was removed or did not exist, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            _ensure_preparation_catalog(conn)
+            conn.execute(text(f"DELETE FROM {PREPARATION_CATALOG_TABLE} WHERE table_name = :table_name"), {"table_name": table_name})
+            conn.commit()
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to delete preparation catalog entry for {table_name}: {e}")
+        return False
+
+VALIDATION_REPORT_TABLE = 'geometry_validation_report'
+
+def _ensure_validation_report(conn):
+    """
+    Creates the geometry validation report table if it does not exist.
+
+    Args:
+        conn (Connection): SQLAlchemy connection.
+    """
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {VALIDATION_REPORT_TABLE} (
+            table_name varchar NOT NULL,
+            geometry_column varchar NOT NULL,
+            repair_method varchar,
+            rows_checked bigint,
+            invalid bigint,
+            repaired bigint,
+            still_invalid bigint,
+            chunks integer,
+            seconds double precision,
+            validated_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, geometry_column)
+        )
+    """))
+
+def record_geometry_validation_report(db_engine, report):
+    """
+    Records the result of the last geometry validation of a table's geometry column.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        report (dict): Report with table_name, geometry_column, repair_method, rows_checked, invalid, repaired,
+            still_invalid, chunks and seconds.
+
+    Returns:
+        bool: True if the report was recorded, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            _ensure_validation_report(conn)
+            conn.execute(text(f"""
+                INSERT INTO {VALIDATION_REPORT_TABLE}
+                    (table_name, geometry_column, repair_method, rows_checked, invalid, repaired, still_invalid, chunks, seconds, validated_at)
+                VALUES
+                    (:table_name, :geometry_column, :repair_method, :rows_checked, :invalid, :repaired, :still_invalid, :chunks, :seconds, now())
+                ON CONFLICT (table_name, geometry_column) DO UPDATE SET
+                    repair_method = EXCLUDED.repair_method,
+                    rows_checked = EXCLUDED.rows_checked,
+                    invalid = EXCLUDED.invalid,
+                    repaired = EXCLUDED.repaired,
+                    still_invalid = EXCLUDED.still_invalid,
+                    chunks = EXCLUDED.chunks,
+                    seconds = EXCLUDED.seconds,
+                    validated_at = EXCLUDED.validated_at
+            """), report)
+            conn.commit()
+            logger.debug(f"Recorded geometry validation report for {report['table_name']}")
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to record geometry validation report for {report['table_name']}: {e}")
+        return False
+
+def get_table_state(db_engine, table_name, id_column='id'):
+    """
+    Summarizes the contents of a table, to tell whether it has changed since it was last read.
+
+    The row count and largest id are always read. If the table was collected by a data source whose collection
+    was recorded in the collection catalog, the time of that collection identifies its contents. Otherwise the
+    table's storage file, which changes when the table is recreated, truncated or rewritten, and its cumulative
+    counts of inserted, updated and deleted rows from pg_stat_user_tables identify them, without reading the rows.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+        id_column (str): Column whose largest value is read, if the table has it.
+
+    Returns:
+        dict: State with row_count, max_id and either collected_at or relfilenode and modifications, or None if the
+            table could not be read.
+    """
+    try:
+        with db_engine.connect() as conn:
+            if conn.execute(text("SELECT to_regclass(:table_name) IS NULL"), {"table_name": table_name}).scalar():
+                return None
+            has_id = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = to_regclass(:table_name) AND attname = :column_name AND NOT attisdropped
+                )
+            """), {"table_name": table_name, "column_name": id_column}).scalar()
+            max_id = f"max({id_column})" if has_id else "NULL"
+            row_count, max_id = conn.execute(text(f"SELECT count(*), {max_id} FROM {table_name}")).one()
+            state = {'row_count': row_count, 'max_id': None if max_id is None else str(max_id)}
+
+            collected_at = None
+            if conn.execute(text("SELECT to_regclass(:catalog) IS NOT NULL"), {"catalog": COLLECTION_CATALOG_TABLE}).scalar():
+                collected_at = conn.execute(
+                    text(f"SELECT max(collected_at) FROM {COLLECTION_CATALOG_TABLE} WHERE table_name = :table_name"),
+                    {"table_name": table_name}
+                ).scalar()
+            if collected_at is not None:
+                state['collected_at'] = collected_at.isoformat()
+            else:
+                relfilenode, inserted, updated, deleted = conn.execute(text("""
+                    SELECT c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+                    FROM pg_class c
+                    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+                    WHERE c.oid = to_regclass(:table_name)
+                """), {"table_name": table_name}).one()
+                state['relfilenode'] = relfilenode
+                state['modifications'] = [inserted, updated, deleted]
+            return state
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to read the state of table {table_name}: {e}")
+        return None
+
+def drop_table(db_engine, table_name):
+    """
+    Drops a table if it exists.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table to drop.
+
+    Returns:
+        bool: True if the table was dropped or did not exist, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+            conn.commit()
+            logger.debug(f"Dropped table {table_name}")
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to drop table {table_name}: {e}")
+        return False
+
+def get_table_row_count(db_engine, table_name):
+    """
+    Counts the rows in a table.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+
+    Returns:
+        int: Number of rows, or None if the table could not be read.
+    """
+    try:
+        with db_engine.connect() as conn:
+            return conn.execute(text(f"SELECT count(*) FROM {table_name}")).scalar()
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to count rows in table {table_name}: {e}")
+        return None
+
+def get_column_values(db_engine, table_name, column_name):
+    """
+    Reads every value of a column.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+        column_name (str): Name of the column.
+
+    Returns:
+        list: Value of each row, in no particular order, or None if the table could not be read.
+    """
+    try:
+        with db_engine.connect() as conn:
+            return conn.execute(text(f"SELECT {column_name} FROM {table_name}")).scalars().all()
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to read column {column_name} of table {table_name}: {e}")
+        return None
+
+def delete_rows_by_values(db_engine, table_name, column_name, values, chunk_size=10000):
+    """
+    Deletes the rows whose column value is one of the given values, in one transaction.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+        column_name (str): Name of the column the values are matched against.
+        values (list): Values of the rows to delete.
+        chunk_size (int): Number of values sent in each DELETE statement.
+
+    Returns:
+        int: Number of rows deleted, or None if the rows could not be deleted.
+    """
+    try:
+        deleted = 0
+        with db_engine.connect() as conn:
+            for start in range(0, len(values), chunk_size):
+                result = conn.execute(
+                    text(f"DELETE FROM {table_name} WHERE {column_name} = ANY(:values)"),
+                    {'values': list(values[start:start + chunk_size])}
+                )
+                deleted += result.rowcount
+            conn.commit()
+        logger.debug(f"Deleted {deleted} rows from table {table_name}")
+        return deleted
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to delete rows from table {table_name}: {e}")
+        return None
+
+def delete_duplicate_rows(db_engine, table_name, column_name):
+    """
+    Deletes the rows whose column value repeats that of another row, keeping one row for each value.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+        column_name (str): Name of the column that should be unique.
+
+    Returns:
+        int: Number of rows deleted, or None if the rows could not be deleted.
+    """
+    try:
+        with db_engine.connect() as conn:
+            result = conn.execute(text(f"""
+                DELETE FROM {table_name} duplicate
+                USING {table_name} original
+                WHERE duplicate.{column_name} = original.{column_name}
+                AND duplicate.ctid > original.ctid
+            """))
+            conn.commit()
+        logger.debug(f"Deleted {result.rowcount} duplicate rows from table {table_name}")
+        return result.rowcount
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to delete duplicate rows from table {table_name}: {e}")
+        return None
+
+def create_staging_table(db_engine, staging_table, table_columns):
+    """
+    Creates an empty UNLOGGED staging table with an id primary key and the given columns, replacing any existing one.
+
+    Writes to an unlogged table skip the write-ahead log, so a collection loads faster than into a regular table.
+    Its contents are lost if the server crashes, which is acceptable for a table that is rebuilt from its source.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        staging_table (str): Name of the staging table.
+        table_columns (dict): Dictionary of column names and their data types.
+
+    Returns:
+        bool: True if the table was created, False otherwise.
+    """
+    column_definitions = ''.join(f", {column_name} {column_type}" for column_name, column_type in table_columns.items() if column_name != 'id')
+    try:
+        with db_engine.connect() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging_table}"))
+            conn.execute(text(f"CREATE UNLOGGED TABLE {staging_table} (id SERIAL PRIMARY KEY{column_definitions})"))
+            conn.commit()
+            logger.debug(f"Created staging table {staging_table}")
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to create staging table {staging_table}: {e}")
+        return False
+
+def create_spatial_indexes(db_engine, table_name, table_columns):
+    """
+    Creates a GiST index on each geometry or geography column of a table.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table.
+        table_columns (dict): Dictionary of column names and their data types.
+
+    Returns:
+        bool: True if the indexes were created, False otherwise.
+    """
+    spatial_columns = [
+        column_name for column_name, column_type in table_columns.items()
+        if str(column_type).strip().lower().startswith(('geometry', 'geography'))
+    ]
+    try:
+        with db_engine.connect() as conn:
+            for column_name in spatial_columns:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table_name}_{column_name}_gist ON {table_name} USING GIST ({column_name})"))
+                logger.debug(f"Created spatial index on {table_name}.{column_name}")
+            conn.commit()
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to create spatial indexes on table {table_name}: {e}")
+        return False
+
+def swap_in_staging_table(db_engine, staging_table, table_name):
+    """
+    Replaces a table with a fully loaded staging table.
+
+    The staging table is first made durable with SET LOGGED. The old table is then dropped and the staging table
+    renamed in its place in a single transaction, so readers see either the old table or the new one, never a
+    partial load. The staging table's indexes and id sequence are renamed after the table they now belong to.
+    The swap fails, leaving the old table in place, if views or foreign keys depend on the old table.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        staging_table (str): Name of the loaded staging table.
+        table_name (str): Name of the table to replace.
+
+    Returns:
+        bool: True if the staging table was swapped in, False otherwise.
+    """
+    replaced_table = f"{table_name}__replaced"
+    try:
+        with db_engine.connect() as conn:
+            conn.execute(text(f"ALTER TABLE {staging_table} SET LOGGED"))
+            conn.commit()
+
+            if conn.execute(text("SELECT to_regclass(:table_name) IS NOT NULL"), {"table_name": table_name}).scalar():
+                conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {replaced_table}"))
+            conn.execute(text(f"ALTER TABLE {staging_table} RENAME TO {table_name}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {replaced_table}"))
+
+            staging_prefix = staging_table.lower()
+            index_names = conn.execute(text("""
+                SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = to_regclass(:table_name)
+            """), {"table_name": table_name}).scalars().all()
+            for index_name in index_names:
+                if index_name.startswith(staging_prefix):
+                    conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {table_name.lower()}{index_name[len(staging_prefix):]}"))
+            sequence_name = conn.execute(text("SELECT pg_get_serial_sequence(:table_name, 'id')"), {"table_name": table_name}).scalar()
+            if sequence_name and sequence_name.split('.')[-1].strip('"') != f"{table_name.lower()}_id_seq":
+                conn.execute(text(f"ALTER SEQUENCE {sequence_name} RENAME TO {table_name.lower()}_id_seq"))
+            conn.commit()
+            logger.debug(f"Swapped staging table {staging_table} in as {table_name}")
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to swap staging table {staging_table} in as {table_name}: {e}")
+        return False
+
+def create_checkpoint_table(db_engine, checkpoint_table):
+    """
+    Creates an empty checkpoint table for a collection, replacing any existing one.
+
+    Each row records a page whose features have been committed to the source table. range_start and range_end
+    give the page's position in the collection (end exclusive), run_signature identifies the collection the page
+    belongs to and table_signature the source table's column definitions.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        checkpoint_table (str): Name of the checkpoint table.
+
+    Returns:
+        bool: True if the table was created, False otherwise.
+    """
+    try:
+        with db_engine.connect() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {checkpoint_table}"))
+            conn.execute(text(f"""
+                CREATE TABLE {checkpoint_table} (
+                    page_key varchar PRIMARY KEY,
+                    range_start bigint NOT NULL,
+                    range_end bigint NOT NULL,
+                    feature_count integer NOT NULL,
+                    run_signature varchar NOT NULL,
+                    table_signature varchar NOT NULL,
+                    completed_at timestamptz NOT NULL DEFAULT now()
+                )
+            """))
+            conn.commit()
+            logger.debug(f"Created checkpoint table {checkpoint_table}")
+            return True
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to create checkpoint table {checkpoint_table}: {e}")
+        return False
+
+def get_checkpoints(db_engine, checkpoint_table):
+    """
+    Reads the completed pages recorded in a checkpoint table.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        checkpoint_table (str): Name of the checkpoint table.
+
+    Returns:
+        list: List of dicts with page_key, range_start, range_end, feature_count, run_signature and table_signature.
+            Empty if the table does not exist.
+    """
+    if not table_exists(db_engine, checkpoint_table):
+        return []
+    try:
+        with db_engine.connect() as conn:
+            result = conn.execute(text(f"SELECT page_key, range_start, range_end, feature_count, run_signature, table_signature FROM {checkpoint_table}"))
+            return [dict(row) for row in result.mappings()]
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to read checkpoints from {checkpoint_table}: {e}")
+        return []
+
+def insert_checkpoints(connection, checkpoint_table, checkpoints):
+    """
+    Records completed pages in a checkpoint table on an open connection without committing.
+
+    Called in the same transaction as the pages' rows, so a page is checkpointed exactly when its rows are committed.
+
+    Args:
+        connection (Connection): SQLAlchemy connection. The caller is responsible for committing.
+        checkpoint_table (str): Name of the checkpoint table.
+        checkpoints (list): List of dicts with page_key, range_start, range_end, feature_count, run_signature and table_signature.
+    """
+    if not checkpoints:
+        return
+    connection.execute(text(f"""
+        INSERT INTO {checkpoint_table} (page_key, range_start, range_end, feature_count, run_signature, table_signature)
+        VALUES (:page_key, :range_start, :range_end, :feature_count, :run_signature, :table_signature)
+        ON CONFLICT (page_key) DO UPDATE SET
+            range_start = EXCLUDED.range_start,
+            range_end = EXCLUDED.range_end,
+            feature_count = EXCLUDED.feature_count,
+            run_signature = EXCLUDED.run_signature,
+            table_signature = EXCLUDED.table_signature,
+            completed_at = now()
+    """), checkpoints)
+
+def geojson_features_to_rows(features, columns, srid=4326):
+    """
+    Converts GeoJSON features into row tuples ordered like the given columns.
+
+    The geometry column is converted to hex-encoded EWKB with geojson_geometries_to_ewkb so it can be
+    loaded directly into a PostGIS geometry column.
+
+    Args:
+        features (list): List of GeoJSON feature dictionaries.
+        columns (list): Ordered list of column names to build the rows for.
+        srid (int): Spatial reference ID to embed in the geometry. Must match the table's geometry column.
+
+    Returns:
+        list: List of row tuples.
+    """
+    wkb_values = geojson_geometries_to_ewkb([feature.get("geometry") for feature in features], srid)
+
+    rows = []
+    for feature, wkb_value in zip(features, wkb_values):
+        props = feature.get("properties") or {}
+        rows.append(tuple(wkb_value if col == "geometry" else props.get(col) for col in columns))
+    return rows
+
+# Nesting depth of the coordinate arrays of each GeoJSON geometry type, and the matching shapely geometry type
+_GEOJSON_RAGGED_TYPES = {
+    'Point': (0, shapely.GeometryType.POINT),
+    'LineString': (1, shapely.GeometryType.LINESTRING),
+    'MultiPoint': (1, shapely.GeometryType.MULTIPOINT),
+    'Polygon': (2, shapely.GeometryType.POLYGON),
+    'MultiLineString': (2, shapely.GeometryType.MULTILINESTRING),
+    'MultiPolygon': (3, shapely.GeometryType.MULTIPOLYGON),
+}
+
+def geojson_geometries_to_ewkb(geometries, srid=4326):
+    """
+    Converts GeoJSON geometry dictionaries into hex-encoded EWKB.
+
+    Geometries are grouped by type, and the coordinates of each group are flattened into one coordinate array
+    with offset arrays for its parts, which shapely turns into geometries in a single vectorized call. No
+    Python object is created per vertex. Z and M values are dropped. Empty parts of a geometry, such as an empty
+    polygon of a MultiPolygon, are removed, and geometries left without coordinates become empty geometries.
+    Geometry collections are converted one at a time.
+
+    Args:
+        geometries (list): GeoJSON geometry dictionaries, or None for features without a geometry.
+        srid (int): Spatial reference ID to embed in the geometry. Must match the table's geometry column.
+
+    Returns:
+        numpy.ndarray: Hex-encoded EWKB strings, None where there is no geometry.
+    """
+    shapes = np.full(len(geometries), None, dtype=object)
+    indexes_by_type = {}
+    for index, geometry in enumerate(geometries):
+        if geometry:
+            indexes_by_type.setdefault(geometry.get("type"), []).append(index)
+    for geometry_type, indexes in indexes_by_type.items():
+        if geometry_type in _GEOJSON_RAGGED_TYPES:
+            depth, ragged_type = _GEOJSON_RAGGED_TYPES[geometry_type]
+            coordinates_by_index = {}
+            for index in indexes:
+                coordinates = geometries[index].get("coordinates")
+                if _has_empty_part(coordinates, depth):
+                    # Empty parts are not supported by from_ragged_array
+                    coordinates = _drop_empty_parts(coordinates, depth)
+                if coordinates:
+                    coordinates_by_index[index] = coordinates
+                else:
+                    shapes[index] = shape({"type": geometry_type, "coordinates": []})
+            if coordinates_by_index:
+                coords, offsets = _flatten_coordinates(list(coordinates_by_index.values()), depth)
+                shapes[list(coordinates_by_index)] = shapely.from_ragged_array(ragged_type, coords, offsets or None)
+        else:
+            shapes[indexes] = [shape(geometries[index]) for index in indexes]
+    return shapely.to_wkb(shapely.set_srid(shapes, srid), hex=True, include_srid=True)
+
+def _flatten_coordinates(coordinates, depth):
+    """
+    Flattens nested GeoJSON coordinate arrays into a coordinate array and the offsets of each nesting level.
+
+    Args:
+        coordinates (list): Coordinate arrays of geometries of one type.
+        depth (int): Number of nesting levels above the coordinate pairs.
+
+    Returns:
+        tuple: (numpy.ndarray of x, y pairs, tuple of offset arrays from the innermost level outwards).
+    """
+    offsets = []
+    parts = coordinates
+    for _ in range(depth):
+        offsets.append(np.cumsum([0] + [len(part) for part in parts]))
+        parts = [item for part in parts for item in part]
+    try:
+        coords = np.asarray(parts, dtype=float)[:, :2]
+    except ValueError:
+        # Mixed 2D and 3D coordinates
+        coords = np.asarray([point[:2] for point in parts], dtype=float)
+    return coords.reshape(-1, 2), tuple(reversed(offsets))
+
+def _has_empty_part(coordinates, depth):
+    """
+    Checks whether GeoJSON coordinates, or any of their parts above the coordinate pairs, are empty.
+
+    Args:
+        coordinates (list): Coordinate array of one geometry.
+        depth (int): Number of nesting levels above the coordinate pairs.
+
+    Returns:
+        bool: True if the coordinates or one of their parts are empty.
+    """
+    if not coordinates:
+        return True
+    if depth <= 1:
         return False
+    return any(_has_empty_part(part, depth - 1) for part in coordinates)
+
+def _drop_empty_parts(coordinates, depth):
+    """
+    Removes the empty parts of GeoJSON coordinates, at every nesting level above the coordinate pairs.
+
+    Args:
+        coordinates (list): Coordinate array of one geometry.
+        depth (int): Number of nesting levels above the coordinate pairs.
+
+    Returns:
+        list: Coordinates without empty parts, empty if every part was empty.
+    """
+    if not coordinates or depth <= 1:
+        return coordinates
+    parts = [_drop_empty_parts(part, depth - 1) for part in coordinates]
+    return [part for part in parts if part]
+
+def encode_copy_lines(rows):
+    """
+    Encodes row tuples as lines of the PostgreSQL COPY text format.
+
+    Args:
+        rows (list): List of row tuples.
+
+    Returns:
+        list: One UTF-8 encoded line per row, ending in a newline.
+    """
+    return [('\t'.join(_copy_text_value(value) for value in row) + '\n').encode('utf-8') for row in rows]
+
+# Signature, flags and header extension length that start a binary COPY stream, and the end-of-data marker
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+PGCOPY_TRAILER = b'\xff\xff'
+
+def _copy_text_value(value):
+    """
+    Formats a single value for the PostgreSQL COPY text format.
+
+    Args:
+        value: Value to format.
+
+    Returns:
+        str: Escaped value, or the COPY null marker for None.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def supports_copy(connection):
+    """
+    Checks whether the DBAPI driver behind the connection supports COPY FROM STDIN.
+
+    Args:
+        connection (Connection): SQLAlchemy connection.
+
+    Returns:
+        bool: True if the driver cursor exposes copy_expert (psycopg2), False otherwise.
+    """
+    cursor = connection.connection.cursor()
+    try:
+        return hasattr(cursor, 'copy_expert')
+    finally:
+        cursor.close()
+
+# Load methods kept as aliases of the method now used for them
+DEPRECATED_LOAD_METHODS = {'insert': 'executemany'}
+
+def resolve_load_method(load_method):
+    """
+    Maps a deprecated load method to the method now used for it, warning that it is deprecated.
+
+    The 'insert' method, which inserted features one at a time, is loaded with 'executemany'.
+
+    Args:
+        load_method (str): Configured load method.
+
+    Returns:
+        str: Load method to use.
+    """
+    if load_method in DEPRECATED_LOAD_METHODS:
+        replacement = DEPRECATED_LOAD_METHODS[load_method]
+        logger.warning(f"Load method '{load_method}' is deprecated; using '{replacement}' instead")
+        return replacement
+    return load_method
+
+def insert_rows(connection, table_name, columns, rows, load_method='copy'):
+    """
+    Inserts row tuples into a table on an open connection without committing.
+
+    The 'copy' method streams the rows with COPY FROM STDIN in text format, and the 'copy_lines' method streams
+    rows already encoded as text lines by encode_copy_lines. The 'binary' method streams rows already encoded as
+    binary COPY tuples, which the server reads without parsing text. The 'executemany' method
+    sends a single parameterized INSERT with all rows, which the driver batches into VALUES lists.
+    If COPY is requested but the driver does not support it, the executemany method is used instead.
+
+    Args:
+        connection (Connection): SQLAlchemy connection. The caller is responsible for committing.
+        table_name (str): Name of the table to insert into.
+        columns (list): Ordered list of column names matching the row tuples.
+        rows (list): List of row tuples. Geometry values must be hex-encoded EWKB. For 'copy_lines', a list of
+            lines encoded by encode_copy_lines, and for 'binary', a list of tuples encoded by ArrowRowEncoder.binary_rows.
+        load_method (str): 'copy', 'copy_lines', 'binary' or 'executemany'. The deprecated 'insert' is loaded
+            with 'executemany'.
+
+    Returns:
+        int: Number of rows inserted.
+
+    Raises:
+        ValueError: If pre-encoded rows are given but the driver does not support COPY.
+    """
+    if not rows:
+        return 0
+
+    load_method = DEPRECATED_LOAD_METHODS.get(load_method, load_method)
+    if load_method in ('copy_lines', 'binary') and not supports_copy(connection):
+        raise ValueError(f"Load method {load_method} requires a database driver that supports COPY")
+    if load_method == 'copy' and not supports_copy(connection):
+        logger.warning("Database driver does not support COPY; falling back to executemany")
+        load_method = 'executemany'
+
+    # Make sure SQLAlchemy tracks the transaction so that a later commit() applies to raw cursor work
+    if not connection.in_transaction():
+        connection.begin()
+
+    if load_method in ('copy', 'copy_lines'):
+        buffer = io.BytesIO(b''.join(encode_copy_lines(rows) if load_method == 'copy' else rows))
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+    elif load_method == 'binary':
+        buffer = io.BytesIO(b''.join((PGCOPY_HEADER, *rows, PGCOPY_TRAILER)))
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", buffer)
+        finally:
+            cursor.close()
+    elif load_method == 'executemany':
+        placeholders = [f"CAST(:{col} AS geometry)" if col == "geometry" else f":{col}" for col in columns]
+        sql = text(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(placeholders)})")
+        connection.execute(sql, [dict(zip(columns, row)) for row in rows])
+    else:
+        raise ValueError(f"Unknown load method: {load_method}")
+
+    return len(rows)
 
 def run_intersection(db_engine, join_table, j_geom_col_name, target_table, t_geom_col_name, target_field, intersect_col_name):
     """
@@ -368,46 +1227,35 @@ def run_intersection(db_engine, join_table, j_geom_col_name, target_table, t_geo
         return False
     return True
 
-def validate_geometry(table_name, geom_col, db_engine):
+def validate_geometry(table_name, geom_col, db_engine, repair='make_valid', chunk_size=50000, max_workers=2):
     """
     Validates and fixes the geometry column in the specified table.
 
+    The table is split into ranges of ids that are checked and repaired at the same time on separate connections,
+    each committed on its own. See GeometryValidator.
+
     Args:
         table_name (str): Name of the table containing the geometry column.
         geom_col (str): Name of the geometry column to validate.
         db_engine (Engine): SQLAlchemy database engine.
+        repair (str): Repair method, 'make_valid' or 'buffer'.
+        chunk_size (int): Width of each range of ids.
+        max_workers (int): Maximum number of ranges validated at once.
 
     Returns:
         bool: True if all geometries are valid or successfully fixed, False otherwise.
     """
-    try:
-        with db_engine.connect() as connection:
-            # Attempt to fix invalid geometries
-            fix_invalid_sql = f"""
-            UPDATE {table_name}
-            SET {geom_col} = ST_MakeValid({geom_col})
-            WHERE NOT ST_IsValid({geom_col});
-            """
-            connection.execute(text(fix_invalid_sql))
+    # Imported here because the validator uses this module's helpers
+    from modules.data_management.sql_utils.sql_geometry_validation import GeometryValidator
 
-            # Re-check for invalid geometries
-            find_invalid_sql = f"""
-            SELECT {geom_col}
-            FROM {table_name}
-            WHERE NOT ST_IsValid({geom_col});
-            """
-            result = connection.execute(text(find_invalid_sql))
-            invalid_geometries = result.fetchall()
-
-            if invalid_geometries:
-                logger.error(f"Failed to fix all invalid geometries in table {table_name}.")
-                return False
-            else:
-                logger.info(f"All invalid geometries in table {table_name} have been successfully fixed.")
-                return True
-    except SQLAlchemyError as e:
-        logger.error(f"Error validating geometries in table {table_name}: {e}")
+    report = GeometryValidator(db_engine, table_name, geom_col, repair=repair, chunk_size=chunk_size, max_workers=max_workers).validate()
+    if report is None:
         return False
+    if report['still_invalid']:
+        logger.error(f"Failed to fix all invalid geometries in table {table_name}.")
+        return False
+    logger.info(f"All invalid geometries in table {table_name} have been successfully fixed.")
+    return True
 
 def left_join_table(db_engine, join_column, original_table, joining_table, output_table, include_columns, exclude_columns):
     """
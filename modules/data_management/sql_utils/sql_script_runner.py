@@ -0,0 +1,318 @@
+"""
+sql_script_runner.py
+
+Contains split_sql_statements, which splits a SQL script into its statements while respecting string literals,
+quoted identifiers, dollar-quoted bodies and comments, and the SqlScriptRunner class, which runs a script's
+statements in one transaction and records the time taken and rows affected by each. For statements slower than
+a threshold, the runner can also keep the plan reported by EXPLAIN (ANALYZE, BUFFERS).
+"""
+
+import logging
+import re
+import time
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+_DOLLAR_TAG = re.compile(r'\$([A-Za-z_][A-Za-z0-9_]*)?\$')
+_IDENTIFIER_CHARACTER = re.compile(r'[\w$]')
+
+_IDENTIFIER = r'(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*)'
+_QUALIFIED_NAME = rf'{_IDENTIFIER}(?:\s*\.\s*{_IDENTIFIER})*'
+# Options CREATE TABLE AS and CREATE MATERIALIZED VIEW accept between the name and AS. A column list or WITH
+# list holding parentheses, such as a generated column, marks a plain CREATE TABLE, which EXPLAIN rejects
+_CREATE_AS_OPTIONS = (
+    r'(?:\s*\([^()]*\))?\s+'
+    rf'(?:USING\s+{_IDENTIFIER}\s+)?'
+    r'(?:WITH\s*\([^()]*\)\s*|WITHOUT\s+OIDS\s+)?'
+    r'(?:ON\s+COMMIT\s+(?:PRESERVE\s+ROWS|DELETE\s+ROWS|DROP)\s+)?'
+    rf'(?:TABLESPACE\s+{_IDENTIFIER}\s+)?'
+)
+_CREATE_AS_QUERY = r'AS\s*(?:\(|(?:SELECT|WITH|VALUES|TABLE|EXECUTE)\b)'
+
+# Statements EXPLAIN accepts, so they can be run under EXPLAIN ANALYZE
+_EXPLAINABLE = re.compile(
+    r'^(?:(?:SELECT|INSERT|UPDATE|DELETE|MERGE|VALUES|EXECUTE|WITH|TABLE)\b'
+    r'|CREATE\s+(?:(?:GLOBAL|LOCAL)\s+)?(?:(?:TEMP|TEMPORARY|UNLOGGED)\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+    rf'{_QUALIFIED_NAME}{_CREATE_AS_OPTIONS}{_CREATE_AS_QUERY}'
+    r'|CREATE\s+MATERIALIZED\s+VIEW\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+    rf'{_QUALIFIED_NAME}{_CREATE_AS_OPTIONS}{_CREATE_AS_QUERY})',
+    re.IGNORECASE
+)
+_MODIFY_NODE = re.compile(r'^\s*(?:Insert|Update|Delete|Merge) on ')
+_ACTUAL_ROWS = re.compile(r'\(actual\b[^)]*?\brows=(\d+)')
+
+def split_sql_statements(script: str) -> List[str]:
+    """
+    Splits a SQL script into statements at the semicolons that end them.
+
+    Semicolons inside string literals ('...', including E'...' with backslash escapes), quoted identifiers
+    ("..."), dollar-quoted bodies ($$...$$ or $tag$...$tag$) and comments do not end a statement. Comments
+    are removed, and statements left empty are dropped.
+
+    Args:
+        script (str): SQL script.
+
+    Returns:
+        List[str]: Statements without their ending semicolon, stripped of surrounding whitespace.
+
+    Raises:
+        ValueError: If a string literal, quoted identifier, dollar-quoted body or block comment is not closed.
+    """
+    statements = []
+    current = []
+    i = 0
+    length = len(script)
+    while i < length:
+        character = script[i]
+        previous = script[i - 1] if i else ''
+        if character == '-' and script.startswith('--', i):
+            end = script.find('\n', i)
+            i = length if end == -1 else end
+            current.append(' ')
+        elif character == '/' and script.startswith('/*', i):
+            i = _block_comment_end(script, i)
+            current.append(' ')
+        elif character == "'":
+            escapes = previous in ('E', 'e') and (i < 2 or not _IDENTIFIER_CHARACTER.match(script[i - 2]))
+            end = _quoted_end(script, i, "'", escapes)
+            current.append(script[i:end])
+            i = end
+        elif character == '"':
+            end = _quoted_end(script, i, '"', False)
+            current.append(script[i:end])
+            i = end
+        elif character == '$' and not _IDENTIFIER_CHARACTER.match(previous) and _DOLLAR_TAG.match(script, i):
+            tag = _DOLLAR_TAG.match(script, i).group(0)
+            end = script.find(tag, i + len(tag))
+            if end == -1:
+                raise ValueError(f"Unterminated dollar-quoted string starting at character {i}")
+            end += len(tag)
+            current.append(script[i:end])
+            i = end
+        elif character == ';':
+            _add_statement(statements, current)
+            current = []
+            i += 1
+        else:
+            current.append(character)
+            i += 1
+    _add_statement(statements, current)
+    return statements
+
+def _add_statement(statements, parts):
+    """
+    Adds the statement built from the given parts, unless it is empty.
+
+    Args:
+        statements (list): Statements found so far.
+        parts (list): Pieces of the statement's text.
+    """
+    statement = ''.join(parts).strip()
+    if statement:
+        statements.append(statement)
+
+def _quoted_end(script, start, quote, escapes):
+    """
+    Finds the end of a string literal or quoted identifier, where a doubled quote stands for the quote itself.
+
+    Args:
+        script (str): SQL script.
+        start (int): Position of the opening quote.
+        quote (str): Quote character.
+        escapes (bool): Whether a backslash escapes the next character, as in E'...' strings.
+
+    Returns:
+        int: Position just after the closing quote.
+
+    Raises:
+        ValueError: If the quote is not closed.
+    """
+    i = start + 1
+    while i < len(script):
+        if escapes and script[i] == '\\':
+            i += 2
+        elif script[i] == quote:
+            if script.startswith(quote * 2, i):
+                i += 2
+            else:
+                return i + 1
+        else:
+            i += 1
+    raise ValueError(f"Unterminated quoted text starting at character {start}")
+
+def _block_comment_end(script, start):
+    """
+    Finds the end of a block comment, which may contain nested block comments.
+
+    Args:
+        script (str): SQL script.
+        start (int): Position of the opening '/*'.
+
+    Returns:
+        int: Position just after the closing '*/'.
+
+    Raises:
+        ValueError: If the comment is not closed.
+    """
+    depth = 0
+    i = start
+    while i < len(script):
+        if script.startswith('/*', i):
+            depth += 1
+            i += 2
+        elif script.startswith('*/', i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    raise ValueError(f"Unterminated block comment starting at character {start}")
+
+class StatementResult:
+    """
+    Time taken and rows affected by one statement of a script.
+
+    Attributes:
+        number (int): One-based position of the statement in the script.
+        statement (str): Text of the statement.
+        seconds (float): Wall time taken by the statement.
+        rows (int): Rows affected or returned, or None if the statement does not report a count.
+        plan (str): Plan reported by EXPLAIN (ANALYZE, BUFFERS), kept if the statement was slower than the threshold, or None.
+    """
+    def __init__(self, number: int, statement: str, seconds: float, rows: Optional[int], plan: Optional[str] = None) -> None:
+        self.number: int = number
+        self.statement: str = statement
+        self.seconds: float = seconds
+        self.rows: Optional[int] = rows
+        self.plan: Optional[str] = plan
+
+    def describe(self, width: int = 80) -> str:
+        """
+        Builds a one-line description of the statement and its timing.
+
+        Args:
+            width (int): Maximum number of characters of the statement shown.
+
+        Returns:
+            str: Description with the statement number, time, rows and the start of the statement.
+        """
+        statement = ' '.join(self.statement.split())
+        if len(statement) > width:
+            statement = statement[:width - 3] + '...'
+        rows = '' if self.rows is None else f", {self.rows} rows"
+        return f"statement {self.number} ({self.seconds:.2f}s{rows}): {statement}"
+
+class SqlScriptRunner:
+    """
+    Runs the statements of a SQL script in a single transaction, timing each one.
+
+    Statements are sent to the driver as written and without parameters, so colons and percent signs in them, as in
+    LIKE 'x%' or format('%I'), are not read as placeholders by SQLAlchemy or by psycopg2.
+    With an explain threshold, each statement EXPLAIN accepts is run as EXPLAIN (ANALYZE, BUFFERS), which
+    executes it while reporting its plan, and the plan is kept if the statement took longer than the threshold.
+    Other statements are run as they are.
+
+    Attributes:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        explain_threshold_seconds (float): Statements slower than this keep their EXPLAIN (ANALYZE, BUFFERS) plan, or None to run statements without EXPLAIN.
+        results (List[StatementResult]): Results of the statements run by the last call to run.
+    """
+    def __init__(self, db_engine: Engine, explain_threshold_seconds: Optional[float] = None) -> None:
+        """
+        Initializes the SqlScriptRunner.
+
+        Args:
+            db_engine (Engine): SQLAlchemy engine connected to the database.
+            explain_threshold_seconds (float, optional): Statements slower than this keep their plan. If None,
+                statements are run without EXPLAIN.
+        """
+        self.db_engine: Engine = db_engine
+        self.explain_threshold_seconds: Optional[float] = explain_threshold_seconds
+        self.results: List[StatementResult] = []
+
+    def run(self, script: str, label: str) -> bool:
+        """
+        Runs every statement of a script in one transaction, rolling it back if a statement fails.
+
+        Args:
+            script (str): SQL script.
+            label (str): Name used for the script in log messages.
+
+        Returns:
+            bool: True if every statement ran and the transaction was committed, False otherwise.
+        """
+        self.results = []
+        try:
+            statements = split_sql_statements(script)
+        except ValueError as e:
+            logger.error(f"Could not split the SQL for {label} into statements: {e}")
+            return False
+        try:
+            with self.db_engine.connect() as connection:
+                trans = connection.begin()
+                try:
+                    for number, statement in enumerate(statements, start=1):
+                        logger.debug(f"Executing SQL for {label}: {statement}")
+                        result = self._run_statement(connection, number, statement)
+                        self.results.append(result)
+                        logger.debug(f"Ran {result.describe()} of {len(statements)} for {label}")
+                        if result.plan is not None:
+                            logger.info(f"Plan of slow {result.describe()} for {label}:\n{result.plan}")
+                    trans.commit()
+                    return True
+                except SQLAlchemyError as e:
+                    trans.rollback()
+                    logger.error(f"Error executing SQL for {label}: {e}")
+        except SQLAlchemyError as e:
+            logger.error(f"Error connecting to the database for {label}: {e}")
+        return False
+
+    def _run_statement(self, connection, number: int, statement: str) -> StatementResult:
+        """
+        Runs one statement, under EXPLAIN (ANALYZE, BUFFERS) if a threshold is set and EXPLAIN accepts it.
+
+        Args:
+            connection (Connection): SQLAlchemy connection holding the transaction.
+            number (int): One-based position of the statement in the script.
+            statement (str): Text of the statement.
+
+        Returns:
+            StatementResult: Time taken, rows affected and, for a slow explained statement, its plan.
+        """
+        connection = connection.execution_options(no_parameters=True)
+        if self.explain_threshold_seconds is not None and _EXPLAINABLE.match(statement):
+            start_time = time.perf_counter()
+            plan_lines = [row[0] for row in connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}")]
+            seconds = time.perf_counter() - start_time
+            plan = '\n'.join(plan_lines) if seconds > self.explain_threshold_seconds else None
+            return StatementResult(number, statement, seconds, _plan_rows(plan_lines), plan)
+
+        start_time = time.perf_counter()
+        result = connection.exec_driver_sql(statement)
+        seconds = time.perf_counter() - start_time
+        rows = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else None
+        return StatementResult(number, statement, seconds, rows)
+
+def _plan_rows(plan_lines):
+    """
+    Reads the number of rows a statement affected or returned from its EXPLAIN ANALYZE plan.
+
+    For INSERT, UPDATE, DELETE and MERGE the rows produced by the node below the modifying node are used,
+    since the modifying node itself reports rows only for RETURNING.
+
+    Args:
+        plan_lines (list): Lines of the plan in text format.
+
+    Returns:
+        int: Number of rows, or None if the plan does not report them.
+    """
+    node_lines = [line for line in plan_lines if _ACTUAL_ROWS.search(line)]
+    if not node_lines:
+        return None
+    if _MODIFY_NODE.match(node_lines[0]) and len(node_lines) > 1:
+        return int(_ACTUAL_ROWS.search(node_lines[1]).group(1))
+    return int(_ACTUAL_ROWS.search(node_lines[0]).group(1))
@@ -0,0 +1,136 @@
+"""
+sql_session_profiles.py
+
+Applies named profiles of PostgreSQL session settings, such as work_mem, maintenance_work_mem, parallel worker
+limits and synchronous_commit, to the transactions of a program stage. Profiles are configured once with
+configure_session_profiles(), and each stage runs on the engine returned by with_session_profile(), whose
+connections set the profile's values with SET LOCAL semantics at the start of every transaction. The values
+revert when the transaction ends, so server-wide settings and other stages are unaffected.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+_session_profiles: Dict[str, Dict[str, str]] = {}
+
+def configure_session_profiles(db_engine: Engine, profiles: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """
+    Sets the session profiles stages can run with, and has the engine apply them when transactions begin.
+
+    Settings unknown to the server are dropped with a warning, since setting them would abort every transaction
+    of the stage. Custom settings, whose names contain a dot, are kept as given. Passing no profiles removes them.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        profiles (dict, optional): Settings of each profile, by profile name, such as {'prepare': {'work_mem': '256MB'}}.
+
+    Returns:
+        dict: Settings of each profile kept, with values as text.
+    """
+    global _session_profiles
+    _session_profiles = {}
+    for profile_name, settings in (profiles or {}).items():
+        if settings:
+            _session_profiles[profile_name] = {str(name): _setting_value(value) for name, value in settings.items()}
+    if not _session_profiles:
+        return _session_profiles
+
+    known_settings = _get_known_settings(db_engine)
+    if known_settings is not None:
+        for profile_name, settings in _session_profiles.items():
+            for name in [name for name in settings if '.' not in name and name.lower() not in known_settings]:
+                logger.warning(f"Session profile {profile_name} sets unknown setting {name}; ignoring it")
+                del settings[name]
+
+    if not event.contains(db_engine, 'begin', _apply_session_profile):
+        event.listen(db_engine, 'begin', _apply_session_profile)
+    for profile_name, settings in _session_profiles.items():
+        logger.info(f"Session profile {profile_name}: {_describe(settings)}")
+    return _session_profiles
+
+def with_session_profile(db_engine: Engine, profile_name: str) -> Engine:
+    """
+    Gets an engine sharing the connection pool of the given engine whose transactions apply a session profile.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        profile_name (str): Name of the profile.
+
+    Returns:
+        Engine: Engine applying the profile, or the given engine if the profile is not configured.
+    """
+    settings = _session_profiles.get(profile_name)
+    if not settings:
+        return db_engine
+    logger.info(f"Running with session profile {profile_name}: {_describe(settings)}")
+    return db_engine.execution_options(session_profile=profile_name)
+
+def _apply_session_profile(conn) -> None:
+    """
+    Sets the values of the connection's session profile for the transaction being started.
+
+    Called by SQLAlchemy when a transaction begins. The values are set with set_config(name, value, true),
+    the function form of SET LOCAL, on the driver's connection, which opens the transaction the statements
+    of the transaction then run in.
+
+    Args:
+        conn (Connection): SQLAlchemy connection starting a transaction.
+    """
+    settings = _session_profiles.get(conn.get_execution_options().get('session_profile'))
+    if not settings or conn.dialect.name != 'postgresql':
+        return
+    calls = ', '.join('set_config(%s, %s, true)' for _ in settings)
+    parameters = [item for name_value in settings.items() for item in name_value]
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"SELECT {calls}", parameters)
+    finally:
+        cursor.close()
+
+def _get_known_settings(db_engine: Engine) -> Optional[set]:
+    """
+    Reads the names of the settings the server knows.
+
+    Args:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+
+    Returns:
+        set: Lower-cased setting names, or None if they could not be read.
+    """
+    try:
+        with db_engine.connect() as conn:
+            return {row[0].lower() for row in conn.execute(text("SELECT name FROM pg_settings"))}
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not read the server's settings to check session profiles: {e}")
+        return None
+
+def _setting_value(value: Any) -> str:
+    """
+    Converts a configured value to the text set_config expects.
+
+    Args:
+        value: Configured value. YAML reads on and off as booleans.
+
+    Returns:
+        str: Value as text.
+    """
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    return str(value)
+
+def _describe(settings: Dict[str, str]) -> str:
+    """
+    Builds a one-line description of a profile's settings.
+
+    Args:
+        settings (dict): Values by setting name.
+
+    Returns:
+        str: Comma-separated name=value pairs.
+    """
+    return ', '.join(f"{name}={value}" for name, value in settings.items())
@@ -61,4 +61,106 @@ def update_points_with_intersection(engine, points_table, polygons_table, points
     elif 'postgresql' in str(engine.url):
         logger.error("PostGIS support is not yet implemented.")
     else:
-        logger.error("Unsupported SQL backend.")
\ No newline at end of file
+        logger.error("Unsupported SQL backend.")
+
+def subdivision_sql(table_name, geometry_column='geometry_transformed', max_vertices=256, id_column='id', feature_id_column='source_feature_id'):
+    """
+    Builds the SQL that splits the large polygons of a PostGIS table into pieces of at most max_vertices vertices.
+
+    Each piece is a copy of its feature's row with the geometry replaced, so every attribute is carried through.
+    Columns with a default, such as a serial key, get new values for the pieces. The feature's id is first copied
+    into feature_id_column, which maps every piece back to the feature it was cut from. The rows split are
+    identified by their ctid before the pieces are inserted, and only those rows are deleted, so pieces that are
+    still above max_vertices, which ST_Subdivide can leave, are kept. The GIST indexes on the
+    geometry column are dropped before splitting and a single one is built afterwards, and the table is analyzed.
+
+    Args:
+        table_name (str): Name of the table.
+        geometry_column (str): Name of the geometry column to split.
+        max_vertices (int): Largest number of vertices kept in one geometry. Must be at least 5.
+        id_column (str): Column identifying the original features.
+        feature_id_column (str): Column added to hold each piece's original feature id. Left as it is if it already exists.
+
+    Returns:
+        str: SQL script of a DO block followed by ANALYZE.
+
+    Raises:
+        ValueError: If max_vertices is below 5.
+    """
+    max_vertices = int(max_vertices)
+    if max_vertices < 5:
+        raise ValueError(f"max_vertices must be at least 5 to subdivide {table_name}, got {max_vertices}")
+
+    def literal(value):
+        return "'" + str(value).replace("'", "''") + "'"
+
+    index_name = f"idx_{table_name}_{geometry_column}".replace('.', '_')
+    return f"""
+DO $subdivide$
+DECLARE
+    target regclass := to_regclass({literal(table_name)});
+    id_type text;
+    piece_expression text := '__piece';
+    copied_columns text;
+    split_rows tid[];
+    gist_index regclass;
+BEGIN
+    IF target IS NULL THEN
+        RAISE EXCEPTION 'Table % does not exist', {literal(table_name)};
+    END IF;
+
+    SELECT format_type(atttypid, atttypmod) INTO id_type
+    FROM pg_attribute
+    WHERE attrelid = target AND attname = {literal(id_column)} AND attnum > 0 AND NOT attisdropped;
+    IF id_type IS NULL THEN
+        RAISE EXCEPTION 'Table % has no column % to map subdivided polygons back to', target, {literal(id_column)};
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = target AND attname = {literal(feature_id_column)} AND attnum > 0 AND NOT attisdropped
+    ) THEN
+        EXECUTE format('ALTER TABLE %s ADD COLUMN %I %s', target, {literal(feature_id_column)}, id_type);
+        EXECUTE format('UPDATE %s SET %I = %I', target, {literal(feature_id_column)}, {literal(id_column)});
+    END IF;
+
+    IF (
+        SELECT upper(postgis_typmod_type(atttypmod)) LIKE 'MULTI%'
+        FROM pg_attribute
+        WHERE attrelid = target AND attname = {literal(geometry_column)} AND attnum > 0 AND NOT attisdropped
+    ) THEN
+        piece_expression := 'ST_Multi(__piece)';
+    END IF;
+
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO copied_columns
+    FROM pg_attribute
+    WHERE attrelid = target AND attnum > 0 AND NOT attisdropped AND NOT atthasdef
+        AND attidentity = '' AND attgenerated = '' AND attname <> {literal(geometry_column)};
+
+    FOR gist_index IN
+        SELECT i.indexrelid::regclass
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = target AND am.amname = 'gist' AND a.attname = {literal(geometry_column)}
+    LOOP
+        EXECUTE format('DROP INDEX %s', gist_index);
+    END LOOP;
+
+    EXECUTE format('SELECT array_agg(ctid) FROM %s WHERE ST_NPoints(%I) > {max_vertices}', target, {literal(geometry_column)})
+    INTO split_rows;
+    IF split_rows IS NOT NULL THEN
+        EXECUTE format(
+            'INSERT INTO %1$s (%2$s, %3$I) SELECT %2$s, %4$s FROM %1$s CROSS JOIN LATERAL ST_Subdivide(%3$I, {max_vertices}) AS subdivided(__piece) WHERE ctid = ANY($1)',
+            target, copied_columns, {literal(geometry_column)}, piece_expression
+        ) USING split_rows;
+        EXECUTE format('DELETE FROM %s WHERE ctid = ANY($1)', target) USING split_rows;
+    END IF;
+
+    EXECUTE format('CREATE INDEX %I ON %s USING GIST (%I)', {literal(index_name)}, target, {literal(geometry_column)});
+END
+$subdivide$;
+
+ANALYZE {table_name};
+"""
@@ -0,0 +1,288 @@
+"""
+sql_writers.py
+
+Contains the DatabaseWriterPool class, which drains batches of rows from a bounded queue into a table on
+dedicated writer threads, and the PipelineStats class, which tracks where time is spent in a fetch/write pipeline.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+
+from modules.data_management.sql_utils.sql_ops import insert_rows, insert_checkpoints
+
+logger = logging.getLogger(__name__)
+
+class PipelineStats:
+    """
+    Thread-safe counters for the fetch and write stages of a collection pipeline.
+
+    Attributes:
+        pages_fetched (int): Number of pages fetched by the HTTP workers.
+        fetch_seconds (float): Total time the HTTP workers spent fetching and decoding pages.
+        producer_blocked_seconds (float): Time fetched batches waited for room in the write queue.
+        rows_written (int): Number of rows written by the writer threads.
+        write_seconds (float): Total time the writer threads spent inserting and committing.
+        writer_idle_seconds (float): Total time the writer threads waited for batches to arrive.
+        commits (int): Number of commits made by the writer threads.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.pages_fetched: int = 0
+        self.fetch_seconds: float = 0.0
+        self.producer_blocked_seconds: float = 0.0
+        self.rows_written: int = 0
+        self.write_seconds: float = 0.0
+        self.writer_idle_seconds: float = 0.0
+        self.commits: int = 0
+
+    def add(self, **increments: float) -> None:
+        """
+        Adds the given amounts to the named counters.
+
+        Args:
+            **increments: Counter names mapped to the amount to add.
+        """
+        with self._lock:
+            for name, amount in increments.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def summary(self, wall_seconds: float, num_fetchers: int, num_writers: int) -> str:
+        """
+        Builds a one-line summary of the pipeline and the stage that limited it.
+
+        The fetch stage is the bottleneck when the writers spend most of their time waiting for batches.
+        The write stage is the bottleneck when fetched batches spend a large share of the run waiting for
+        room in the write queue.
+
+        Args:
+            wall_seconds (float): Wall-clock duration of the pipeline.
+            num_fetchers (int): Number of concurrent HTTP workers.
+            num_writers (int): Number of writer threads.
+
+        Returns:
+            str: Summary of the stage counters.
+        """
+        wall_seconds = max(wall_seconds, 1e-6)
+        fetch_busy = self.fetch_seconds / (wall_seconds * max(num_fetchers, 1))
+        write_busy = self.write_seconds / (wall_seconds * max(num_writers, 1))
+        writer_idle = self.writer_idle_seconds / (wall_seconds * max(num_writers, 1))
+        blocked = self.producer_blocked_seconds / wall_seconds
+
+        if blocked > 0.25 and blocked >= writer_idle:
+            bottleneck = 'database'
+        elif writer_idle > 0.5:
+            bottleneck = 'network'
+        else:
+            bottleneck = 'balanced'
+
+        return (
+            f"fetch: {self.pages_fetched} pages, {fetch_busy:.0%} busy | "
+            f"write: {self.rows_written} rows in {self.commits} commits, {write_busy:.0%} busy, {writer_idle:.0%} idle | "
+            f"queue full {blocked:.0%} of run | "
+            f"{self.rows_written / wall_seconds:.0f} rows/s | bottleneck: {bottleneck}"
+        )
+
+class DatabaseWriterPool:
+    """
+    Writes batches of rows into a table from one or more writer threads.
+
+    Batches are handed over through a bounded queue, so the producer blocks when the writers fall behind.
+    Once the pool is closed, producers still waiting for room in the queue give up instead of blocking forever.
+    Each writer holds its own pooled connection and commits after every commit_chunk_size rows. A batch may
+    carry a checkpoint record, which is inserted into checkpoint_table in the same transaction as its rows.
+
+    Attributes:
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        table_name (str): Name of the table to write into.
+        columns (list): Ordered list of column names matching the row tuples.
+        num_writers (int): Number of writer threads. Should not exceed the engine's connection pool size.
+        commit_chunk_size (int): Number of rows each writer inserts between commits.
+        load_method (str): How rows are inserted ('copy', 'binary' or 'executemany').
+        stats (PipelineStats): Counters updated by the writers.
+        checkpoint_table (str): Table receiving the batches' checkpoint records, or None.
+    """
+    _STOP = object()
+    # How often a producer waiting for room in the queue checks whether the pool was closed
+    _PUT_POLL_SECONDS = 0.1
+
+    def __init__(
+        self,
+        db_engine: Engine,
+        table_name: str,
+        columns: List[str],
+        num_writers: int = 1,
+        commit_chunk_size: int = 5000,
+        load_method: str = 'copy',
+        queue_size: Optional[int] = None,
+        stats: Optional[PipelineStats] = None,
+        checkpoint_table: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the DatabaseWriterPool.
+
+        Args:
+            db_engine (Engine): SQLAlchemy engine connected to the database.
+            table_name (str): Name of the table to write into.
+            columns (list): Ordered list of column names matching the row tuples.
+            num_writers (int): Number of writer threads.
+            commit_chunk_size (int): Number of rows each writer inserts between commits.
+            load_method (str): How rows are inserted ('copy', 'binary' or 'executemany').
+            queue_size (int, optional): Maximum number of batches waiting to be written. Defaults to twice the number of writers.
+            stats (PipelineStats, optional): Counters to update. A new instance is created if not given.
+            checkpoint_table (str, optional): Table receiving the batches' checkpoint records.
+        """
+        self.db_engine = db_engine
+        self.table_name = table_name
+        self.columns = columns
+        self.num_writers = max(1, num_writers)
+        self.commit_chunk_size = commit_chunk_size
+        self.load_method = load_method
+        self.stats = stats or PipelineStats()
+        self.checkpoint_table = checkpoint_table
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size or 2 * self.num_writers)
+        self._threads: List[threading.Thread] = []
+        self._failed = threading.Event()
+        self._closed = threading.Event()
+        self._errors: List[str] = []
+
+    @property
+    def failed(self) -> bool:
+        """
+        Whether any writer has failed.
+
+        Returns:
+            bool: True if a writer hit an error.
+        """
+        return self._failed.is_set()
+
+    def start(self) -> None:
+        """
+        Starts the writer threads.
+        """
+        for index in range(self.num_writers):
+            thread = threading.Thread(target=self._run_writer, args=(index + 1,), name=f"{self.table_name}-writer-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.debug(f"Started {self.num_writers} writer(s) for table {self.table_name} (commit every {self.commit_chunk_size} rows)")
+
+    def put(self, rows: List[Tuple[Any, ...]], checkpoint: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Queues a batch of rows for writing, blocking while the queue is full.
+
+        Args:
+            rows (list): List of row tuples.
+            checkpoint (dict, optional): Checkpoint record committed together with the rows. Requires checkpoint_table.
+
+        Raises:
+            RuntimeError: If a writer has already failed, or the pool was closed before the batch was queued.
+        """
+        if self._failed.is_set():
+            raise RuntimeError(f"Writer failed for table {self.table_name}: {'; '.join(self._errors)}")
+        start_time = time.perf_counter()
+        while True:
+            if self._closed.is_set():
+                raise RuntimeError(f"Writer pool for table {self.table_name} was closed before the batch was queued")
+            try:
+                self._queue.put((rows, checkpoint), timeout=self._PUT_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self.stats.add(producer_blocked_seconds=time.perf_counter() - start_time)
+
+    def release_producers(self) -> None:
+        """
+        Makes producers waiting for room in the queue, and any later call to put, give up with a RuntimeError.
+
+        Called by close. A producer abandoning its remaining batches calls it first when its blocked put calls
+        hold the threads close would otherwise have to wait for.
+        """
+        self._closed.set()
+
+    def close(self) -> bool:
+        """
+        Signals the writers to flush and stop, and waits for them to finish.
+
+        Producers still waiting to queue a batch are released with a RuntimeError, so closing after a failure
+        does not leave their threads blocked. Batches queued before the call are written.
+
+        Returns:
+            bool: True if every batch was written and committed, False if any writer failed.
+        """
+        self.release_producers()
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._failed.is_set():
+            logger.error(f"Writing to table {self.table_name} failed: {'; '.join(self._errors)}")
+            return False
+        return True
+
+    def _run_writer(self, writer_number: int) -> None:
+        """
+        Drains batches from the queue into the table on a dedicated connection.
+
+        After a failure the writer keeps draining the queue without writing so the producer never blocks forever.
+
+        Args:
+            writer_number (int): Number of the writer, used in log messages.
+        """
+        uncommitted_rows = 0
+        pending_checkpoints = []
+        chunk_start = time.perf_counter()
+        stopped = False
+        try:
+            with self.db_engine.connect() as conn:
+                while True:
+                    wait_start = time.perf_counter()
+                    batch = self._queue.get()
+                    self.stats.add(writer_idle_seconds=time.perf_counter() - wait_start)
+                    if batch is self._STOP:
+                        stopped = True
+                        break
+                    if self._failed.is_set():
+                        continue
+
+                    rows, checkpoint = batch
+                    write_start = time.perf_counter()
+                    uncommitted_rows += insert_rows(conn, self.table_name, self.columns, rows, self.load_method)
+                    if checkpoint is not None:
+                        pending_checkpoints.append(checkpoint)
+                    if uncommitted_rows >= self.commit_chunk_size:
+                        insert_checkpoints(conn, self.checkpoint_table, pending_checkpoints)
+                        conn.commit()
+                        pending_checkpoints = []
+                        self._log_commit(writer_number, uncommitted_rows, chunk_start)
+                        uncommitted_rows = 0
+                        chunk_start = time.perf_counter()
+                    self.stats.add(write_seconds=time.perf_counter() - write_start, rows_written=len(rows))
+
+                if uncommitted_rows and not self._failed.is_set():
+                    insert_checkpoints(conn, self.checkpoint_table, pending_checkpoints)
+                    conn.commit()
+                    self._log_commit(writer_number, uncommitted_rows, chunk_start)
+        except Exception as e:
+            self._errors.append(f"writer {writer_number}: {e}")
+            self._failed.set()
+            logger.error(f"Writer {writer_number} failed for table {self.table_name}: {e}")
+            # Keep draining so the producer is never left blocked on a full queue
+            while not stopped:
+                stopped = self._queue.get() is self._STOP
+
+    def _log_commit(self, writer_number: int, rows: int, chunk_start: float) -> None:
+        """
+        Records a commit and logs its load rate.
+
+        Args:
+            writer_number (int): Number of the writer that committed.
+            rows (int): Number of rows in the commit.
+            chunk_start (float): perf_counter value when the chunk started.
+        """
+        self.stats.add(commits=1)
+        elapsed = max(time.perf_counter() - chunk_start, 1e-6)
+        logger.debug(f"Writer {writer_number} committed {rows} rows into table {self.table_name} using {self.load_method} ({rows / elapsed:.0f} rows/s)")
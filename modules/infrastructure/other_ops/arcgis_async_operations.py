@@ -0,0 +1,377 @@
+"""
+arcgis_async_operations.py
+
+Contains the AsyncArcGISFeatureLayerQuery class, an asyncio implementation of the feature layer query.
+All page requests share one aiohttp connection pool on a single event loop, so hundreds of requests can be
+in flight without a thread per request.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import aiohttp
+
+from modules.data_management.sql_utils.sql_ops import clear_table
+from modules.data_management.sql_utils.sql_writers import DatabaseWriterPool, PipelineStats
+from modules.infrastructure.other_ops.feature_decoders import GeoJSONFeatureStream, geojson_stream_to_rows, decode_page
+from modules.infrastructure.other_ops.arcgis_operations import ArcGISTransport
+from modules.infrastructure.other_ops.request_limits import get_request_limiter
+
+logger = logging.getLogger(__name__)
+
+class AsyncArcGISFeatureLayerQuery:
+    """
+    Class to fetch data from an ArcGIS Feature Layer query with asyncio and save it to a PostGIS database.
+
+    Requests share one aiohttp session and an asyncio semaphore caps how many are in flight. A page is decoded
+    and handed to a DatabaseWriterPool while its request still holds the semaphore, so a slow database holds
+    back new requests instead of letting decoded pages pile up in memory.
+
+    Attributes:
+        query_url (str): URL for the ArcGIS Feature Layer query.
+        query_params (dict): Query parameters for the request.
+        table_name (str): Name of the table to save the data in the database.
+        table_columns (list): Ordered list of columns to load.
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+        batch_size (int): Number of records to fetch in each batch.
+        max_concurrent_requests (int): Maximum number of requests in flight at once.
+        load_method (str): How batches are loaded into the database ('copy' or 'executemany').
+        writer_threads (int): Number of database writer threads.
+        commit_chunk_size (int): Number of rows each writer inserts between commits.
+        stats (PipelineStats): Stage counters for the most recent collection.
+        srid (int): Spatial reference ID of the returned geometries, taken from the outSR query parameter.
+        response_cache (ResponseCache): Optional on-disk cache of page responses.
+        transport (ArcGISTransport): Source of the access token and retry policy. Requests themselves go through aiohttp.
+        decode_processes (int): Number of processes pages are decoded in, or 0 to decode them on executor threads.
+    """
+    def __init__(self, url, query_params, table_name, table_columns, db_engine, batch_size=250, max_concurrent_requests=100, load_method='copy', writer_threads=1, commit_chunk_size=5000, response_cache=None, transport=None, decode_processes=0):
+        """
+        Initializes the AsyncArcGISFeatureLayerQuery class with the given configurations and database engine.
+
+        Args:
+            url (str): URL for the ArcGIS Feature Layer query.
+            query_params (dict): Query parameters for the request.
+            table_name (str): Name of the table to save the data in the database.
+            table_columns (list): Ordered list of columns to load.
+            db_engine (Engine): SQLAlchemy engine connected to the database.
+            batch_size (int): Number of records to fetch in each batch.
+            max_concurrent_requests (int): Maximum number of requests in flight at once.
+            load_method (str): How batches are loaded into the database ('copy' or 'executemany').
+            writer_threads (int): Number of database writer threads. Should not exceed the engine's connection pool size.
+            commit_chunk_size (int): Number of rows each writer inserts between commits.
+            response_cache (ResponseCache, optional): On-disk cache of page responses. Pages found in the cache are not requested.
+            transport (ArcGISTransport, optional): Source of the access token and retry policy. Defaults to an unauthenticated transport.
+            decode_processes (int): Number of processes to decode pages in, converting geometries and, for the 'copy'
+                load method, encoding the rows as COPY text. 0 decodes pages on executor threads.
+        """
+        self.query_url = url
+        self.query_params = query_params
+        self.table_name = table_name
+        self.table_columns = table_columns
+        self.db_engine = db_engine
+        self.batch_size = batch_size
+        self.max_concurrent_requests = max_concurrent_requests
+        self.load_method = load_method
+        self.writer_threads = writer_threads
+        self.commit_chunk_size = commit_chunk_size
+        self.stats = PipelineStats()
+        self.srid = int(query_params.get('outSR', 4326))
+        self.response_cache = response_cache
+        self.transport = transport or ArcGISTransport()
+        self.decode_processes = decode_processes or 0
+        self.decode_pool = None
+        self.total_features = 0
+        self.total_expected_features = 0
+
+    def fetch_data(self):
+        """
+        Fetches data from the ArcGIS Feature Layer in batches and saves it to the database.
+
+        Returns:
+            bool: True if the data collection was successful, False otherwise.
+        """
+        return asyncio.run(self._fetch_data())
+
+    async def _fetch_data(self):
+        """
+        Runs the collection on the event loop.
+
+        Returns:
+            bool: True if the data collection was successful, False otherwise.
+        """
+        connector = aiohttp.TCPConnector(limit=self.max_concurrent_requests)
+        timeout = aiohttp.ClientTimeout(total=300)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            self.total_expected_features = await self._get_total_feature_count(session)
+            if self.total_expected_features == 0:
+                logger.debug("No features to fetch.")
+                return False
+
+            logger.debug(f"Total expected features: {self.total_expected_features}")
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, clear_table, self.db_engine, self.table_name)
+            total_batches = (self.total_expected_features + self.batch_size - 1) // self.batch_size
+            batch_number = 0
+            progress_percentage = 0.0
+
+            logger.info("Progress: 0% complete.")
+
+            start_time = time.time()
+            last_log_time = start_time
+
+            self.stats = PipelineStats()
+            load_method = self.load_method
+            if self.decode_processes:
+                self.decode_pool = ProcessPoolExecutor(max_workers=self.decode_processes)
+                if load_method == 'copy':
+                    # The decoding processes also encode the rows, leaving the writers only the COPY itself
+                    load_method = 'copy_lines'
+            writer_pool = DatabaseWriterPool(
+                db_engine=self.db_engine,
+                table_name=self.table_name,
+                columns=self.table_columns,
+                num_writers=self.writer_threads,
+                commit_chunk_size=self.commit_chunk_size,
+                load_method=load_method,
+                stats=self.stats
+            )
+            writer_pool.start()
+            semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            tasks = [
+                asyncio.create_task(self._collect_page(session, semaphore, writer_pool, offset))
+                for offset in range(0, self.total_expected_features, self.batch_size)
+            ]
+            success = True
+            try:
+                for next_page in asyncio.as_completed(tasks):
+                    offset, collected = await next_page
+                    if not collected:
+                        logger.error(f"No data received for batch at offset {offset} ({batch_number}/{total_batches} batches processed).")
+                        logger.info(f"Collection failed at {progress_percentage:.1f}%")
+                        success = False
+                        break
+
+                    self.total_features += collected
+                    batch_number += 1
+                    logger.debug(f"Batch {batch_number}/{total_batches} fetched (offset {offset}). Total features received so far: {self.total_features}/{self.total_expected_features}")
+
+                    # Log progress every 10 seconds
+                    current_time = time.time()
+                    progress_percentage = (self.total_features / self.total_expected_features) * 100
+                    if current_time - last_log_time >= 10:
+                        logger.info(f"Progress: {progress_percentage:.1f}% complete.")
+                        last_log_time = current_time
+
+            except Exception as e:
+                logger.error(f"Failed to fetch or save data: {e}")
+                success = False
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                # Cancelled pages may still be blocked in put on executor threads, which close would wait behind
+                writer_pool.release_producers()
+                if not await loop.run_in_executor(None, writer_pool.close):
+                    success = False
+                if self.decode_pool:
+                    self.decode_pool.shutdown(cancel_futures=True)
+                    self.decode_pool = None
+
+            logger.debug(f"Pipeline stages for {self.table_name}: {self.stats.summary(time.time() - start_time, self.max_concurrent_requests, self.writer_threads)}")
+            if self.response_cache:
+                logger.debug(f"Response cache for {self.table_name}: {self.response_cache.hits} hits, {self.response_cache.misses} misses")
+            if not success:
+                logger.debug(f"Total features collected: {self.total_features}")
+                return False
+
+            logger.debug("Featurelayer data collection completed successfully.")
+            logger.debug(f"Total features collected: {self.total_features}/{self.total_expected_features}")
+            logger.info(f"Progress: {progress_percentage:.1f}% complete.")
+            return True
+
+    async def _collect_page(self, session, semaphore, writer_pool, offset):
+        """
+        Fetches one page, decodes it and queues its rows for the database writers.
+
+        Args:
+            session (aiohttp.ClientSession): Shared HTTP session.
+            semaphore (asyncio.Semaphore): Semaphore capping the number of requests in flight.
+            writer_pool (DatabaseWriterPool): Writer pool receiving the decoded rows.
+            offset (int): Result offset of the page.
+
+        Returns:
+            tuple: (offset, number of features collected). The count is 0 if the page could not be fetched.
+        """
+        params = self.query_params.copy()
+        params['resultOffset'] = offset
+        params['resultRecordCount'] = self.batch_size
+        async with semaphore:
+            start_time = time.perf_counter()
+            rows = await self._fetch_batch(session, params)
+            self.stats.add(pages_fetched=1, fetch_seconds=time.perf_counter() - start_time)
+            if not rows:
+                return offset, 0
+            # Queueing blocks while the writers are behind, so it runs off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, writer_pool.put, rows)
+        return offset, len(rows)
+
+    async def _get_total_feature_count(self, session):
+        """
+        Fetches the total number of features available from the ArcGIS Feature Layer.
+
+        Args:
+            session (aiohttp.ClientSession): Shared HTTP session.
+
+        Returns:
+            int: Total number of features.
+        """
+        params = self.query_params.copy()
+        params['returnCountOnly'] = True
+        try:
+            form_data = await self._form_data(params)
+            async with self._request_slot(), session.post(self.query_url, data=form_data) as response:
+                response.raise_for_status()
+                response_json = await response.json(content_type=None)
+                if response_json:
+                    return response_json.get('properties', {}).get('count', 0)
+                logger.warning("Empty response received when fetching total feature count.")
+        except aiohttp.ClientError as e:
+            logger.warning(f"Request failed when fetching total feature count: {e}")
+        except ValueError as e:
+            logger.warning(f"Failed to parse JSON response when fetching total feature count: {e}")
+        return 0
+
+    async def _fetch_batch(self, session, params):
+        """
+        Fetches a single batch of data from the ArcGIS Feature Layer and decodes it into rows.
+
+        Failed requests are retried up to the transport's max_attempts with a jittered backoff that honours Retry-After.
+        Waiting between attempts does not block other requests.
+        Responses are parsed incrementally on an executor thread, so a page is never held as one decoded JSON document,
+        or decoded by decode_page in a decoding process if decode_processes is set.
+        If a response cache is set, a cached response is used instead of a request, and each successful response is
+        added to the cache. Cache files are read and written off the event loop.
+
+        Args:
+            session (aiohttp.ClientSession): Shared HTTP session.
+            params (dict): Query parameters for the request.
+
+        Returns:
+            list: List of row tuples ordered like table_columns, or an empty list if the batch could not be fetched.
+        """
+        loop = asyncio.get_running_loop()
+        if self.response_cache:
+            rows = await loop.run_in_executor(None, self._read_cached_batch, params)
+            if rows:
+                return rows
+        max_attempts = self.transport.max_attempts
+        for attempt in range(max_attempts):
+            retry_after = None
+            try:
+                form_data = await self._form_data(params)
+                async with self._request_slot(), session.post(self.query_url, data=form_data) as response:
+                    response.raise_for_status()
+                    content = await response.read()
+                if self.decode_pool:
+                    rows, error, _ = await loop.run_in_executor(self.decode_pool, decode_page, content, self.table_columns, self.srid, 'geojson', self.load_method == 'copy')
+                else:
+                    rows, error = await loop.run_in_executor(None, self._decode_content, content)
+                if rows:
+                    if self.response_cache:
+                        await loop.run_in_executor(None, self.response_cache.put, self.query_url, params, content)
+                    return rows
+                elif error is not None:
+                    logger.warning(f"Server returned an error (attempt {attempt + 1}/{max_attempts}): {error}")
+                    self.transport.token_rejected(error.get('code'))
+                else:
+                    logger.warning(f"No features found in response (attempt {attempt + 1}/{max_attempts})")
+            except aiohttp.ClientResponseError as e:
+                logger.warning(f"Request failed (attempt {attempt + 1}/{max_attempts}): {e}")
+                retry_after = e.headers.get('Retry-After') if e.headers else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Request failed (attempt {attempt + 1}/{max_attempts}): {e}")
+            except ValueError as e:
+                logger.warning(f"Failed to parse JSON response (attempt {attempt + 1}/{max_attempts}): {e}")
+            if attempt + 1 < max_attempts:
+                await asyncio.sleep(self.transport.retry_delay(attempt, retry_after))
+        logger.error(f"Failed to fetch data after {max_attempts} attempts for params: {params}")
+        return []
+
+    def _decode_content(self, content):
+        """
+        Parses a GeoJSON response incrementally and converts its features into rows. Runs on an executor thread.
+
+        Args:
+            content (bytes): Response body.
+
+        Returns:
+            tuple: (list of row tuples, ArcGIS error dict if the server returned an error, otherwise None).
+
+        Raises:
+            ValueError: If the response is malformed.
+        """
+        if not content:
+            return [], None
+        stream = GeoJSONFeatureStream([content])
+        rows = geojson_stream_to_rows(stream, self.table_columns, self.srid)
+        return rows, stream.error
+
+    def _read_cached_batch(self, params):
+        """
+        Reads a batch from the response cache and decodes it into rows. Runs on an executor thread.
+
+        Args:
+            params (dict): Query parameters for the request.
+
+        Returns:
+            list: List of row tuples, or an empty list if there is no usable entry.
+        """
+        content = self.response_cache.get(self.query_url, params)
+        if not content:
+            return []
+        try:
+            if self.decode_pool:
+                rows, _, _ = self.decode_pool.submit(decode_page, content, self.table_columns, self.srid, 'geojson', self.load_method == 'copy').result()
+            else:
+                rows, _ = self._decode_content(content)
+            return rows
+        except ValueError as e:
+            logger.warning(f"Failed to parse cached response, requesting it again: {e}")
+            return []
+
+    @asynccontextmanager
+    async def _request_slot(self):
+        """
+        Holds a slot of the shared request limiter for a request, if one is configured. The limiter's slots are
+        shared with threaded collectors, so waiting for one polls instead of blocking the event loop.
+        """
+        limiter = get_request_limiter()
+        if limiter is None:
+            yield
+            return
+        while not limiter.acquire(self.query_url, blocking=False):
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            limiter.release(self.query_url)
+
+    async def _form_data(self, params):
+        """
+        Converts query parameters to strings for a form-encoded request body, adding the transport's access token if it has one.
+
+        The token is read on an executor thread, since reading it logs in again when it is missing or about to expire.
+
+        Args:
+            params (dict): Query parameters for the request.
+
+        Returns:
+            dict: Query parameters with string values.
+        """
+        form_data = {key: str(value) for key, value in params.items()}
+        if self.transport.auth:
+            form_data['token'] = await asyncio.get_running_loop().run_in_executor(None, lambda: self.transport.auth.token)
+        return form_data
@@ -1,50 +1,553 @@
+import hashlib
+import itertools
 import logging
+import math
 import requests
 import time
 import json
+import queue
+import threading
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.sql import text
 from sqlalchemy.exc import SQLAlchemyError
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from modules.data_management.sql_utils.sql_ops import clear_table, geojson_to_postgis
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from modules.data_management.sql_utils.sql_ops import (
+    clear_table,
+    table_exists,
+    drop_table,
+    get_table_row_count,
+    create_checkpoint_table,
+    get_checkpoints,
+    create_staging_table,
+    create_spatial_indexes,
+    swap_in_staging_table,
+    get_column_values,
+    delete_rows_by_values,
+    delete_duplicate_rows
+)
+from modules.data_management.sql_utils.sql_writers import DatabaseWriterPool, PipelineStats
+from modules.infrastructure.other_ops.feature_decoders import GeoJSONFeatureStream, geojson_stream_to_rows, pbf_features_to_rows, decode_page
+from modules.infrastructure.other_ops.request_limits import backoff_delay, parse_retry_after, request_slot
 from arcgis.gis import GIS
+from pyproj import CRS
+from pyproj.exceptions import CRSError
 
 logger = logging.getLogger(__name__)
 
+# Size of the chunks page responses are read and decoded in
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+# Length of a degree of latitude, and the longest degree of longitude, in meters
+METERS_PER_DEGREE = 111320
+
+def screening_generalization(tolerance_meters, spatial_reference):
+    """
+    Converts a screening tolerance into the generalization and quantization parameters of a feature layer query.
+
+    maxAllowableOffset is set to the tolerance, so the server drops the vertices that move a boundary by less
+    than it, and geometryPrecision keeps the decimals that resolve a tenth of it. Both are in the units of the
+    output spatial reference. A degree is taken as its length at the equator, which overstates it elsewhere,
+    so the tolerance on the ground never exceeds the one given.
+
+    Args:
+        tolerance_meters (float): Largest boundary displacement, in meters, that cannot change a screening result.
+        spatial_reference (int or str): WKID of the output spatial reference, the outSR query parameter.
+
+    Returns:
+        dict: 'maxAllowableOffset' and 'geometryPrecision' query parameters, or an empty dict if the spatial
+        reference is unknown.
+    """
+    try:
+        crs = CRS.from_user_input(int(spatial_reference))
+    except (CRSError, TypeError, ValueError):
+        try:
+            crs = CRS.from_user_input(f"ESRI:{spatial_reference}")
+        except CRSError:
+            logger.warning(f"Unknown spatial reference {spatial_reference}; geometries are not generalized")
+            return {}
+    if crs.is_geographic:
+        offset = tolerance_meters / METERS_PER_DEGREE
+    else:
+        offset = tolerance_meters / crs.axis_info[0].unit_conversion_factor
+    # Rounded down to two significant digits, so the rounding cannot loosen the tolerance
+    decimals = 1 - math.floor(math.log10(offset))
+    return {
+        'maxAllowableOffset': round(math.floor(offset * 10 ** decimals) / 10 ** decimals, decimals),
+        'geometryPrecision': max(0, math.ceil(-math.log10(offset / 10)))
+    }
+
 class ArcGISOAuth2:
     """
     Class to handle OAuth2 authentication with ArcGIS Online and provide an updated token.
 
+    Tokens are cached per client ID for the whole process and reused until shortly before they expire, so
+    collectors sharing a client ID log in once instead of every time the token is read.
+
     Attributes:
         client_id (str): Client ID of the OAuth2 application.
-
+        token_lifetime (float): Seconds a new token is assumed to stay valid when the login does not report its expiry.
+        refresh_margin (float): Seconds before expiry at which a cached token is replaced.
     """
-    def __init__(self, client_id):
+    _tokens = {}
+    _lock = threading.Lock()
+
+    def __init__(self, client_id, token_lifetime=1800, refresh_margin=120):
         """
         Initializes the ArcGISOAuth2 class with the given client ID.
 
         Args:
             client_id (str): Client ID of the OAuth2 application.
+            token_lifetime (float): Seconds a new token is assumed to stay valid when the login does not report its expiry.
+            refresh_margin (float): Seconds before expiry at which a cached token is replaced.
         """
         self.client_id = client_id
+        self.token_lifetime = token_lifetime
+        self.refresh_margin = refresh_margin
         self._token = None
 
     @property
     def token(self):
         """
-        Authenticates with ArcGIS Online and returns an updated access token.
+        Returns a cached access token, authenticating with ArcGIS Online if there is none or it is about to expire.
+
+        Returns:
+            str: Access token.
+        """
+        with self._lock:
+            cached = self._tokens.get(self.client_id)
+            if cached and time.time() < cached[1] - self.refresh_margin:
+                self._token = cached[0]
+                return self._token
+            try:
+                gis = GIS("https://www.arcgis.com", client_id=self.client_id)
+                self._token = gis._con.token
+                self._tokens[self.client_id] = (self._token, self._token_expiry(gis))
+                logger.info("Successfully obtained new access token.")
+                return self._token
+            except Exception as e:
+                logger.error(f"Failed to obtain access token: {e}")
+                raise
+
+    def invalidate(self):
+        """
+        Drops the cached token, so the next read logs in again. Used when the server rejects the token.
+        """
+        with self._lock:
+            cached = self._tokens.get(self.client_id)
+            if cached and cached[0] == self._token:
+                del self._tokens[self.client_id]
+
+    def _token_expiry(self, gis):
+        """
+        Reads the expiry time of the token from the GIS connection, falling back to token_lifetime from now.
+
+        Args:
+            gis (GIS): Logged in GIS.
+
+        Returns:
+            float: Expiry time as a Unix timestamp.
+        """
+        expiration = getattr(gis._con, '_expiration', None)
+        if isinstance(expiration, (int, float)) and expiration > time.time():
+            # The connection may report the expiry in milliseconds
+            return expiration / 1000 if expiration > 1e11 else expiration
+        return time.time() + self.token_lifetime
+
+class ArcGISTransport:
+    """
+    Sends the HTTP requests of a feature layer collection.
+
+    Requests share one pooled session whose connection pool is sized to the collection's concurrency, so worker
+    threads reuse connections instead of opening new ones. Responses are requested gzip-compressed. An access token
+    is added to every request if an ArcGISOAuth2 is set, and each request waits for a slot of the shared request
+    limiter, which also enforces the per-host request rate. Failed requests are retried by the caller after
+    wait_before_retry(), which backs off exponentially with jitter and honours Retry-After.
+
+    Attributes:
+        session (requests.Session): Pooled HTTP session.
+        auth (ArcGISOAuth2): Source of the access token, or None for public layers.
+        max_attempts (int): Number of attempts before a request is given up.
+        backoff_base (float): Ceiling of the first retry delay, in seconds. Doubles with each attempt.
+        backoff_max (float): Largest retry delay, in seconds.
+        timeout (float): Seconds to wait for the server to respond, or None to wait indefinitely.
+    """
+    def __init__(self, pool_size=10, auth=None, max_attempts=5, backoff_base=2.0, backoff_max=60.0, timeout=300):
+        """
+        Initializes the ArcGISTransport and its session.
+
+        Args:
+            pool_size (int): Number of connections kept open per host. Should be at least the number of concurrent requests.
+            auth (ArcGISOAuth2, optional): Source of the access token added to every request.
+            max_attempts (int): Number of attempts before a request is given up.
+            backoff_base (float): Ceiling of the first retry delay, in seconds. Doubles with each attempt.
+            backoff_max (float): Largest retry delay, in seconds.
+            timeout (float, optional): Seconds to wait for the server to respond.
+        """
+        self.auth = auth
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    @contextmanager
+    def request(self, method, url, params=None, data=None, stream=False):
+        """
+        Sends a request and yields its response, holding a request limiter slot until the with block exits.
+
+        Args:
+            method (str): HTTP method, 'GET' or 'POST'.
+            url (str): Request URL.
+            params (dict, optional): Query string parameters.
+            data (dict, optional): Form-encoded body parameters.
+            stream (bool): Whether the body is read by the caller in chunks instead of up front.
+
+        Yields:
+            requests.Response: Response, closed when the with block exits.
+
+        Raises:
+            requests.RequestException: If the request fails.
+        """
+        if self.auth:
+            if data is not None:
+                data = dict(data, token=self.auth.token)
+            else:
+                params = dict(params or {}, token=self.auth.token)
+        with request_slot(url):
+            response = self.session.request(method, url, params=params, data=data, stream=stream, timeout=self.timeout)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def token_rejected(self, error_code):
+        """
+        Drops the cached token if an ArcGIS error code means it was rejected, so the next attempt logs in again.
+
+        Args:
+            error_code (int): ArcGIS error code of a failed request.
 
         Returns:
-            str: Updated access token.
+            bool: True if the token was rejected.
+        """
+        if self.auth and error_code in (498, 499):
+            logger.info("Access token was rejected; requesting a new one.")
+            self.auth.invalidate()
+            return True
+        return False
+
+    def wait_before_retry(self, attempt, error=None):
         """
+        Sleeps before the next attempt of a failed request.
+
+        Args:
+            attempt (int): Zero-based number of the attempt that failed.
+            error (requests.RequestException, optional): The failure, whose response may carry a Retry-After header.
+        """
+        response = getattr(error, 'response', None)
+        delay = self.retry_delay(attempt, response.headers.get('Retry-After') if response is not None else None)
+        logger.debug(f"Retrying in {delay:.1f} seconds")
+        time.sleep(delay)
+
+    def retry_delay(self, attempt, retry_after=None):
+        """
+        Computes how long to wait before the next attempt of a failed request.
+
+        Args:
+            attempt (int): Zero-based number of the attempt that failed.
+            retry_after (str, optional): Retry-After header of the failed response.
+
+        Returns:
+            float: Seconds to wait.
+        """
+        return backoff_delay(attempt, parse_retry_after(retry_after), self.backoff_base, self.backoff_max)
+
+class SlidingWindowScheduler:
+    """
+    Runs tasks on one long-lived thread pool while keeping a fixed number of them in flight.
+
+    A new task is submitted as soon as the consumer sees a free slot, so a slow task only occupies its own
+    slot instead of holding back a whole wave of tasks. Finished results are handed to the consumer
+    through a bounded queue. When the consumer falls behind, finished workers block on the full queue
+    and keep their slot until it catches up, so no new tasks are started. Slots are only ever refilled
+    from run(), never from a worker thread. The number of tasks in flight can be changed while the
+    scheduler runs, up to the size of the worker pool.
+
+    Attributes:
+        worker (callable): Function called with each task on the worker pool.
+        max_in_flight (int): Number of tasks kept running at the same time.
+        max_workers (int): Size of the worker pool, the upper limit for max_in_flight.
+        results_queue_size (int): Maximum number of finished results waiting for the consumer.
+    """
+    _NO_TASK = object()
+    # Seconds between checks of the stop flag and for free slots while waiting on the results queue
+    _POLL_SECONDS = 0.1
+
+    def __init__(self, worker, max_in_flight, results_queue_size=None, max_workers=None):
+        """
+        Initializes the SlidingWindowScheduler.
+
+        Args:
+            worker (callable): Function called with each task on the worker pool.
+            max_in_flight (int): Number of tasks kept running at the same time.
+            results_queue_size (int, optional): Maximum number of finished results waiting for the consumer. Defaults to max_in_flight.
+            max_workers (int, optional): Size of the worker pool. Defaults to max_in_flight.
+        """
+        self.worker = worker
+        self.max_workers = max(max_workers or max_in_flight, max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.results_queue_size = results_queue_size or max_in_flight
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._tasks = iter(())
+        self._running = 0
+        self._results = None
+        self._executor = None
+
+    def run(self, tasks):
+        """
+        Runs the tasks and yields their results in completion order.
+
+        Args:
+            tasks (iterable): Tasks to pass to the worker. Consumed lazily, one task per free slot.
+
+        Yields:
+            tuple: (task, result) for each finished task.
+
+        Raises:
+            Exception: Any exception raised by the worker is re-raised for the task that failed.
+        """
+        self._tasks = iter(tasks)
+        self._running = 0
+        self._stop.clear()
+        self._results = queue.Queue(maxsize=self.results_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
         try:
-            gis = GIS("https://www.arcgis.com", client_id=self.client_id)
-            self._token = gis._con.token
-            logger.info("Successfully obtained new access token.")
-            return self._token
-        except Exception as e:
-            logger.error(f"Failed to obtain access token: {e}")
-            raise
+            while True:
+                exhausted = self._fill_slots()
+                with self._lock:
+                    if exhausted and self._running == 0 and self._results.empty():
+                        return
+                try:
+                    task, result, error = self._results.get(timeout=self._POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if error is not None:
+                    raise error
+                yield task, result
+        finally:
+            self._shutdown()
+
+    def set_max_in_flight(self, max_in_flight):
+        """
+        Changes the number of tasks kept in flight. Extra slots are filled by run() before it waits for the next
+        result; when the number is lowered, running tasks finish and their slots are not refilled until the count
+        is below the new limit.
+
+        Args:
+            max_in_flight (int): Number of tasks to keep running, capped at max_workers.
+        """
+        with self._lock:
+            self.max_in_flight = max(1, min(max_in_flight, self.max_workers))
+
+    def _fill_slots(self):
+        """
+        Submits tasks until max_in_flight are running or there are no more tasks. Only called from run().
+
+        Returns:
+            bool: True if there are no more tasks to submit, False otherwise.
+        """
+        while True:
+            with self._lock:
+                if self._running >= self.max_in_flight:
+                    return False
+                task = next(self._tasks, self._NO_TASK)
+                if task is self._NO_TASK:
+                    return True
+                self._running += 1
+            self._executor.submit(self._run_task, task)
+
+    def _run_task(self, task):
+        """
+        Runs the worker on a task and hands the outcome to the consumer. Runs on the worker thread and blocks
+        while the results queue is full, which holds the task's slot until the consumer catches up.
+
+        Args:
+            task: The task to run.
+        """
+        try:
+            if self._stop.is_set():
+                return
+            result, error = None, None
+            try:
+                result = self.worker(task)
+            except Exception as e:
+                error = e
+            while not self._stop.is_set():
+                try:
+                    self._results.put((task, result, error), timeout=self._POLL_SECONDS)
+                    break
+                except queue.Full:
+                    pass
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _shutdown(self):
+        """
+        Stops submitting tasks, drops tasks that have not started and waits for running workers to finish.
+        """
+        self._stop.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class AdaptivePageController:
+    """
+    Adjusts the page size and number of requests in flight from the responses of a running collection.
+
+    After each successful page, the page size moves halfway towards the size that would take
+    target_page_seconds to return and stay under max_page_bytes, estimated from the page's response time and
+    payload per feature. Concurrency grows by one after every 'concurrency' consecutive successful pages,
+    as long as the response time per feature stays within slowdown_factor of the best seen so far. It drops
+    by one when responses slow down past that, and is halved when a request fails. A throttled or timed-out
+    request also halves the page size.
+
+    Attributes:
+        batch_size (int): Current page size.
+        concurrency (int): Current number of requests to keep in flight.
+        min_batch_size (int): Smallest page size.
+        max_batch_size (int): Largest page size.
+        min_concurrency (int): Smallest number of requests in flight.
+        max_concurrency (int): Largest number of requests in flight.
+        target_page_seconds (float): Response time the page size is tuned towards.
+        max_page_bytes (int): Largest payload the page size is allowed to produce.
+        slowdown_factor (float): How much slower than the best observed time per feature responses may get before concurrency is reduced.
+    """
+    def __init__(self, batch_size, concurrency, min_batch_size=50, max_batch_size=2000, min_concurrency=1, max_concurrency=16, target_page_seconds=5.0, max_page_bytes=20 * 1024 ** 2, slowdown_factor=2.0):
+        """
+        Initializes the AdaptivePageController. The starting page size and concurrency are clamped to the limits.
+
+        Args:
+            batch_size (int): Starting page size.
+            concurrency (int): Starting number of requests in flight.
+            min_batch_size (int): Smallest page size.
+            max_batch_size (int): Largest page size.
+            min_concurrency (int): Smallest number of requests in flight.
+            max_concurrency (int): Largest number of requests in flight.
+            target_page_seconds (float): Response time the page size is tuned towards.
+            max_page_bytes (int): Largest payload the page size is allowed to produce.
+            slowdown_factor (float): How much slower than the best observed time per feature responses may get before concurrency is reduced.
+        """
+        self.min_batch_size = max(1, min(min_batch_size, max_batch_size))
+        self.max_batch_size = max_batch_size
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.target_page_seconds = target_page_seconds
+        self.max_page_bytes = max_page_bytes
+        self.slowdown_factor = slowdown_factor
+        self.batch_size = self._clamp(batch_size, self.min_batch_size, self.max_batch_size)
+        self.concurrency = self._clamp(concurrency, self.min_concurrency, self.max_concurrency)
+        self._lock = threading.Lock()
+        self._seconds_per_feature = None
+        self._best_seconds_per_feature = None
+        self._successes = 0
+
+    def record_success(self, seconds, payload_bytes, feature_count):
+        """
+        Updates the page size and concurrency after a successful page.
+
+        Args:
+            seconds (float): Response time of the request.
+            payload_bytes (int): Size of the response body.
+            feature_count (int): Number of features in the response.
+        """
+        if feature_count <= 0:
+            return
+        with self._lock:
+            seconds_per_feature = seconds / feature_count
+            if self._seconds_per_feature is None:
+                self._seconds_per_feature = seconds_per_feature
+            else:
+                self._seconds_per_feature = 0.7 * self._seconds_per_feature + 0.3 * seconds_per_feature
+            if self._best_seconds_per_feature is None or self._seconds_per_feature < self._best_seconds_per_feature:
+                self._best_seconds_per_feature = self._seconds_per_feature
+
+            target_size = self.target_page_seconds / max(self._seconds_per_feature, 1e-6)
+            if payload_bytes:
+                target_size = min(target_size, self.max_page_bytes / (payload_bytes / feature_count))
+            self._set_batch_size((self.batch_size + int(target_size)) // 2)
+
+            if self._seconds_per_feature > self.slowdown_factor * self._best_seconds_per_feature:
+                self._successes = 0
+                self._set_concurrency(self.concurrency - 1, 'responses slowing down')
+                # Measure the slowdown against the new level rather than the best time of an idle server
+                self._best_seconds_per_feature = self._seconds_per_feature / self.slowdown_factor
+                return
+            self._successes += 1
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                self._set_concurrency(self.concurrency + 1, 'responses steady')
+
+    def record_failure(self, throttled=False, timed_out=False):
+        """
+        Backs off after a failed request.
+
+        Args:
+            throttled (bool): Whether the server rejected the request for exceeding a rate or load limit.
+            timed_out (bool): Whether the request timed out.
+        """
+        with self._lock:
+            self._successes = 0
+            reason = 'throttled' if throttled else 'timed out' if timed_out else 'request failed'
+            self._set_concurrency(self.concurrency // 2, reason)
+            if throttled or timed_out:
+                self._set_batch_size(self.batch_size // 2, reason)
+
+    def _set_batch_size(self, batch_size, reason=None):
+        """
+        Sets the page size within its limits. Called with the lock held.
+
+        Args:
+            batch_size (int): New page size.
+            reason (str, optional): Reason logged with the change.
+        """
+        batch_size = self._clamp(batch_size, self.min_batch_size, self.max_batch_size)
+        if batch_size != self.batch_size and reason:
+            logger.debug(f"Page size {self.batch_size} -> {batch_size} ({reason})")
+        self.batch_size = batch_size
+
+    def _set_concurrency(self, concurrency, reason):
+        """
+        Sets the concurrency within its limits. Called with the lock held.
+
+        Args:
+            concurrency (int): New number of requests in flight.
+            reason (str): Reason logged with the change.
+        """
+        concurrency = self._clamp(concurrency, self.min_concurrency, self.max_concurrency)
+        if concurrency != self.concurrency:
+            logger.debug(f"Concurrent requests {self.concurrency} -> {concurrency} ({reason})")
+        self.concurrency = concurrency
+
+    @staticmethod
+    def _clamp(value, lower, upper):
+        """
+        Limits a value to a range.
+
+        Args:
+            value (int): Value to limit.
+            lower (int): Lower limit.
+            upper (int): Upper limit.
+
+        Returns:
+            int: The limited value.
+        """
+        return max(lower, min(int(value), upper))
 
 class ArcGISFeatureLayerQuery:
     """
@@ -57,8 +560,32 @@ class ArcGISFeatureLayerQuery:
         db_engine (Engine): SQLAlchemy engine connected to the database.
         batch_size (int): Number of records to fetch in each batch.
         max_simultaneous_requests (int): Maximum number of simultaneous requests.
+        load_method (str): How batches are loaded into the database ('copy' or 'executemany').
+        results_queue_size (int): Maximum number of fetched pages waiting to be saved.
+        writer_threads (int): Number of database writer threads, each with its own pooled connection.
+        commit_chunk_size (int): Number of rows each writer inserts between commits.
+        pagination (str): How pages are requested: 'offset', 'objectid_range' or 'objectid_list'.
+        stats (PipelineStats): Stage counters for the most recent collection.
+        srid (int): Spatial reference ID of the returned geometries, taken from the outSR query parameter.
+        response_cache (ResponseCache): Optional on-disk cache of page responses.
+        checkpoints (bool): Whether completed pages are recorded so an interrupted collection can resume.
+        checkpoint_table (str): Name of the checkpoint table, '<table_name>__checkpoints'.
+        table_signature (str): Description of the source table's columns. Checkpoints only resume into a table with the same signature.
+        adaptive_limits (dict): Limits for the AdaptivePageController, or None to keep the page size and concurrency fixed.
+        controller (AdaptivePageController): Controller of the most recent collection, or None if not adaptive.
+        max_record_count (int): Largest page the layer returns, read from its metadata.
+        response_format (str): Format pages are requested in: 'geojson' or 'pbf'.
+        transport (ArcGISTransport): Sends the collection's HTTP requests.
+        staging_columns (dict): Column definitions of the staging table, or None to load straight into table_name.
+        load_table (str): Table the rows are written to: '<table_name>__staging' when staging, otherwise table_name.
+        decode_processes (int): Number of processes pages are decoded in, or 0 to decode on the fetching threads.
+        shards (dict): How the collection is split into shards collected in parallel, or None to collect it as one stream.
+        shard (str): Key of the shard this query collects when it runs as part of a sharded collection, otherwise None.
+        shard_queries (list): Queries of the non-empty shards of the most recent sharded collection.
+        repair (bool or str): Whether a collection whose row count does not match the layer is repaired by ObjectID,
+            or the name of the table column holding the ObjectIDs. False to discard such a collection.
     """
-    def __init__(self, url, query_params, table_name, table_columns, db_engine, batch_size=1000, max_simultaneous_requests=5):
+    def __init__(self, url, query_params, table_name, table_columns, db_engine, batch_size=1000, max_simultaneous_requests=5, load_method='copy', results_queue_size=None, writer_threads=1, commit_chunk_size=5000, pagination='offset', response_cache=None, checkpoints=False, table_signature=None, adaptive_limits=None, response_format='geojson', transport=None, staging_columns=None, decode_processes=0, shards=None, repair=False):
         """
         Initializes the ArcGISFeatureLayerQuery class with the given configurations and database engine.
 
@@ -69,6 +596,37 @@ class ArcGISFeatureLayerQuery:
             db_engine (Engine): SQLAlchemy engine connected to the database.
             batch_size (int): Number of records to fetch in each batch.
             max_simultaneous_requests (int): Maximum number of simultaneous requests.
+            load_method (str): How batches are loaded into the database ('copy' or 'executemany').
+            results_queue_size (int, optional): Maximum number of fetched pages waiting to be saved. Defaults to max_simultaneous_requests.
+            writer_threads (int): Number of database writer threads. Should not exceed the engine's connection pool size.
+            commit_chunk_size (int): Number of rows each writer inserts between commits.
+            pagination (str): How pages are requested. 'offset' pages with resultOffset/resultRecordCount.
+                'objectid_range' and 'objectid_list' first retrieve the layer's ObjectIDs with returnIdsOnly and
+                request disjoint ID chunks with 'OBJECTID BETWEEN a AND b' or objectIds=, respectively.
+            response_cache (ResponseCache, optional): On-disk cache of page responses. Pages found in the cache are not requested.
+            checkpoints (bool): Whether completed pages are recorded in a checkpoint table next to the source table, so a failed
+                collection resumes from the missing pages on the next run instead of starting over.
+            table_signature (str, optional): Description of the source table's columns. Defaults to the ordered column names.
+            adaptive_limits (dict, optional): Enables runtime tuning of the page size and concurrency, starting from batch_size
+                and max_simultaneous_requests. Keys are the AdaptivePageController limits: min_batch_size, max_batch_size,
+                min_concurrency, max_concurrency, target_page_seconds and max_page_bytes.
+            response_format (str): Format pages are requested in. 'pbf' requests the Protocol Buffer feature collection
+                format, decoded straight into rows, and falls back to 'geojson' if the layer does not support it.
+            transport (ArcGISTransport, optional): Sends the collection's HTTP requests. Defaults to an unauthenticated
+                transport with a connection pool sized to the largest number of concurrent requests.
+            staging_columns (dict, optional): Column names and types of the source table. If given, rows are loaded into
+                an UNLOGGED staging table built from them, which replaces table_name only once the load is complete.
+            decode_processes (int): Number of processes to decode pages in. Response bodies are handed to a process
+                pool that decodes them, converts their geometries and, for the 'copy' load method, encodes the rows
+                as COPY text, so decoding uses several cores. 0 decodes pages on the threads that fetch them.
+            shards (dict, optional): Splits the collection into shards that are collected in parallel, each as its own
+                paginated stream with its own checkpoints. Either 'field' with a list of 'values' or with 'distinct: true'
+                to shard by every value returnDistinctValues finds, or 'extent_grid' as [columns, rows] to shard by a grid
+                of envelopes over the layer's extent. 'parallel' sets how many shards are collected at once (default 4).
+            repair (bool or str): Repairs a collection that failed or whose row count does not match the layer's
+                feature count by comparing the layer's ObjectIDs with those in the table, fetching only the missing
+                features and deleting the rows the layer no longer has. True uses the table column named like the
+                layer's ObjectID field; a string names the column. The table must hold the layer's ObjectIDs.
         """
         self.query_url = url
         self.query_params = query_params
@@ -77,7 +635,38 @@ class ArcGISFeatureLayerQuery:
         self.db_engine = db_engine
         self.batch_size = batch_size
         self.max_simultaneous_requests = max_simultaneous_requests
-        self.session = requests.Session()
+        self.load_method = load_method
+        self.results_queue_size = results_queue_size or max_simultaneous_requests
+        self.writer_threads = writer_threads
+        self.commit_chunk_size = commit_chunk_size
+        self.pagination = pagination
+        self.object_id_field = None
+        self.object_ids = []
+        self.stats = PipelineStats()
+        self.srid = int(query_params.get('outSR', 4326))
+        self.response_cache = response_cache
+        self.checkpoints = checkpoints
+        self.checkpoint_table = f"{table_name}__checkpoints"
+        self.staging_columns = staging_columns
+        self.load_table = f"{table_name}__staging" if staging_columns else table_name
+        self.decode_processes = decode_processes or 0
+        self.decode_pool = None
+        self.table_signature = table_signature or ','.join(table_columns)
+        self.adaptive_limits = adaptive_limits
+        self.controller = None
+        self.max_record_count = None
+        self.response_format = response_format
+        self.completed_ranges = []
+        self.shards = shards
+        self.shard = None
+        self.shard_queries = []
+        self.repair = repair
+        self.fetch_concurrency = max_simultaneous_requests
+        pool_size = max_simultaneous_requests
+        if adaptive_limits is not None:
+            pool_size = max(pool_size, adaptive_limits.get('max_concurrency', 16))
+        # A few connections beyond the page requests for metadata, count and ID requests
+        self.transport = transport or ArcGISTransport(pool_size=pool_size + 2)
         self.total_features = 0
         self.total_expected_features = 0
 
@@ -144,77 +733,838 @@ class ArcGISFeatureLayerQuery:
         """
         Fetches data from the ArcGIS Feature Layer in batches and saves it to the database.
 
-        This method handles fetching data in batches, making multiple simultaneous requests,
-        and saving each batch to the database. It continues fetching data until no more data is available.
+        Fetching and writing run as a pipeline. A SlidingWindowScheduler keeps max_simultaneous_requests
+        page requests in flight on one worker pool, and each worker decodes its page into rows, or hands it to
+        the decoding processes if decode_processes is set. The decoded batches are handed to a DatabaseWriterPool
+        through a bounded queue, and its writer threads insert them on their own connections while the next pages
+        are being fetched.
+
+        The layer's metadata caps the page size at its maxRecordCount, and offset paging falls back to ObjectID
+        ranges if the layer does not support pagination. With adaptive limits set, an AdaptivePageController
+        sizes each page as it is requested and sets the number of requests in flight from the responses.
+
+        With checkpoints enabled, each page's position range is recorded in the checkpoint table in the same
+        transaction as its rows. If checkpoints from an earlier run of the same query and expected feature count
+        exist, the table is kept and only the ranges not yet covered are fetched. The checkpoint table is dropped
+        once the table's row count matches the layer's feature count.
+
+        With staging columns set, rows are loaded into an UNLOGGED staging table. Once its row count matches the
+        layer's feature count, its spatial indexes are built and it is swapped in for the source table in one
+        transaction, so the source table is never seen empty or partly loaded, and a failed collection leaves it as it was.
+
+        With shards set, the query is split into shards that are collected in parallel, each by its own scheduler
+        and with its own checkpoints, while sharing the writer pool and the table being loaded. See _fetch_shards.
+
+        With repair set, a collection that fails part way or whose row count does not match the layer is repaired
+        by ObjectID instead of being discarded: only the missing features are fetched and the rows of features
+        the layer no longer has are deleted. See _repair_gaps.
 
         Returns:
             bool: True if the data collection was successful, False otherwise.
         """
-        # Get the total number of features
-        self.total_expected_features = self._get_total_feature_count()
+        self._apply_layer_metadata()
+        if self.shards:
+            return self._fetch_shards()
+
+        self._count_expected_features()
         if self.total_expected_features == 0:
             logger.debug("No features to fetch.")
             return
 
-        logger.debug(f"Total expected features: {self.total_expected_features}")
-
-        offset = 0
-        clear_table(self.db_engine, self.table_name)
-        batch_number = 1
-        total_batches = (self.total_expected_features + self.batch_size - 1) // self.batch_size
-
-        logger.info("Progress: 0% complete.")
-
-        start_time = time.time()  # Start the timer for progress logging
-        last_log_time = start_time  # Track the last time progress was logged
-
-        while offset < self.total_expected_features:
-            # Use ThreadPoolExecutor to handle multiple simultaneous requests
-            with ThreadPoolExecutor(max_workers=self.max_simultaneous_requests) as executor:
-                futures = []
-                for i in range(self.max_simultaneous_requests):
-                    current_offset = offset + i * self.batch_size
-                    if current_offset >= self.total_expected_features:
-                        break
-                    # Prepare query parameters for the current batch
-                    params = self.query_params.copy()
-                    params['resultOffset'] = current_offset
-                    params['resultRecordCount'] = self.batch_size
-                    futures.append(executor.submit(self._fetch_batch, params))
-
-                for future in as_completed(futures):
-                    try:
-                        data = future.result()
-                        if not data:
-                            logger.error(f"No data received for batch {batch_number}/{total_batches}.")
-                            logger.info(f"Collection failed at {progress_percentage:.1f}%")
-                            logger.debug(f"Total features collected: {self.total_features}")
-                            return False
-
-                        self.total_features += len(data)
-                        self._save_to_db(data)
-                        logger.debug(f"Batch {batch_number}/{total_batches} processed. Total features received so far: {self.total_features}/{self.total_expected_features}")
-                        batch_number += 1
-
-                        # Log progress every 10 seconds
-                        current_time = time.time()
-                        progress_percentage = (self.total_features / self.total_expected_features) * 100
-                        if current_time - last_log_time >= 10:
-                            logger.info(f"Progress: {progress_percentage:.1f}% complete.")
-                            last_log_time = current_time
-
-                    except Exception as e:
-                        logger.error(f"Failed to fetch or save data: {e}")
-                        return False
-
-            # Increment offset for the next set of batches
-            offset += self.batch_size * self.max_simultaneous_requests
+        logger.debug(f"Total expected features: {self.total_expected_features} (pagination: {self.pagination}, format: {self.response_format})")
+
+        if not self._prepare_table():
+            return False
+        return self._run_pipeline([self])
+
+    def _count_expected_features(self):
+        """
+        Sets the number of features the query is expected to return, fetching its ObjectIDs in the ObjectID modes.
+        """
+        if self.pagination == 'offset':
+            self.total_expected_features = self._get_total_feature_count()
+        else:
+            self.object_id_field, self.object_ids = self._get_object_ids()
+            self.total_expected_features = len(self.object_ids)
+
+    def _run_pipeline(self, queries):
+        """
+        Collects the pages of one or more queries into the table being loaded and finishes the load.
+
+        If a page could not be fetched and repair is enabled, the missing features are fetched by ObjectID
+        before the load is finished; otherwise the checkpoints are kept for the next run to resume from.
+
+        Args:
+            queries (list): ArcGISFeatureLayerQuery instances to collect: this query, or the queries of its shards.
+
+        Returns:
+            bool: True if every query was collected and the load was finished, False otherwise.
+        """
+        success = self._load_queries(queries)
+        if len(queries) > 1:
+            self.total_features = sum(query.total_features for query in queries)
+        if not success:
+            logger.debug(f"Total features collected: {self.total_features}")
+            if self.repair:
+                logger.info(f"Collection of {self.table_name} is incomplete; repairing it by ObjectID")
+                if self._repair_gaps():
+                    return self._finish_load(repaired=True)
+            return False
 
-        logger.debug("Featurelayer data collection completed successfully.")
         logger.debug(f"Total features collected: {self.total_features}/{self.total_expected_features}")
-        logger.info(f"Progress: {progress_percentage:.1f}% complete.")
+        logger.info(f"Progress: {(self.total_features / self.total_expected_features) * 100:.1f}% complete.")
+        if self.checkpoints or self.staging_columns or self.repair:
+            return self._finish_load()
+        logger.debug("Featurelayer data collection completed successfully.")
+        return True
+
+    def _load_queries(self, queries):
+        """
+        Collects the pages of one or more queries into the table being loaded through a shared writer pool.
+
+        All queries hand their rows to one DatabaseWriterPool and share the decoding processes. A single query is
+        collected on the calling thread; the queries of a sharded collection are collected on a thread pool,
+        at most the shards' 'parallel' setting at a time.
+
+        Args:
+            queries (list): ArcGISFeatureLayerQuery instances to collect.
+
+        Returns:
+            bool: True if every page was fetched and written, False otherwise.
+        """
+        start_time = time.time()  # Start the timer for the stage summary
+        self.stats = PipelineStats()
+        load_method = self.load_method
+        if self.decode_processes:
+            self.decode_pool = ProcessPoolExecutor(max_workers=self.decode_processes)
+            if load_method == 'copy':
+                # The decoding processes also encode the rows, leaving the writers only the COPY itself
+                load_method = 'copy_lines'
+        for query in queries:
+            query.stats = self.stats
+            query.decode_pool = self.decode_pool
+        writer_pool = DatabaseWriterPool(
+            db_engine=self.db_engine,
+            table_name=self.load_table,
+            columns=self.table_columns,
+            num_writers=self.writer_threads,
+            commit_chunk_size=self.commit_chunk_size,
+            load_method=load_method,
+            stats=self.stats,
+            checkpoint_table=self.checkpoint_table if self.checkpoints else None
+        )
+        writer_pool.start()
+        success = True
+        try:
+            if len(queries) == 1:
+                success = queries[0]._collect_pages(writer_pool)
+            else:
+                parallel_shards = min(self._parallel_shards(), len(queries))
+                with ThreadPoolExecutor(max_workers=parallel_shards, thread_name_prefix=f"{self.table_name}-shard") as executor:
+                    futures = {executor.submit(query._collect_pages, writer_pool): query for query in queries}
+                    for future in as_completed(futures):
+                        if not future.result():
+                            logger.error(f"Shard {futures[future].shard} of {self.table_name} failed")
+                            success = False
+        finally:
+            if not writer_pool.close():
+                success = False
+            if self.decode_pool:
+                self.decode_pool.shutdown(cancel_futures=True)
+                self.decode_pool = None
+                for query in queries:
+                    query.decode_pool = None
+
+        if len(queries) == 1:
+            fetchers = queries[0].fetch_concurrency
+        else:
+            fetchers = sum(sorted((query.fetch_concurrency for query in queries), reverse=True)[:self._parallel_shards()])
+        logger.debug(f"Pipeline stages for {self.table_name}: {self.stats.summary(time.time() - start_time, fetchers, self.writer_threads)}")
+        if self.response_cache:
+            logger.debug(f"Response cache for {self.table_name}: {self.response_cache.hits} hits, {self.response_cache.misses} misses")
+        return success
+
+    def _collect_pages(self, writer_pool):
+        """
+        Fetches the pages of the query not yet covered by checkpoints and hands their rows to the writer pool.
+
+        Args:
+            writer_pool (DatabaseWriterPool): Started writer pool the rows and their checkpoint records are handed to.
+
+        Returns:
+            bool: True if every page was fetched, False otherwise.
+        """
+        progress_label = f"Progress of shard {self.shard}" if self.shard else "Progress"
+        batch_number = 0
+        progress_percentage = (self.total_features / self.total_expected_features) * 100
+
+        logger.info(f"{progress_label}: {progress_percentage:.0f}% complete.")
+        last_log_time = time.time()  # Track the last time progress was logged
+
+        self.controller = None
+        if self.adaptive_limits is not None:
+            limits = dict(self.adaptive_limits)
+            if self.max_record_count:
+                limits['max_batch_size'] = min(limits.get('max_batch_size', self.max_record_count), self.max_record_count)
+            self.controller = AdaptivePageController(self.batch_size, self.max_simultaneous_requests, **limits)
+        scheduler = SlidingWindowScheduler(
+            worker=self._fetch_page,
+            max_in_flight=self.controller.concurrency if self.controller else self.max_simultaneous_requests,
+            results_queue_size=self.results_queue_size,
+            max_workers=self.controller.max_concurrency if self.controller else None
+        )
+        success = True
+        try:
+            for (page, params, page_range), rows in scheduler.run(self._iter_page_params()):
+                if not rows:
+                    logger.error(f"No data received for batch at {page} ({batch_number} batches processed).")
+                    logger.info(f"Collection failed at {progress_percentage:.1f}%")
+                    success = False
+                    break
+
+                self.total_features += len(rows)
+                writer_pool.put(rows, self._checkpoint_record(page_range, len(rows)))
+                batch_number += 1
+                logger.debug(f"Batch {batch_number} fetched ({page}, {len(rows)} features). Total features received so far: {self.total_features}/{self.total_expected_features}")
+                if self.controller and self.controller.concurrency != scheduler.max_in_flight:
+                    scheduler.set_max_in_flight(self.controller.concurrency)
+
+                # Log progress every 10 seconds
+                current_time = time.time()
+                progress_percentage = (self.total_features / self.total_expected_features) * 100
+                if current_time - last_log_time >= 10:
+                    logger.info(f"{progress_label}: {progress_percentage:.1f}% complete.")
+                    last_log_time = current_time
+
+        except Exception as e:
+            logger.error(f"Failed to fetch or save data: {e}")
+            success = False
+
+        self.fetch_concurrency = scheduler.max_in_flight
+        if self.controller:
+            logger.debug(f"Adaptive paging for {self.shard or self.table_name} ended at {self.controller.batch_size} features per page and {self.controller.concurrency} concurrent requests")
+        return success
+
+    def _fetch_shards(self):
+        """
+        Collects the query as shards, each a paginated stream of its own, loading them in parallel into one table.
+
+        Attribute shards add 'field = value' to the where clause and are disjoint by construction. Grid shards add
+        an envelope filter, and since a feature crossing cell edges intersects several envelopes, they page by
+        ObjectID list and each ObjectID is kept only in the first shard that returns it. Empty shards are dropped.
+
+        Every shard records its pages in the shared checkpoint table under its own key and run signature, so an
+        interrupted run resumes each shard from its own missing pages. The loaded table is verified against the
+        layer's feature count, or for a list of values against the sum of the shards' counts, before it is swapped in.
+
+        Returns:
+            bool: True if every shard was collected and the load was finished, False otherwise.
+        """
+        try:
+            shards = self._resolve_shards()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Failed to resolve the shards of {self.table_name}: {e}")
+            return False
+        if not shards:
+            logger.error(f"No shards to collect for {self.table_name}")
+            return False
+
+        queries = [self._shard_query(shard, shard_params) for shard, shard_params in shards]
+        with ThreadPoolExecutor(max_workers=min(self.max_simultaneous_requests, len(queries))) as executor:
+            list(executor.map(ArcGISFeatureLayerQuery._count_expected_features, queries))
+        if self.shards.get('extent_grid'):
+            collected_ids = set()
+            for query in queries:
+                query.object_ids = [object_id for object_id in query.object_ids if object_id not in collected_ids]
+                collected_ids.update(query.object_ids)
+                query.total_expected_features = len(query.object_ids)
+
+        self.shard_queries = [query for query in queries if query.total_expected_features]
+        self.total_expected_features = sum(query.total_expected_features for query in self.shard_queries)
+        if self.total_expected_features == 0:
+            logger.debug("No features to fetch.")
+            return
+
+        logger.info(f"Collecting {self.table_name} in {len(self.shard_queries)} shards of {len(shards)} ({self.total_expected_features} features, {self._parallel_shards()} shards at a time)")
+        if not self._prepare_shards(self.shard_queries):
+            return False
+        return self._run_pipeline(self.shard_queries)
+
+    def _parallel_shards(self):
+        """
+        Gets the number of shards collected at once.
+
+        Returns:
+            int: The shards' 'parallel' setting, 4 by default.
+        """
+        return max(1, int(self.shards.get('parallel', 4)))
+
+    def _resolve_shards(self):
+        """
+        Builds the key and extra query parameters of each shard from the shards config.
+
+        Returns:
+            list: (shard key, query parameters added to the query) tuples, in collection order.
+
+        Raises:
+            ValueError: If the config names neither values, distinct values nor a grid, or the server returns an error.
+        """
+        if self.shards.get('extent_grid'):
+            return self._extent_grid_shards(self.shards['extent_grid'])
+        field = self.shards.get('field')
+        values = self.shards.get('values')
+        if field and values is None and self.shards.get('distinct'):
+            values = self._get_distinct_values(field)
+        if not field or values is None:
+            raise ValueError("shards needs a 'field' with 'values' or 'distinct: true', or an 'extent_grid'")
+        where = self.query_params.get('where', '1=1')
+        return [
+            (f"{field}={value}", {'where': f"({where}) AND {self._shard_condition(field, value)}"})
+            for value in dict.fromkeys(values)
+        ]
+
+    @staticmethod
+    def _shard_condition(field, value):
+        """
+        Builds the where condition selecting one attribute value.
+
+        Args:
+            field (str): Attribute field the collection is sharded by.
+            value: Value of the shard: a string, a number or None.
+
+        Returns:
+            str: SQL condition, such as "DFIRM_ID = '110001'" or "DFIRM_ID IS NULL".
+        """
+        if value is None:
+            return f"{field} IS NULL"
+        if isinstance(value, str):
+            return f"{field} = '{value.replace(chr(39), chr(39) * 2)}'"
+        return f"{field} = {value}"
+
+    def _query_json(self, params, description):
+        """
+        Sends a JSON query to the layer.
+
+        Args:
+            params (dict): Query parameters, sent as form data.
+            description (str): What is being fetched, for the error message.
+
+        Returns:
+            dict: Parsed response.
+
+        Raises:
+            requests.RequestException: If the request fails.
+            ValueError: If the response is not JSON or the server returns an error.
+        """
+        params = dict(params, f='json')
+        with self.transport.request('POST', self.query_url, data=params) as response:
+            response.raise_for_status()
+            response_json = response.json()
+        if 'error' in response_json:
+            raise ValueError(f"Server returned an error when fetching {description}: {response_json['error']}")
+        return response_json
+
+    def _get_distinct_values(self, field):
+        """
+        Fetches every distinct value of a field among the features matching the query, page by page.
+
+        Args:
+            field (str): Attribute field to read.
+
+        Returns:
+            list: Distinct values, ordered by the server, including None if some features have no value.
+        """
+        params = {
+            'where': self.query_params.get('where', '1=1'),
+            'outFields': field,
+            'returnDistinctValues': 'true',
+            'returnGeometry': 'false',
+            'orderByFields': field
+        }
+        values = []
+        while True:
+            response_json = self._query_json(dict(params, resultOffset=len(values)), f"the distinct values of {field}")
+            features = response_json.get('features') or []
+            for feature in features:
+                attributes = feature.get('attributes') or {}
+                values.append(next((value for name, value in attributes.items() if name.lower() == field.lower()), None))
+            if not features or not response_json.get('exceededTransferLimit'):
+                break
+        logger.debug(f"Found {len(values)} distinct values of {field} to shard {self.table_name} by")
+        return values
+
+    def _extent_grid_shards(self, grid):
+        """
+        Splits the extent of the features matching the query into a grid of envelopes.
+
+        Args:
+            grid (list): [columns, rows] of the grid, or a single number for a square grid.
+
+        Returns:
+            list: (shard key, envelope query parameters) tuples, one per cell, row by row. Empty if the layer has no extent.
+        """
+        columns, rows = (grid, grid) if isinstance(grid, int) else grid
+        params = {'where': self.query_params.get('where', '1=1'), 'returnExtentOnly': 'true'}
+        if 'outSR' in self.query_params:
+            params['outSR'] = self.query_params['outSR']
+        extent = self._query_json(params, "the layer's extent").get('extent') or {}
+        if extent.get('xmin') is None or extent.get('xmin') == 'NaN':
+            return []
+        spatial_reference = extent.get('spatialReference') or {}
+        in_sr = spatial_reference.get('latestWkid') or spatial_reference.get('wkid') or self.srid
+        width = (extent['xmax'] - extent['xmin']) / columns
+        height = (extent['ymax'] - extent['ymin']) / rows
+        shards = []
+        for row in range(rows):
+            for column in range(columns):
+                envelope = (
+                    extent['xmin'] + column * width,
+                    extent['ymin'] + row * height,
+                    extent['xmax'] if column == columns - 1 else extent['xmin'] + (column + 1) * width,
+                    extent['ymax'] if row == rows - 1 else extent['ymin'] + (row + 1) * height
+                )
+                shards.append((f"cell {column},{row}", {
+                    'geometry': ','.join(repr(coordinate) for coordinate in envelope),
+                    'geometryType': 'esriGeometryEnvelope',
+                    'spatialRel': 'esriSpatialRelIntersects',
+                    'inSR': in_sr
+                }))
+        return shards
+
+    def _shard_query(self, shard, shard_params, pagination=None):
+        """
+        Builds the query collecting one shard, with this query's settings after they were adjusted to the layer's metadata.
+
+        Args:
+            shard (str): Key of the shard, or None for a query collecting part of the layer outside of sharding.
+            shard_params (dict): Query parameters added to this query's parameters.
+            pagination (str, optional): Pagination of the shard. Defaults to this query's, or to ObjectID lists for grid cells.
+
+        Returns:
+            ArcGISFeatureLayerQuery: Query of the shard, loading into the same table and checkpoint table.
+        """
+        query = ArcGISFeatureLayerQuery(
+            url=self.query_url,
+            query_params={**self.query_params, **shard_params},
+            table_name=self.table_name,
+            table_columns=self.table_columns,
+            db_engine=self.db_engine,
+            batch_size=self.batch_size,
+            max_simultaneous_requests=self.max_simultaneous_requests,
+            load_method=self.load_method,
+            results_queue_size=self.results_queue_size,
+            writer_threads=self.writer_threads,
+            commit_chunk_size=self.commit_chunk_size,
+            # Grid cells overlap at their edges, so their features are deduplicated by ObjectID
+            pagination=pagination or ('objectid_list' if 'geometry' in shard_params else self.pagination),
+            response_cache=self.response_cache,
+            checkpoints=self.checkpoints,
+            table_signature=self.table_signature,
+            adaptive_limits=self.adaptive_limits,
+            response_format=self.response_format,
+            transport=self.transport,
+            staging_columns=self.staging_columns
+        )
+        query.shard = shard
+        query.max_record_count = self.max_record_count
+        return query
+
+    def _prepare_shards(self, queries):
+        """
+        Loads the completed ranges of each shard from a resumable earlier run, or empties the table being loaded
+        and starts a new checkpoint table.
+
+        Checkpoints are only reused when every one of them belongs to a current shard and matches its run
+        signature and the table signature, and the table holds the rows they account for. Rows are not tagged
+        with their shard, so a shard whose features changed cannot be collected again alone and the whole
+        collection starts over.
+
+        Args:
+            queries (list): Queries of the shards.
+
+        Returns:
+            bool: True if the table is ready to load, False otherwise.
+        """
+        for query in queries:
+            query.completed_ranges = []
+            query.total_features = 0
+        if self.checkpoints:
+            run_signatures = {query.shard: query._run_signature() for query in queries}
+            checkpoints = get_checkpoints(self.db_engine, self.checkpoint_table)
+            if checkpoints and all(
+                run_signatures.get(checkpoint['page_key'].rpartition('|')[0]) == checkpoint['run_signature']
+                and checkpoint['table_signature'] == self.table_signature
+                for checkpoint in checkpoints
+            ) and get_table_row_count(self.db_engine, self.load_table) == sum(checkpoint['feature_count'] for checkpoint in checkpoints):
+                for query in queries:
+                    shard_checkpoints = [checkpoint for checkpoint in checkpoints if checkpoint['page_key'].rpartition('|')[0] == query.shard]
+                    query.completed_ranges = sorted((checkpoint['range_start'], checkpoint['range_end']) for checkpoint in shard_checkpoints)
+                    query.total_features = sum(checkpoint['feature_count'] for checkpoint in shard_checkpoints)
+                self.total_features = sum(query.total_features for query in queries)
+                logger.info(f"Resuming collection into {self.load_table}: {len(checkpoints)} pages ({self.total_features} features) already collected")
+                return True
+            if checkpoints:
+                logger.info(f"Checkpoints for {self.load_table} do not match the current shards, layer or table contents; starting over")
+        return self._reset_table()
+
+    def can_resume(self):
+        """
+        Checks whether an interrupted collection left checkpoints that can be resumed into the existing table.
+
+        Returns:
+            bool: True if checkpoints are enabled, the table being loaded exists and its checkpoints were written for the same table columns.
+        """
+        if not self.checkpoints or not table_exists(self.db_engine, self.load_table):
+            return False
+        checkpoints = get_checkpoints(self.db_engine, self.checkpoint_table)
+        return bool(checkpoints) and all(checkpoint['table_signature'] == self.table_signature for checkpoint in checkpoints)
+
+    def _run_signature(self):
+        """
+        Describes the query and the layer state that checkpointed position ranges refer to.
+
+        Page sizes are not part of the signature, since checkpoints record position ranges rather than pages.
+        In the ObjectID modes the signature includes a hash of the ObjectID list, because positions index into it.
+
+        Returns:
+            str: Signature of the pagination mode, where clause, spatial filter, expected feature count and ObjectIDs.
+        """
+        signature = f"{self.pagination}|{self.query_params.get('where', '1=1')}|{self.total_expected_features}"
+        if 'geometry' in self.query_params:
+            signature += f"|{self.query_params['geometry']}"
+        if self.pagination != 'offset':
+            signature += '|' + hashlib.sha1(','.join(str(object_id) for object_id in self.object_ids).encode('utf-8')).hexdigest()
+        return signature
+
+    def _prepare_table(self):
+        """
+        Loads the completed ranges of a resumable earlier run, or empties the table being loaded and starts a new checkpoint table.
+
+        Checkpoints are only reused when every one of them matches the current run and table signatures and the
+        table still holds the rows they account for, which an unlogged staging table does not after a server crash.
+        When staging, starting over rebuilds the staging table; otherwise the source table is cleared.
+
+        Returns:
+            bool: True if the table is ready to load, False otherwise.
+        """
+        self.completed_ranges = []
+        self.total_features = 0
+        if self.checkpoints:
+            run_signature = self._run_signature()
+            checkpoints = get_checkpoints(self.db_engine, self.checkpoint_table)
+            if checkpoints and all(
+                checkpoint['run_signature'] == run_signature and checkpoint['table_signature'] == self.table_signature
+                for checkpoint in checkpoints
+            ) and get_table_row_count(self.db_engine, self.load_table) == sum(checkpoint['feature_count'] for checkpoint in checkpoints):
+                self.completed_ranges = sorted((checkpoint['range_start'], checkpoint['range_end']) for checkpoint in checkpoints)
+                self.total_features = sum(checkpoint['feature_count'] for checkpoint in checkpoints)
+                logger.info(f"Resuming collection into {self.load_table}: {len(checkpoints)} pages ({self.total_features} features) already collected")
+                return True
+            if checkpoints:
+                logger.info(f"Checkpoints for {self.load_table} do not match the current collection settings, layer or table contents; starting over")
+        return self._reset_table()
+
+    def _reset_table(self):
+        """
+        Empties the table being loaded, rebuilding it when staging, and starts a new checkpoint table.
+
+        Returns:
+            bool: True if the table is ready to load, False otherwise.
+        """
+        if self.staging_columns:
+            prepared = create_staging_table(self.db_engine, self.load_table, self.staging_columns)
+        else:
+            prepared = clear_table(self.db_engine, self.load_table)
+        if prepared and self.checkpoints:
+            prepared = create_checkpoint_table(self.db_engine, self.checkpoint_table)
+        return prepared
+
+    def _checkpoint_record(self, page_range, feature_count):
+        """
+        Builds the checkpoint record committed together with a page's rows.
+
+        Args:
+            page_range (tuple): (start, end) position range of the page, end exclusive.
+            feature_count (int): Number of features in the page.
+
+        Returns:
+            dict: Checkpoint record, or None if checkpoints are disabled.
+        """
+        if not self.checkpoints:
+            return None
+        page_key = f"{page_range[0]}-{page_range[1]}"
+        return {
+            'page_key': f"{self.shard}|{page_key}" if self.shard else page_key,
+            'range_start': page_range[0],
+            'range_end': page_range[1],
+            'feature_count': feature_count,
+            'run_signature': self._run_signature(),
+            'table_signature': self.table_signature
+        }
+
+    def _finish_load(self, repaired=False):
+        """
+        Verifies the loaded table against the layer's current feature count, swaps a staging table in for the
+        source table and drops the checkpoint table.
+
+        If the counts differ and repair is enabled, the table is first repaired by ObjectID. If they still differ
+        the checkpoints and staging table are dropped, so the next run collects the table from scratch, and the
+        source table is left as it was. If the swap fails the checkpoints are kept, so the next run retries the
+        swap without fetching the pages again.
+
+        Args:
+            repaired (bool): Whether the table has just been repaired, in which case it is not repaired again.
+
+        Returns:
+            bool: True if the loaded table's row count matches the layer's feature count and it is in place, False otherwise.
+        """
+        table_count = get_table_row_count(self.db_engine, self.load_table)
+        layer_count = self._get_expected_table_count()
+        if table_count != layer_count and self.repair and not repaired:
+            logger.warning(f"Table {self.load_table} has {table_count} rows but the layer has {layer_count} features; repairing it by ObjectID")
+            if self._repair_gaps():
+                table_count = get_table_row_count(self.db_engine, self.load_table)
+                layer_count = self._get_expected_table_count()
+        if table_count != layer_count:
+            logger.error(f"Table {self.load_table} has {table_count} rows but the layer has {layer_count} features; loaded rows discarded")
+            if self.checkpoints:
+                drop_table(self.db_engine, self.checkpoint_table)
+            if self.staging_columns:
+                drop_table(self.db_engine, self.load_table)
+            return False
+        if self.staging_columns:
+            if not create_spatial_indexes(self.db_engine, self.load_table, self.staging_columns):
+                return False
+            if not swap_in_staging_table(self.db_engine, self.load_table, self.table_name):
+                return False
+            logger.debug(f"Staging table {self.load_table} swapped in as {self.table_name}")
+        if self.checkpoints:
+            drop_table(self.db_engine, self.checkpoint_table)
+        logger.debug("Featurelayer data collection completed successfully.")
         return True
-        
+
+    def _get_expected_table_count(self):
+        """
+        Fetches the number of rows the loaded table should hold.
+
+        Returns:
+            int: The layer's feature count, or for shards listing their values, the sum of the shards' feature counts.
+        """
+        if self.shard_queries and self.shards.get('values') is not None:
+            return sum(query._get_total_feature_count() for query in self.shard_queries)
+        return self._get_total_feature_count()
+
+    def _get_expected_object_ids(self):
+        """
+        Fetches the ObjectIDs the loaded table should hold.
+
+        Returns:
+            tuple: (ObjectID field name, sorted list of ObjectIDs). The field name is None if a request failed.
+        """
+        if not (self.shard_queries and self.shards.get('values') is not None):
+            return self._get_object_ids()
+        object_id_field, object_ids = None, set()
+        for query in self.shard_queries:
+            object_id_field, shard_object_ids = query._get_object_ids()
+            if object_id_field is None:
+                return None, []
+            object_ids.update(shard_object_ids)
+        return object_id_field, sorted(object_ids)
+
+    def _repair_column(self, object_id_field):
+        """
+        Finds the table column holding the layer's ObjectIDs.
+
+        Args:
+            object_id_field (str): Name of the layer's ObjectID field.
+
+        Returns:
+            str: Column name, or None if the table has no such column.
+        """
+        if isinstance(self.repair, str):
+            return self.repair
+        return next((column for column in self.table_columns if column.lower() == object_id_field.lower()), None)
+
+    def _repair_gaps(self):
+        """
+        Brings the loaded table in line with the layer by ObjectID, without collecting it again.
+
+        The layer's ObjectIDs from returnIdsOnly are compared with the values of the table's ObjectID column.
+        Rows whose ObjectIDs the layer no longer has, or that repeat another row's ObjectID, are deleted, and the
+        missing features are fetched in parallel pages of ObjectID lists.
+
+        Returns:
+            bool: True if the table holds every ObjectID of the layer once, False if the ObjectIDs could not be
+            compared or a missing feature could not be fetched.
+        """
+        object_id_field, object_ids = self._get_expected_object_ids()
+        if object_id_field is None:
+            logger.error(f"Could not fetch the ObjectIDs of the layer to repair {self.load_table}")
+            return False
+        id_column = self._repair_column(object_id_field)
+        if id_column is None:
+            logger.error(f"Table {self.table_name} has no column holding the layer's {object_id_field} values; it cannot be repaired")
+            return False
+        stored_values = get_column_values(self.db_engine, self.load_table, id_column)
+        if stored_values is None:
+            return False
+
+        stored_ids = {int(value) for value in stored_values if value is not None}
+        layer_ids = set(object_ids)
+        missing_ids = [object_id for object_id in object_ids if object_id not in stored_ids]
+        removed_ids = sorted(stored_ids - layer_ids)
+        duplicate_count = sum(value is not None for value in stored_values) - len(stored_ids)
+        logger.info(f"Repairing {self.load_table}: {len(missing_ids)} features missing, {len(removed_ids)} no longer in the layer, {duplicate_count} duplicated")
+        if duplicate_count and delete_duplicate_rows(self.db_engine, self.load_table, id_column) is None:
+            return False
+        if removed_ids and delete_rows_by_values(self.db_engine, self.load_table, id_column, removed_ids) is None:
+            return False
+        if not missing_ids:
+            return True
+
+        query = self._shard_query(None, {}, pagination='objectid_list')
+        query.checkpoints = False
+        query.object_id_field = object_id_field
+        query.object_ids = missing_ids
+        query.total_expected_features = len(missing_ids)
+        success = self._load_queries([query])
+        logger.info(f"Repair of {self.load_table} fetched {query.total_features} of {len(missing_ids)} missing features")
+        return success
+
+    def _iter_page_params(self):
+        """
+        Generates the query parameters for each page of the collection.
+
+        Pages are described by their position range: the result offset in offset mode, or the index into the sorted
+        ObjectIDs in the ObjectID modes. Ranges already covered by checkpoints are skipped. Each page is sized when it
+        is requested, so a page size set by the adaptive controller applies to the next page scheduled.
+
+        In offset mode each page sets resultOffset and resultRecordCount. In the ObjectID modes each page covers
+        a disjoint chunk of the sorted ObjectIDs, so every page costs the same however deep it is and no row
+        can be skipped or duplicated between pages.
+
+        Yields:
+            tuple: (page description, query parameters for the page, (start, end) position range).
+        """
+        position = 0
+        end_of_collection = (self.total_expected_features, self.total_expected_features)
+        for range_start, range_end in self.completed_ranges + [end_of_collection]:
+            while position < range_start:
+                page_size = self.controller.batch_size if self.controller else self.batch_size
+                end = min(position + page_size, range_start)
+                yield self._page_params(position, end)
+                position = end
+            position = max(position, range_end)
+
+    def _page_params(self, start, end):
+        """
+        Builds the query parameters for the page covering a position range.
+
+        Args:
+            start (int): First position of the page.
+            end (int): Position after the last one in the page.
+
+        Returns:
+            tuple: (page description, query parameters for the page, (start, end) position range).
+        """
+        params = self.query_params.copy()
+        params['f'] = self.response_format
+        if self.pagination == 'offset':
+            params['resultOffset'] = start
+            params['resultRecordCount'] = end - start
+            return f"offset {start}", params, (start, end)
+
+        chunk = self.object_ids[start:end]
+        if self.pagination == 'objectid_list':
+            params['objectIds'] = ','.join(str(object_id) for object_id in chunk)
+        else:
+            params['where'] = f"({self.query_params.get('where', '1=1')}) AND {self.object_id_field} BETWEEN {chunk[0]} AND {chunk[-1]}"
+        return f"{self.object_id_field} {chunk[0]}-{chunk[-1]}", params, (start, end)
+
+    def _apply_layer_metadata(self):
+        """
+        Reads the layer's maxRecordCount, pagination support and query formats and adjusts the collection settings to them.
+
+        The page size is capped at maxRecordCount, since larger pages would be silently truncated. Offset paging
+        switches to ObjectID ranges if the layer does not support resultOffset, and PBF requests fall back to
+        GeoJSON if the layer does not list PBF among its supported query formats.
+        """
+        metadata = self.get_layer_metadata()
+        supported_formats = [query_format.strip().lower() for query_format in (metadata.get('supportedQueryFormats') or '').split(',')]
+        if self.response_format == 'pbf' and 'pbf' not in supported_formats:
+            logger.warning(f"Layer does not support PBF queries (supported formats: {metadata.get('supportedQueryFormats')}); using GeoJSON instead")
+            self.response_format = 'geojson'
+        self.max_record_count = metadata.get('maxRecordCount')
+        supports_pagination = (metadata.get('advancedQueryCapabilities') or {}).get('supportsPagination', True)
+        logger.debug(f"Layer metadata: maxRecordCount {self.max_record_count}, supportsPagination {supports_pagination}")
+        if self.pagination == 'offset' and not supports_pagination:
+            logger.warning("Layer does not support offset pagination; paging by ObjectID ranges instead")
+            self.pagination = 'objectid_range'
+        if self.max_record_count and self.batch_size > self.max_record_count:
+            logger.debug(f"Batch size {self.batch_size} exceeds the layer's maxRecordCount; using {self.max_record_count}")
+            self.batch_size = self.max_record_count
+
+    def get_layer_metadata(self):
+        """
+        Fetches the layer's JSON metadata from the layer endpoint that the query URL belongs to.
+
+        Returns:
+            dict: Layer metadata, or an empty dict if the request fails.
+        """
+        layer_url = self.query_url.rstrip('/')
+        if layer_url.endswith('/query'):
+            layer_url = layer_url[:-len('/query')]
+        try:
+            with self.transport.request('GET', layer_url, params={'f': 'json'}) as response:
+                response.raise_for_status()
+                metadata = response.json()
+            if 'error' in metadata:
+                logger.warning(f"Server returned an error when fetching layer metadata: {metadata['error']}")
+                return {}
+            return metadata
+        except requests.RequestException as e:
+            logger.warning(f"Request failed when fetching layer metadata: {e}")
+        except ValueError as e:
+            logger.warning(f"Failed to parse JSON response when fetching layer metadata: {e}")
+        return {}
+
+    def get_source_fingerprint(self):
+        """
+        Builds a fingerprint of the layer's current state from its last edit date and the query's feature count.
+
+        Returns:
+            dict: 'last_edit_date' (epoch milliseconds, or None if the layer does not report edits) and 'feature_count'.
+        """
+        editing_info = self.get_layer_metadata().get('editingInfo') or {}
+        return {
+            'last_edit_date': editing_info.get('dataLastEditDate') or editing_info.get('lastEditDate'),
+            'feature_count': self._get_total_feature_count()
+        }
+
+    def _get_object_ids(self):
+        """
+        Fetches the sorted ObjectIDs of all features matching the query with returnIdsOnly.
+
+        Returns:
+            tuple: (ObjectID field name, sorted list of ObjectIDs). The list is empty if the request fails.
+        """
+        params = self.query_params.copy()
+        params['returnIdsOnly'] = True
+        params['f'] = 'json'
+        try:
+            with self.transport.request('POST', self.query_url, data=params) as response:
+                response.raise_for_status()
+                response_json = response.json()
+            if 'error' in response_json:
+                logger.warning(f"Server returned an error when fetching ObjectIDs: {response_json['error']}")
+                return None, []
+            return response_json.get('objectIdFieldName', 'OBJECTID'), sorted(response_json.get('objectIds') or [])
+        except requests.RequestException as e:
+            logger.warning(f"Request failed when fetching ObjectIDs: {e}")
+        except ValueError as e:
+            logger.warning(f"Failed to parse JSON response when fetching ObjectIDs: {e}")
+        return None, []
+
     def _get_total_feature_count(self):
         """
         Fetches the total number of features available from the ArcGIS Feature Layer.
@@ -225,14 +1575,14 @@ class ArcGISFeatureLayerQuery:
         params = self.query_params.copy()
         params['returnCountOnly'] = True
         try:
-            response = self.session.post(self.query_url, data=params)
-            response.raise_for_status()
-            if response.content:
-                response_json = response.json()
-                count = response_json.get('properties', {}).get('count', 0)
-                return count
-            else:
-                logger.warning("Empty response received when fetching total feature count.")
+            with self.transport.request('POST', self.query_url, data=params) as response:
+                response.raise_for_status()
+                if response.content:
+                    response_json = response.json()
+                    count = response_json.get('properties', {}).get('count', 0)
+                    return count
+                else:
+                    logger.warning("Empty response received when fetching total feature count.")
         except requests.RequestException as e:
             logger.warning(f"Request failed when fetching total feature count: {e}")
         except ValueError as e:
@@ -241,46 +1591,169 @@ class ArcGISFeatureLayerQuery:
 
     def _fetch_batch(self, params):
         """
-        Fetches a single batch of data from the ArcGIS Feature Layer.
+        Fetches a single batch of data from the ArcGIS Feature Layer and decodes it into rows.
 
-        This method includes retry logic to handle failed requests.
+        The response is streamed and decoded as it arrives, so a page is never held as one decoded JSON document.
+        Failed requests are retried up to the transport's max_attempts with a jittered backoff between attempts, and
+        a rejected token is refreshed before the next attempt. If a response cache is set, a cached response is used
+        instead of a request, and each successful response is written to the cache as it is read. Response times,
+        payload sizes and failures are reported to the adaptive controller, if there is one.
 
         Args:
             params (dict): Query parameters for the request.
 
         Returns:
-            list: List of features fetched from the ArcGIS Feature Layer.
+            list: List of row tuples ordered like table_columns, or of their COPY lines when decoding processes encode
+                them, or an empty list if the batch could not be fetched.
         """
-        for attempt in range(3):
+        rows = self._read_cached_batch(params)
+        if rows:
+            return rows
+        max_attempts = self.transport.max_attempts
+        for attempt in range(max_attempts):
+            cache_writer = None
+            failure = None
             try:
-                response = self.session.post(self.query_url, data=params)
-                response.raise_for_status()
-                if response.content:
-                    response_json = response.json()
-                    features = response_json.get('features', [])
-                    if features:
-                        logger.debug(f"Received {len(features)} features in response")
-                        return features
-                    else:
-                        logger.warning(f"No features found in response (attempt {attempt + 1}/3)")
+                with self.transport.request('POST', self.query_url, data=params, stream=True) as response:
+                    body_start = time.perf_counter()
+                    response.raise_for_status()
+                    if self.response_cache:
+                        cache_writer = self.response_cache.writer(self.query_url, params)
+                    rows, error, payload_bytes = self._decode_chunks(self._iter_response_chunks(response, cache_writer))
+                    request_seconds = response.elapsed.total_seconds() + time.perf_counter() - body_start
+                if rows:
+                    logger.debug(f"Received {len(rows)} features in response")
+                    if self.controller:
+                        self.controller.record_success(request_seconds, payload_bytes, len(rows))
+                    if cache_writer:
+                        cache_writer.commit()
+                    return rows
+                elif error is not None:
+                    logger.warning(f"Server returned an error (attempt {attempt + 1}/{max_attempts}): {error}")
+                    if not self.transport.token_rejected(error.get('code')):
+                        self._record_failure(error.get('code'))
+                elif payload_bytes:
+                    logger.warning(f"No features found in response (attempt {attempt + 1}/{max_attempts})")
                 else:
-                    logger.warning(f"Empty response received (attempt {attempt + 1}/3)")
+                    logger.warning(f"Empty response received (attempt {attempt + 1}/{max_attempts})")
             except requests.RequestException as e:
-                logger.warning(f"Request failed (attempt {attempt + 1}/3): {e}")
+                logger.warning(f"Request failed (attempt {attempt + 1}/{max_attempts}): {e}")
+                self._record_failure(getattr(e.response, 'status_code', None), isinstance(e, requests.Timeout))
+                failure = e
             except ValueError as e:
-                logger.warning(f"Failed to parse JSON response (attempt {attempt + 1}/3): {e}")
-            time.sleep(10)
-        logger.error(f"Failed to fetch data after 3 attempts for params: {params}")
+                logger.warning(f"Failed to decode response (attempt {attempt + 1}/{max_attempts}): {e}")
+            finally:
+                if cache_writer:
+                    cache_writer.discard()
+            if attempt + 1 < max_attempts:
+                self.transport.wait_before_retry(attempt, failure)
+        logger.error(f"Failed to fetch data after {max_attempts} attempts for params: {params}")
         return []
 
-    def _save_to_db(self, data):
+    @staticmethod
+    def _iter_response_chunks(response, cache_writer=None):
         """
-        Saves a batch of data to the PostGIS database using raw SQL.
+        Reads a streamed response body in chunks, copying each chunk to the cache writer if there is one.
 
         Args:
-            data (list): List of features to save to the database.
+            response (requests.Response): Response opened with stream=True.
+            cache_writer (ResponseCacheWriter, optional): Writer receiving a copy of the body.
+
+        Yields:
+            bytes: Chunk of the response body.
         """
-        if not data:
-            return
+        for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE):
+            if cache_writer:
+                cache_writer.write(chunk)
+            yield chunk
+
+    def _decode_chunks(self, chunks):
+        """
+        Decodes a page response into rows as its chunks are read.
+
+        PBF responses are collected and decoded straight into rows. JSON responses, which include errors returned
+        for PBF requests, are parsed incrementally as GeoJSON and converted to rows a few features at a time.
+        While a decoding process pool is running, the whole body is read and decoded by decode_page in one of its
+        processes instead, returning COPY lines rather than row tuples when the writers load them with 'copy_lines'.
+
+        Args:
+            chunks (iterable): Byte chunks of the response body.
 
-        geojson_to_postgis(self.db_engine, self.table_name, self.table_columns, features=data)
+        Returns:
+            tuple: (list of row tuples, ArcGIS error dict if the server returned an error, otherwise None,
+                number of response bytes read).
+
+        Raises:
+            ValueError: If the response cannot be decoded.
+        """
+        decode_pool = self.decode_pool
+        if decode_pool is not None:
+            content = b''.join(chunks)
+            copy_lines = self.load_method == 'copy'
+            return decode_pool.submit(decode_page, content, self.table_columns, self.srid, self.response_format, copy_lines).result()
+        chunks = iter(chunks)
+        first_chunk = next((chunk for chunk in chunks if chunk), b'')
+        if not first_chunk:
+            return [], None, 0
+        if self.response_format == 'pbf' and first_chunk.lstrip()[:1] != b'{':
+            content = first_chunk + b''.join(chunks)
+            return pbf_features_to_rows(content, self.table_columns, self.srid), None, len(content)
+        stream = GeoJSONFeatureStream(itertools.chain([first_chunk], chunks))
+        rows = geojson_stream_to_rows(stream, self.table_columns, self.srid)
+        if stream.error is not None:
+            return [], stream.error, stream.bytes_read
+        return rows, None, stream.bytes_read
+
+    def _record_failure(self, status_code=None, timed_out=False):
+        """
+        Reports a failed request to the adaptive controller, if there is one.
+
+        Args:
+            status_code (int, optional): HTTP status or ArcGIS error code of the failure.
+            timed_out (bool): Whether the request timed out.
+        """
+        if self.controller:
+            self.controller.record_failure(throttled=status_code in (429, 503), timed_out=timed_out or status_code == 504)
+
+    def _read_cached_batch(self, params):
+        """
+        Reads a batch from the response cache and decodes it into rows as the entry is decompressed.
+
+        Args:
+            params (dict): Query parameters for the request.
+
+        Returns:
+            list: List of row tuples, or an empty list if the cache is disabled or has no usable entry.
+        """
+        if not self.response_cache:
+            return []
+        cache_file = self.response_cache.open(self.query_url, params)
+        if cache_file is None:
+            return []
+        try:
+            with cache_file:
+                rows, _, _ = self._decode_chunks(iter(lambda: cache_file.read(RESPONSE_CHUNK_SIZE), b''))
+            logger.debug(f"Read {len(rows)} features from the response cache")
+            return rows
+        except (OSError, EOFError) as e:
+            logger.warning(f"Discarding unreadable cache entry, requesting it again: {e}")
+            self.response_cache.discard(cache_file.name)
+            return []
+        except ValueError as e:
+            logger.warning(f"Failed to decode cached response, requesting it again: {e}")
+            return []
+
+    def _fetch_page(self, page):
+        """
+        Fetches a single page and decodes it into rows for the database writers. Runs on a worker thread.
+
+        Args:
+            page (tuple): (page description, query parameters for the request, position range).
+
+        Returns:
+            list: List of row tuples ordered like table_columns, or an empty list if the page could not be fetched.
+        """
+        start_time = time.perf_counter()
+        rows = self._fetch_batch(page[1])
+        self.stats.add(pages_fetched=1, fetch_seconds=time.perf_counter() - start_time)
+        return rows
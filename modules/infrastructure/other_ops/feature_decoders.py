@@ -0,0 +1,725 @@
+"""
+feature_decoders.py
+
+Decodes ArcGIS feature query responses into row tuples for the database writers.
+
+Responses in the Protocol Buffer feature collection format (f=pbf) are decoded by reading the protobuf wire
+format directly, following Esri's FeatureCollection.proto (esriPBuffer.FeatureCollectionPBuffer), so no
+generated code or protobuf runtime is needed. Geometries are dequantized and written straight to hex-encoded
+EWKB, and attributes are bound to the table columns by field name, without building intermediate GeoJSON dicts.
+
+GeoJSON responses are parsed incrementally by GeoJSONFeatureStream, which reads the response in chunks and
+yields one feature at a time, so only a few features are held as Python objects at once.
+
+decode_page decodes a complete response in one call and only takes and returns picklable values, so collectors
+can run it in a process pool and decode pages on every core instead of contending for the GIL.
+"""
+
+import codecs
+import json
+import struct
+from itertools import accumulate
+
+from modules.data_management.sql_utils.sql_ops import geojson_features_to_rows, encode_copy_lines
+
+# Field numbers of the messages in FeatureCollection.proto that the decoder reads
+_COLLECTION_QUERY_RESULT = 2
+_QUERY_RESULT_FEATURE_RESULT = 1
+_FEATURE_RESULT_GEOMETRY_TYPE = 7
+_FEATURE_RESULT_HAS_Z = 10
+_FEATURE_RESULT_HAS_M = 11
+_FEATURE_RESULT_TRANSFORM = 12
+_FEATURE_RESULT_FIELDS = 13
+_FEATURE_RESULT_FEATURES = 15
+_FIELD_NAME = 1
+_FEATURE_ATTRIBUTES = 1
+_FEATURE_GEOMETRY = 2
+_GEOMETRY_LENGTHS = 2
+_GEOMETRY_COORDS = 3
+_TRANSFORM_ORIGIN = 1
+_TRANSFORM_SCALE = 2
+_TRANSFORM_TRANSLATE = 3
+
+# esriGeometryType values
+_GEOMETRY_POINT = 0
+_GEOMETRY_MULTIPOINT = 1
+_GEOMETRY_POLYLINE = 2
+_GEOMETRY_POLYGON = 3
+
+# Quantization origin: upper left means quantized y grows downwards
+_ORIGIN_UPPER_LEFT = 0
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+# EWKB geometry type codes and the flag marking an embedded SRID
+_WKB_POINT = 1
+_WKB_MULTIPOINT = 4
+_WKB_MULTILINESTRING = 5
+_WKB_MULTIPOLYGON = 6
+_WKB_SRID_FLAG = 0x20000000
+
+class GeoJSONFeatureStream:
+    """
+    Iterates over the features of a GeoJSON response read from an iterable of byte chunks.
+
+    Top-level members are decoded one value at a time, and the members of the 'features' array are yielded
+    as soon as each one has been read, so memory use is bounded by the size of a feature rather than the page.
+    An ArcGIS error body ({"error": {...}}) yields no features and sets the error attribute.
+
+    Attributes:
+        error (dict): The 'error' member of the response, or None if the server returned no error.
+        members (dict): Other top-level members of the response, such as 'type' and 'properties'.
+        bytes_read (int): Number of response bytes read so far.
+    """
+    def __init__(self, chunks):
+        """
+        Initializes the GeoJSONFeatureStream.
+
+        Args:
+            chunks (iterable): Byte chunks of the response body, such as requests' Response.iter_content().
+        """
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._exhausted = False
+        self.error = None
+        self.members = {}
+        self.bytes_read = 0
+
+    def __iter__(self):
+        """
+        Parses the response, yielding each feature as it is read.
+
+        Yields:
+            dict: GeoJSON feature.
+
+        Raises:
+            ValueError: If the response is not a JSON object or is malformed or truncated.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._position += 1
+            return
+        while True:
+            key = self._decode_value()
+            if not isinstance(key, str):
+                raise ValueError("Expected an object key in JSON response")
+            self._expect(':')
+            if key == 'features':
+                yield from self._iter_array()
+            elif key == 'error':
+                self.error = self._decode_value() or {}
+            else:
+                self.members[key] = self._decode_value()
+            if self._next_delimiter('}'):
+                return
+
+    def _iter_array(self):
+        """
+        Yields the members of the array starting at the current position.
+
+        Yields:
+            Decoded array members.
+        """
+        self._expect('[')
+        if self._peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield self._decode_value()
+            if self._next_delimiter(']'):
+                return
+
+    def _decode_value(self):
+        """
+        Decodes the JSON value starting at the current position, reading more of the response until it is complete.
+
+        A value ending exactly at the end of the buffer is decoded again once more data is read, since a number
+        or literal split across chunks would otherwise be cut short.
+
+        Returns:
+            Decoded value.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._position)
+                if end < len(self._buffer) or self._exhausted:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._exhausted:
+                    raise
+            # Grow the buffer geometrically so a feature spanning many chunks is not re-parsed once per chunk
+            self._read_more(len(self._buffer) - self._position)
+
+    def _peek(self):
+        """
+        Skips whitespace and returns the next character.
+
+        Returns:
+            str: Next non-whitespace character.
+
+        Raises:
+            ValueError: If the response ends first.
+        """
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in ' \t\n\r':
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if self._exhausted:
+                raise ValueError("Unexpected end of JSON response")
+            self._read_more(1)
+
+    def _expect(self, character):
+        """
+        Consumes the next character, which must be the given one.
+
+        Args:
+            character (str): Expected character.
+
+        Raises:
+            ValueError: If a different character is found.
+        """
+        if self._peek() != character:
+            raise ValueError(f"Expected '{character}' at position {self._position} of JSON response")
+        self._position += 1
+
+    def _next_delimiter(self, closing):
+        """
+        Consumes the comma or closing bracket after an object member or array element.
+
+        Args:
+            closing (str): Closing bracket of the enclosing object or array.
+
+        Returns:
+            bool: True if the closing bracket was consumed, False for a comma.
+
+        Raises:
+            ValueError: If neither is found.
+        """
+        character = self._peek()
+        if character not in (',', closing):
+            raise ValueError(f"Expected ',' or '{closing}' at position {self._position} of JSON response")
+        self._position += 1
+        return character == closing
+
+    def _read_more(self, min_characters):
+        """
+        Appends chunks to the buffer until at least min_characters have been added or the response ends.
+        The part of the buffer already parsed is dropped first.
+
+        Args:
+            min_characters (int): Minimum number of characters to add.
+        """
+        added = []
+        added_characters = 0
+        while added_characters < max(min_characters, 1) and not self._exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                text = self._text_decoder.decode(b'', final=True)
+                self._exhausted = True
+            else:
+                self.bytes_read += len(chunk)
+                text = self._text_decoder.decode(chunk)
+            added.append(text)
+            added_characters += len(text)
+        self._buffer = self._buffer[self._position:] + ''.join(added)
+        self._position = 0
+
+def geojson_stream_to_rows(stream, columns, srid=4326, group_size=100):
+    """
+    Converts the features of a GeoJSONFeatureStream into row tuples ordered like the given columns.
+
+    Features are converted in groups as they are read, so geometry conversion stays vectorized while only one
+    group of feature dicts is held at a time.
+
+    Args:
+        stream (GeoJSONFeatureStream): Stream of the response's features.
+        columns (list): Ordered list of column names to build the rows for.
+        srid (int): Spatial reference ID to embed in the geometry. Must match the table's geometry column.
+        group_size (int): Number of features converted at a time.
+
+    Returns:
+        list: List of row tuples.
+
+    Raises:
+        ValueError: If the response is malformed.
+    """
+    rows = []
+    group = []
+    for feature in stream:
+        group.append(feature)
+        if len(group) >= group_size:
+            rows.extend(geojson_features_to_rows(group, columns, srid))
+            group = []
+    if group:
+        rows.extend(geojson_features_to_rows(group, columns, srid))
+    return rows
+
+def pbf_features_to_rows(content, columns, srid=4326):
+    """
+    Converts a feature query response in PBF format into row tuples ordered like the given columns.
+
+    Polygons are written as MultiPolygons and polylines as MultiLineStrings, grouping each exterior ring with the
+    holes that follow it. Esri writes exterior rings clockwise and holes counter-clockwise. Z and M values are dropped.
+
+    Args:
+        content (bytes): Response body.
+        columns (list): Ordered list of column names to build the rows for.
+        srid (int): Spatial reference ID to embed in the geometry. Must match the table's geometry column.
+
+    Returns:
+        list: List of row tuples. Geometry values are hex-encoded EWKB.
+
+    Raises:
+        ValueError: If the response is not a PBF feature collection.
+    """
+    feature_result = _find_feature_result(content)
+    if feature_result is None:
+        raise ValueError("Response does not contain a PBF feature result")
+    start, end = feature_result
+
+    geometry_type = _GEOMETRY_POINT
+    has_z = has_m = False
+    transform = None
+    field_names = []
+    features = []
+    for field_number, wire_type, value in _iter_fields(content, start, end):
+        if field_number == _FEATURE_RESULT_FIELDS:
+            field_names.append(_read_field_name(content, *value))
+        elif field_number == _FEATURE_RESULT_FEATURES:
+            features.append(value)
+        elif field_number == _FEATURE_RESULT_GEOMETRY_TYPE:
+            geometry_type = value
+        elif field_number == _FEATURE_RESULT_HAS_Z:
+            has_z = bool(value)
+        elif field_number == _FEATURE_RESULT_HAS_M:
+            has_m = bool(value)
+        elif field_number == _FEATURE_RESULT_TRANSFORM:
+            transform = _read_transform(content, *value)
+
+    field_indexes = {name: index for index, name in enumerate(field_names)}
+    column_indexes = [None if column == 'geometry' else field_indexes.get(column) for column in columns]
+    stride = 2 + has_z + has_m
+    rows = []
+    for feature_start, feature_end in features:
+        attributes = []
+        geometry = None
+        for field_number, wire_type, value in _iter_fields(content, feature_start, feature_end):
+            if field_number == _FEATURE_ATTRIBUTES:
+                attributes.append(_read_value(content, *value))
+            elif field_number == _FEATURE_GEOMETRY:
+                geometry = _geometry_to_ewkb(content, value, geometry_type, stride, transform, srid)
+        rows.append(tuple(
+            geometry if column == 'geometry' else (attributes[index] if index is not None and index < len(attributes) else None)
+            for column, index in zip(columns, column_indexes)
+        ))
+    return rows
+
+def decode_page(content, columns, srid=4326, response_format='geojson', copy_lines=False):
+    """
+    Decodes a complete page response into rows. Runs in a decoding process, or inline.
+
+    PBF responses are decoded with pbf_features_to_rows. JSON responses, which include errors returned for PBF
+    requests, are parsed in one pass and their geometries converted to EWKB a geometry type at a time. With
+    copy_lines, the rows are returned already encoded as COPY text lines, so the process that receives them only
+    has to pass them on to the database.
+
+    Args:
+        content (bytes): Response body.
+        columns (list): Ordered list of column names to build the rows for.
+        srid (int): Spatial reference ID to embed in the geometry. Must match the table's geometry column.
+        response_format (str): Format the page was requested in: 'geojson' or 'pbf'.
+        copy_lines (bool): Whether to encode the rows with encode_copy_lines.
+
+    Returns:
+        tuple: (list of row tuples or COPY lines, ArcGIS error dict if the server returned an error, otherwise None,
+            number of response bytes).
+
+    Raises:
+        ValueError: If the response cannot be decoded.
+    """
+    if not content:
+        return [], None, 0
+    if response_format == 'pbf' and content.lstrip()[:1] != b'{':
+        rows = pbf_features_to_rows(content, columns, srid)
+    else:
+        document = json.loads(content)
+        if not isinstance(document, dict):
+            raise ValueError("Expected a JSON object in response")
+        if 'error' in document:
+            return [], document['error'] or {}, len(content)
+        rows = geojson_features_to_rows(document.get('features') or [], columns, srid)
+    if copy_lines:
+        rows = encode_copy_lines(rows)
+    return rows, None, len(content)
+
+def _find_feature_result(content):
+    """
+    Locates the FeatureResult message inside a FeatureCollectionPBuffer.
+
+    Args:
+        content (bytes): Response body.
+
+    Returns:
+        tuple: (start, end) of the FeatureResult message, or None if the response has none.
+    """
+    for field_number, wire_type, value in _iter_fields(content, 0, len(content)):
+        if field_number == _COLLECTION_QUERY_RESULT and wire_type == _LENGTH_DELIMITED:
+            for inner_number, inner_type, inner_value in _iter_fields(content, *value):
+                if inner_number == _QUERY_RESULT_FEATURE_RESULT and inner_type == _LENGTH_DELIMITED:
+                    return inner_value
+    return None
+
+def _read_varint(content, position):
+    """
+    Reads a base-128 varint.
+
+    Args:
+        content (bytes): Buffer to read from.
+        position (int): Position of the varint's first byte.
+
+    Returns:
+        tuple: (value, position after the varint).
+
+    Raises:
+        ValueError: If the buffer ends inside the varint.
+    """
+    result = 0
+    shift = 0
+    try:
+        while True:
+            byte = content[position]
+            position += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result, position
+            shift += 7
+    except IndexError:
+        raise ValueError("Truncated varint in PBF response") from None
+
+def _iter_fields(content, start, end):
+    """
+    Iterates over the fields of a protobuf message.
+
+    Args:
+        content (bytes): Buffer holding the message.
+        start (int): Position of the message's first byte.
+        end (int): Position after the message's last byte.
+
+    Yields:
+        tuple: (field number, wire type, value). Varints are ints, length-delimited fields are (start, end)
+            positions and fixed-width fields are their raw bytes.
+
+    Raises:
+        ValueError: If the message is malformed.
+    """
+    position = start
+    while position < end:
+        key, position = _read_varint(content, position)
+        field_number, wire_type = key >> 3, key & 0x07
+        if wire_type == _VARINT:
+            value, position = _read_varint(content, position)
+        elif wire_type == _LENGTH_DELIMITED:
+            length, position = _read_varint(content, position)
+            value = (position, position + length)
+            position += length
+        elif wire_type == _FIXED64:
+            value = content[position:position + 8]
+            position += 8
+        elif wire_type == _FIXED32:
+            value = content[position:position + 4]
+            position += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type} in PBF response")
+        if position > end:
+            raise ValueError("Truncated field in PBF response")
+        yield field_number, wire_type, value
+
+def _zigzag(value):
+    """
+    Decodes a zigzag-encoded signed integer.
+
+    Args:
+        value (int): Zigzag-encoded value.
+
+    Returns:
+        int: Signed value.
+    """
+    return (value >> 1) ^ -(value & 1)
+
+def _read_field_name(content, start, end):
+    """
+    Reads the name of a Field message.
+
+    Args:
+        content (bytes): Response body.
+        start (int): Position of the message's first byte.
+        end (int): Position after the message's last byte.
+
+    Returns:
+        str: Field name.
+    """
+    for field_number, wire_type, value in _iter_fields(content, start, end):
+        if field_number == _FIELD_NAME:
+            return content[value[0]:value[1]].decode('utf-8')
+    return ''
+
+def _read_value(content, start, end):
+    """
+    Reads an attribute Value message.
+
+    Args:
+        content (bytes): Response body.
+        start (int): Position of the message's first byte.
+        end (int): Position after the message's last byte.
+
+    Returns:
+        The attribute value, or None for a null value.
+    """
+    for field_number, wire_type, value in _iter_fields(content, start, end):
+        if field_number == 1:
+            return content[value[0]:value[1]].decode('utf-8')
+        if field_number == 2:
+            return struct.unpack('<f', value)[0]
+        if field_number == 3:
+            return struct.unpack('<d', value)[0]
+        if field_number in (4, 8):
+            return _zigzag(value)
+        if field_number in (5, 7):
+            return value
+        if field_number == 6:
+            return value - (1 << 64) if value >= 1 << 63 else value
+        if field_number == 9:
+            return bool(value)
+    return None
+
+def _read_transform(content, start, end):
+    """
+    Reads the quantization Transform message.
+
+    Args:
+        content (bytes): Response body.
+        start (int): Position of the message's first byte.
+        end (int): Position after the message's last byte.
+
+    Returns:
+        tuple: (x scale, y scale, x translate, y translate, whether quantized y grows downwards).
+    """
+    upper_left = True
+    scale = (1.0, 1.0)
+    translate = (0.0, 0.0)
+    for field_number, wire_type, value in _iter_fields(content, start, end):
+        if field_number == _TRANSFORM_ORIGIN:
+            upper_left = value == _ORIGIN_UPPER_LEFT
+        elif field_number in (_TRANSFORM_SCALE, _TRANSFORM_TRANSLATE):
+            pair = [0.0, 0.0]
+            for axis, axis_type, axis_value in _iter_fields(content, *value):
+                if axis in (1, 2) and axis_type == _FIXED64:
+                    pair[axis - 1] = struct.unpack('<d', axis_value)[0]
+            if field_number == _TRANSFORM_SCALE:
+                scale = tuple(pair)
+            else:
+                translate = tuple(pair)
+    return scale[0], scale[1], translate[0], translate[1], upper_left
+
+def _read_geometry(content, start, end):
+    """
+    Reads the part lengths and quantized coordinates of a Geometry message.
+
+    Args:
+        content (bytes): Response body.
+        start (int): Position of the message's first byte.
+        end (int): Position after the message's last byte.
+
+    Returns:
+        tuple: (list of part lengths in vertices, list of zigzag-decoded coordinate deltas).
+    """
+    lengths = []
+    coords = []
+    for field_number, wire_type, value in _iter_fields(content, start, end):
+        if field_number == _GEOMETRY_LENGTHS:
+            if wire_type == _LENGTH_DELIMITED:
+                lengths.extend(_read_packed_varints(content, *value))
+            else:
+                lengths.append(value)
+        elif field_number == _GEOMETRY_COORDS:
+            if wire_type == _LENGTH_DELIMITED:
+                coords.extend([(coordinate >> 1) ^ -(coordinate & 1) for coordinate in _read_packed_varints(content, *value)])
+            else:
+                coords.append(_zigzag(value))
+    return lengths, coords
+
+def _read_packed_varints(content, start, end):
+    """
+    Reads a packed repeated varint field. The varint loop is inlined, since coordinates make up most of a response.
+
+    Args:
+        content (bytes): Response body.
+        start (int): Position of the packed field's first byte.
+        end (int): Position after the packed field's last byte.
+
+    Returns:
+        list: Decoded varints.
+
+    Raises:
+        ValueError: If the field ends inside a varint.
+    """
+    values = []
+    append = values.append
+    position = start
+    try:
+        while position < end:
+            byte = content[position]
+            position += 1
+            if byte < 0x80:
+                append(byte)
+                continue
+            value = byte & 0x7f
+            shift = 7
+            while True:
+                byte = content[position]
+                position += 1
+                value |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            append(value)
+    except IndexError:
+        raise ValueError("Truncated packed field in PBF response") from None
+    if position != end:
+        raise ValueError("Truncated packed field in PBF response")
+    return values
+
+def _dequantize_parts(lengths, coords, stride, transform):
+    """
+    Converts delta-encoded quantized coordinates into parts of real-world x/y coordinates.
+
+    Each part starts from zero, and every vertex is stored as its difference from the previous one.
+
+    Args:
+        lengths (list): Number of vertices in each part. An empty list means a single part with all vertices.
+        coords (list): Coordinate deltas, stride values per vertex.
+        stride (int): Number of values per vertex (2 plus one each for Z and M).
+        transform (tuple): Quantization transform from _read_transform, or None for unquantized coordinates.
+
+    Returns:
+        list: List of parts, each a flat list [x1, y1, x2, y2, ...].
+    """
+    x_scale, y_scale, x_translate, y_translate, upper_left = transform or (1.0, 1.0, 0.0, 0.0, False)
+    if upper_left:
+        y_scale = -y_scale
+    parts = []
+    position = 0
+    for length in lengths or [len(coords) // stride]:
+        end = position + length * stride
+        part = [0.0] * (2 * length)
+        part[0::2] = [x_translate + x * x_scale for x in accumulate(coords[position:end:stride])]
+        part[1::2] = [y_translate + y * y_scale for y in accumulate(coords[position + 1:end:stride])]
+        parts.append(part)
+        position = end
+    return parts
+
+def _is_clockwise(ring):
+    """
+    Checks the orientation of a ring with the shoelace formula.
+
+    Args:
+        ring (list): Flat list of ring coordinates [x1, y1, x2, y2, ...].
+
+    Returns:
+        bool: True if the ring is clockwise.
+    """
+    area = 0.0
+    for i in range(0, len(ring) - 2, 2):
+        area += ring[i] * ring[i + 3] - ring[i + 2] * ring[i + 1]
+    return area < 0
+
+def _ewkb_header(wkb_type, srid):
+    """
+    Builds a little-endian EWKB header with an embedded SRID.
+
+    Args:
+        wkb_type (int): WKB geometry type code.
+        srid (int): Spatial reference ID.
+
+    Returns:
+        bytes: EWKB header.
+    """
+    return struct.pack('<BII', 1, wkb_type | _WKB_SRID_FLAG, srid)
+
+def _wkb_points(part):
+    """
+    Encodes a coordinate sequence as a WKB point count followed by the points.
+
+    Args:
+        part (list): Flat list of coordinates [x1, y1, x2, y2, ...].
+
+    Returns:
+        bytes: Encoded point sequence.
+    """
+    return struct.pack(f'<I{len(part)}d', len(part) // 2, *part)
+
+def _geometry_to_ewkb(content, geometry, geometry_type, stride, transform, srid):
+    """
+    Converts a Geometry message into hex-encoded EWKB.
+
+    Args:
+        content (bytes): Response body.
+        geometry (tuple): (start, end) of the Geometry message.
+        geometry_type (int): esriGeometryType of the feature result.
+        stride (int): Number of values per vertex.
+        transform (tuple): Quantization transform, or None.
+        srid (int): Spatial reference ID to embed.
+
+    Returns:
+        str: Hex-encoded EWKB, or None for an empty geometry.
+
+    Raises:
+        ValueError: If the geometry type is not supported.
+    """
+    lengths, coords = _read_geometry(content, *geometry)
+    if not coords:
+        return None
+    parts = _dequantize_parts(lengths, coords, stride, transform)
+
+    if geometry_type == _GEOMETRY_POINT:
+        return (_ewkb_header(_WKB_POINT, srid) + struct.pack('<2d', *parts[0][:2])).hex()
+
+    if geometry_type == _GEOMETRY_MULTIPOINT:
+        points = [part[i:i + 2] for part in parts for i in range(0, len(part), 2)]
+        body = b''.join(struct.pack('<BI2d', 1, _WKB_POINT, *point) for point in points)
+        return (_ewkb_header(_WKB_MULTIPOINT, srid) + struct.pack('<I', len(points)) + body).hex()
+
+    if geometry_type == _GEOMETRY_POLYLINE:
+        body = b''.join(struct.pack('<BI', 1, 2) + _wkb_points(part) for part in parts)
+        return (_ewkb_header(_WKB_MULTILINESTRING, srid) + struct.pack('<I', len(parts)) + body).hex()
+
+    if geometry_type == _GEOMETRY_POLYGON:
+        polygons = []
+        for ring in parts:
+            if len(ring) < 8:
+                continue
+            if ring[:2] != ring[-2:]:
+                ring = ring + ring[:2]
+            if _is_clockwise(ring) or not polygons:
+                polygons.append([ring])
+            else:
+                polygons[-1].append(ring)
+        if not polygons:
+            return None
+        body = b''.join(
+            struct.pack('<BII', 1, 3, len(rings)) + b''.join(_wkb_points(ring) for ring in rings)
+            for rings in polygons
+        )
+        return (_ewkb_header(_WKB_MULTIPOLYGON, srid) + struct.pack('<I', len(polygons)) + body).hex()
+
+    raise ValueError(f"Unsupported geometry type {geometry_type} in PBF response")
@@ -0,0 +1,283 @@
+"""
+request_limits.py
+
+Contains the RequestLimiter class, which caps the HTTP requests made by every collector in the process: the number
+in flight, in total and per host, and the rate at which each host is sent requests. Collectors share the limiter
+configured with configure_request_limits(), so several sources served by the same host cannot overload it together.
+
+Also contains the retry delay used between failed requests: exponential backoff with full jitter that defers to
+a server's Retry-After header.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+class RequestLimiter:
+    """
+    Caps the number of requests in flight in total and to each host, and the rate of requests to each host.
+
+    A request holds one slot of its host and one slot of the total from before it is sent until its response
+    has been read. Host slots are taken first, so requests waiting on a busy host do not hold slots that requests
+    to other hosts could use. The rate limit is a token bucket per host that allows bursts of up to one second's
+    worth of requests. Each limit is optional.
+
+    Attributes:
+        max_requests_total (int): Maximum number of requests in flight across all hosts, or None for no limit.
+        max_requests_per_host (int): Maximum number of requests in flight to a single host, or None for no limit.
+        requests_per_second_per_host (float): Maximum sustained request rate to a single host, or None for no limit.
+    """
+    def __init__(self, max_requests_total=None, max_requests_per_host=None, requests_per_second_per_host=None):
+        """
+        Initializes the RequestLimiter.
+
+        Args:
+            max_requests_total (int, optional): Maximum number of requests in flight across all hosts.
+            max_requests_per_host (int, optional): Maximum number of requests in flight to a single host.
+            requests_per_second_per_host (float, optional): Maximum sustained request rate to a single host.
+        """
+        self.max_requests_total = max(1, int(max_requests_total)) if max_requests_total else None
+        self.max_requests_per_host = max(1, int(max_requests_per_host)) if max_requests_per_host else None
+        self.requests_per_second_per_host = float(requests_per_second_per_host) if requests_per_second_per_host else None
+        self._total = threading.BoundedSemaphore(self.max_requests_total) if self.max_requests_total else None
+        self._hosts = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url, blocking=True):
+        """
+        Takes a slot for a request to the given URL, waiting for the host's request rate if needed.
+
+        Args:
+            url (str): URL of the request.
+            blocking (bool): Whether to wait for a free slot and the host's rate limit.
+
+        Returns:
+            bool: True if a slot was taken. Always True when blocking.
+        """
+        host = self._host(url)
+        if blocking:
+            self._wait_for_rate(host)
+        host_slots = self._host_slots(host)
+        if host_slots and not host_slots.acquire(blocking):
+            return False
+        if self._total and not self._total.acquire(blocking):
+            if host_slots:
+                host_slots.release()
+            return False
+        if not blocking and not self._take_rate_token(host):
+            self._release_slots(host)
+            return False
+        return True
+
+    def release(self, url):
+        """
+        Frees the slot taken for a request to the given URL.
+
+        Args:
+            url (str): URL of the request.
+        """
+        self._release_slots(self._host(url))
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Holds a slot for a request to the given URL for the duration of a with block.
+
+        Args:
+            url (str): URL of the request.
+        """
+        self.acquire(url)
+        try:
+            yield
+        finally:
+            self.release(url)
+
+    def _release_slots(self, host):
+        """
+        Frees a host slot and a total slot.
+
+        Args:
+            host (str): Host of the request.
+        """
+        if self._total:
+            self._total.release()
+        host_slots = self._host_slots(host)
+        if host_slots:
+            host_slots.release()
+
+    def _wait_for_rate(self, host):
+        """
+        Reserves the host's next request token, sleeping until it is available.
+
+        Args:
+            host (str): Host of the request.
+        """
+        if not self.requests_per_second_per_host:
+            return
+        with self._lock:
+            tokens = self._refill(host) - 1
+            self._buckets[host] = (tokens, time.monotonic())
+        if tokens < 0:
+            time.sleep(-tokens / self.requests_per_second_per_host)
+
+    def _take_rate_token(self, host):
+        """
+        Takes the host's next request token if one is available now.
+
+        Args:
+            host (str): Host of the request.
+
+        Returns:
+            bool: True if a token was taken or the rate is not limited.
+        """
+        if not self.requests_per_second_per_host:
+            return True
+        with self._lock:
+            tokens = self._refill(host)
+            if tokens < 1:
+                return False
+            self._buckets[host] = (tokens - 1, time.monotonic())
+            return True
+
+    def _refill(self, host):
+        """
+        Computes the tokens in a host's bucket now. Called with the lock held.
+
+        Args:
+            host (str): Host of the request.
+
+        Returns:
+            float: Number of tokens, negative while earlier requests are still waiting for theirs.
+        """
+        burst = max(1.0, self.requests_per_second_per_host)
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(host, (burst, now))
+        return min(burst, tokens + (now - updated) * self.requests_per_second_per_host)
+
+    def _host_slots(self, host):
+        """
+        Gets the semaphore of a host, creating it on first use.
+
+        Args:
+            host (str): Host of the request.
+
+        Returns:
+            threading.BoundedSemaphore: Semaphore of the host, or None if requests per host are not limited.
+        """
+        if not self.max_requests_per_host:
+            return None
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.max_requests_per_host)
+            return self._hosts[host]
+
+    @staticmethod
+    def _host(url):
+        """
+        Extracts the host of a URL.
+
+        Args:
+            url (str): URL of the request.
+
+        Returns:
+            str: Lower-cased host and port.
+        """
+        return urlparse(url).netloc.lower()
+
+_request_limiter = None
+
+def configure_request_limits(max_requests_total=None, max_requests_per_host=None, requests_per_second_per_host=None):
+    """
+    Sets the limiter shared by all collectors. Passing no limits removes it.
+
+    Args:
+        max_requests_total (int, optional): Maximum number of requests in flight across all hosts.
+        max_requests_per_host (int, optional): Maximum number of requests in flight to a single host.
+        requests_per_second_per_host (float, optional): Maximum sustained request rate to a single host.
+
+    Returns:
+        RequestLimiter: The new limiter, or None if limits were removed.
+    """
+    global _request_limiter
+    if not (max_requests_total or max_requests_per_host or requests_per_second_per_host):
+        _request_limiter = None
+        return None
+    _request_limiter = RequestLimiter(max_requests_total, max_requests_per_host, requests_per_second_per_host)
+    logger.debug(
+        f"Request limits set to {_request_limiter.max_requests_total or 'unlimited'} in flight in total, "
+        f"{_request_limiter.max_requests_per_host or 'unlimited'} in flight per host and "
+        f"{_request_limiter.requests_per_second_per_host or 'unlimited'} requests per second per host"
+    )
+    return _request_limiter
+
+def get_request_limiter():
+    """
+    Gets the limiter shared by all collectors.
+
+    Returns:
+        RequestLimiter: The shared limiter, or None if requests are not limited.
+    """
+    return _request_limiter
+
+@contextmanager
+def request_slot(url):
+    """
+    Holds a slot of the shared limiter for a request to the given URL, if limits are configured.
+
+    Args:
+        url (str): URL of the request.
+    """
+    limiter = _request_limiter
+    if limiter is None:
+        yield
+        return
+    with limiter.slot(url):
+        yield
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header, given either as a number of seconds or as an HTTP date.
+
+    Args:
+        value (str): Header value.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None, backoff_base=2.0, backoff_max=60.0):
+    """
+    Computes how long to wait before retrying a failed request.
+
+    Without a Retry-After value the delay is drawn uniformly between zero and an exponentially growing ceiling
+    (full jitter), so requests that failed together do not retry together.
+
+    Args:
+        attempt (int): Zero-based number of the attempt that failed.
+        retry_after (float, optional): Seconds the server asked to wait, from its Retry-After header.
+        backoff_base (float): Ceiling of the delay after the first failed attempt, in seconds. Doubles with each attempt.
+        backoff_max (float): Largest delay, in seconds.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    if retry_after is not None:
+        return min(retry_after, backoff_max)
+    return random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt))
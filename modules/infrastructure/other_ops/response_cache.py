@@ -0,0 +1,313 @@
+"""
+response_cache.py
+
+Contains the ResponseCache class, an on-disk cache of raw HTTP response bodies. Entries are keyed by URL and
+normalized query parameters, stored gzip-compressed, expire after a time-to-live and are evicted least recently
+used first once the cache grows past its size limit. Entries can be written and read in chunks, so a streamed
+response never has to be held in memory whole.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Stores raw response bodies on disk so a collection can be rebuilt without re-downloading its pages.
+
+    Each entry is one gzip file named after the hash of its key. A file's modification time records when the
+    entry was written and its access time when it was last used. Entries written more than ttl_seconds ago are
+    treated as misses, and eviction removes the least recently used files first. Files are written to a temporary
+    name and renamed into place, so concurrent readers never see a partial entry.
+
+    Attributes:
+        cache_folder (str): Folder holding the cache files.
+        ttl_seconds (float): Age in seconds after which an entry is ignored. None keeps entries until evicted.
+        max_size_bytes (int): Total compressed size the cache is trimmed back to after a write.
+        ignored_params (tuple): Query parameters left out of the cache key.
+    """
+    def __init__(self, cache_folder, ttl_seconds=None, max_size_bytes=1024 ** 3, ignored_params=('token',)):
+        """
+        Initializes the ResponseCache and creates its folder if needed.
+
+        Args:
+            cache_folder (str): Folder holding the cache files.
+            ttl_seconds (float, optional): Age in seconds after which an entry is ignored. None keeps entries until evicted.
+            max_size_bytes (int): Total compressed size the cache is trimmed back to after a write.
+            ignored_params (tuple): Query parameters left out of the cache key, such as short-lived tokens.
+        """
+        self.cache_folder = cache_folder
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.ignored_params = tuple(ignored_params)
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_folder, exist_ok=True)
+        self._size_bytes = sum(size for _, _, size in self._entries())
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, url, params):
+        """
+        Builds the cache key for a request.
+
+        Parameter names are sorted and values compared as strings, so equivalent requests share an entry
+        regardless of parameter order or whether a value was given as a number or a string.
+
+        Args:
+            url (str): Request URL.
+            params (dict): Query parameters of the request.
+
+        Returns:
+            str: Hex digest identifying the request.
+        """
+        normalized = sorted((str(name), str(value)) for name, value in params.items() if name not in self.ignored_params)
+        return hashlib.sha256(json.dumps([url.rstrip('/'), normalized]).encode('utf-8')).hexdigest()
+
+    def get(self, url, params):
+        """
+        Reads a cached response body.
+
+        Args:
+            url (str): Request URL.
+            params (dict): Query parameters of the request.
+
+        Returns:
+            bytes: Response body, or None if there is no fresh entry.
+        """
+        file = self.open(url, params)
+        if file is None:
+            return None
+        try:
+            with file:
+                return file.read()
+        except (OSError, EOFError) as e:
+            logger.warning(f"Discarding unreadable cache entry {file.name}: {e}")
+            self.discard(file.name)
+            return None
+
+    def open(self, url, params):
+        """
+        Opens a cached response body so it can be read in chunks.
+
+        A corrupt entry may only be detected while it is read, in which case the reader raises OSError or EOFError
+        and should call discard() with the file's name.
+
+        Args:
+            url (str): Request URL.
+            params (dict): Query parameters of the request.
+
+        Returns:
+            file: Binary file object decompressing the response body, or None if there is no fresh entry.
+                The caller closes it.
+        """
+        path = self._path(self.key(url, params))
+        try:
+            written_time = os.stat(path).st_mtime
+            if self.ttl_seconds is not None and time.time() - written_time > self.ttl_seconds:
+                self.misses += 1
+                return None
+            file = gzip.open(path, 'rb')
+            os.utime(path, (time.time(), written_time))
+            self.hits += 1
+            return file
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except OSError as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+    def discard(self, path):
+        """
+        Deletes an entry that turned out to be unreadable.
+
+        Args:
+            path (str): Path of the cache file.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if self._remove(path):
+            with self._lock:
+                self._size_bytes -= size
+
+    def put(self, url, params, content):
+        """
+        Stores a response body and evicts the least recently used entries if the cache is over its size limit.
+
+        Args:
+            url (str): Request URL.
+            params (dict): Query parameters of the request.
+            content (bytes): Response body.
+        """
+        writer = self.writer(url, params)
+        writer.write(content)
+        writer.commit()
+
+    def writer(self, url, params):
+        """
+        Starts writing a response body that arrives in chunks.
+
+        Args:
+            url (str): Request URL.
+            params (dict): Query parameters of the request.
+
+        Returns:
+            ResponseCacheWriter: Writer that stores the entry once committed.
+        """
+        return ResponseCacheWriter(self, self._path(self.key(url, params)))
+
+    def _add_entry(self, temp_path, path):
+        """
+        Moves a fully written temporary file into place and evicts entries if the cache is over its size limit.
+
+        Args:
+            temp_path (str): Path of the temporary file.
+            path (str): Path of the cache file.
+        """
+        try:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+            with self._lock:
+                self._size_bytes += os.path.getsize(path) - previous_size
+                if self._size_bytes > self.max_size_bytes:
+                    self._evict()
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            self._remove(temp_path)
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits its size limit. Called with the lock held.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._size_bytes = sum(size for _, _, size in entries)
+        removed = 0
+        for path, _, size in entries:
+            if self._size_bytes <= self.max_size_bytes:
+                break
+            if self._remove(path):
+                self._size_bytes -= size
+                removed += 1
+        logger.debug(f"Evicted {removed} response cache entries from {self.cache_folder} ({self._size_bytes / 1024 ** 2:.1f} MB kept)")
+
+    def _entries(self):
+        """
+        Lists the cache files.
+
+        Returns:
+            list: (path, last used time, size in bytes) for each entry.
+        """
+        entries = []
+        with os.scandir(self.cache_folder) as scan:
+            for entry in scan:
+                if entry.is_file() and entry.name.endswith('.gz'):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_atime, stat.st_size))
+        return entries
+
+    def _path(self, key):
+        """
+        Builds the file path for a cache key.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            str: Path of the cache file.
+        """
+        return os.path.join(self.cache_folder, f"{key}.json.gz")
+
+    @staticmethod
+    def _remove(path):
+        """
+        Deletes a file, ignoring files that are already gone.
+
+        Args:
+            path (str): Path of the file.
+
+        Returns:
+            bool: True if the file was deleted.
+        """
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+class ResponseCacheWriter:
+    """
+    Writes one cache entry as its response body arrives. The entry only becomes visible once it is committed,
+    so a response that fails part way through never replaces a good entry.
+
+    Attributes:
+        path (str): Path of the cache file.
+    """
+    def __init__(self, cache, path):
+        """
+        Initializes the ResponseCacheWriter and opens its temporary file.
+
+        Args:
+            cache (ResponseCache): Cache the entry belongs to.
+            path (str): Path of the cache file.
+        """
+        self.path = path
+        self._cache = cache
+        self._temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            self._file = gzip.open(self._temp_path, 'wb', compresslevel=6)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            self._file = None
+
+    def write(self, chunk):
+        """
+        Appends a chunk of the response body. Write errors are logged and the entry is abandoned.
+
+        Args:
+            chunk (bytes): Chunk of the response body.
+        """
+        if self._file is None:
+            return
+        try:
+            self._file.write(chunk)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {self.path}: {e}")
+            self.discard()
+
+    def commit(self):
+        """
+        Finishes the entry and moves it into place.
+        """
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {self.path}: {e}")
+            self.discard()
+            return
+        self._file = None
+        self._cache._add_entry(self._temp_path, self.path)
+
+    def discard(self):
+        """
+        Abandons the entry and deletes its temporary file.
+        """
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+        ResponseCache._remove(self._temp_path)
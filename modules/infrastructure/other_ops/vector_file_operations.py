@@ -0,0 +1,143 @@
+"""
+vector_file_operations.py
+
+Contains the VectorFileReader class, which streams a layer of a local vector file (file geodatabase, GeoPackage,
+GeoParquet, shapefile or any other format GDAL reads) as Arrow record batches, and build_geometry_transform,
+which reprojects the geometries read from it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+import pyogrio
+import shapely
+from pyogrio.raw import open_arrow
+from pyproj import CRS, Transformer
+
+logger = logging.getLogger(__name__)
+
+class VectorFileReader:
+    """
+    Reads one layer of a vector file in chunks through GDAL's columnar Arrow stream.
+
+    Only the requested fields are read, and attribute and bounding box filters are applied by GDAL while reading,
+    so features that are filtered out are never converted. Geometries are returned as WKB.
+
+    Attributes:
+        file_path (str): Path of the file, or folder for a file geodatabase.
+        layer (str): Name or index of the layer, or None for the first layer.
+        where (str): SQL WHERE clause filtering the features, in the OGR SQL dialect.
+        bbox (tuple): (xmin, ymin, xmax, ymax) filtering the features, in the layer's coordinate system.
+        batch_size (int): Maximum number of features in each record batch.
+    """
+    def __init__(self, file_path, layer=None, where=None, bbox=None, batch_size=65536):
+        """
+        Initializes the VectorFileReader.
+
+        Args:
+            file_path (str): Path of the file, or folder for a file geodatabase.
+            layer (str or int, optional): Name or index of the layer. Defaults to the first layer.
+            where (str, optional): SQL WHERE clause filtering the features, in the OGR SQL dialect.
+            bbox (list, optional): (xmin, ymin, xmax, ymax) filtering the features, in the layer's coordinate system.
+            batch_size (int): Maximum number of features in each record batch.
+        """
+        self.file_path = file_path
+        self.layer = layer
+        self.where = where
+        self.bbox = tuple(bbox) if bbox else None
+        self.batch_size = batch_size
+
+    def info(self):
+        """
+        Reads the layer's metadata.
+
+        Returns:
+            dict: Layer metadata from pyogrio.read_info, including 'fields', 'crs', 'geometry_type' and 'features'.
+        """
+        return pyogrio.read_info(self.file_path, layer=self.layer)
+
+    def fingerprint(self):
+        """
+        Builds a fingerprint of the file from its modification time, the layer's feature count and the reader's
+        configuration.
+
+        For a folder, such as a file geodatabase, the latest modification time of the files in it is used.
+
+        Returns:
+            dict: Fingerprint with 'last_edit_date' in epoch milliseconds, 'feature_count' and 'config_hash'.
+        """
+        modified_time = os.path.getmtime(self.file_path)
+        if os.path.isdir(self.file_path):
+            for folder, _, file_names in os.walk(self.file_path):
+                for file_name in file_names:
+                    modified_time = max(modified_time, os.path.getmtime(os.path.join(folder, file_name)))
+        return {
+            'last_edit_date': int(modified_time * 1000),
+            'feature_count': int(self.info()['features']),
+            'config_hash': self.config_hash()
+        }
+
+    def config_hash(self):
+        """
+        Hashes the settings that decide which features are read: the file, the layer and the filters.
+
+        Returns:
+            str: SHA-256 hex digest of the settings.
+        """
+        config = {'file_path': os.path.abspath(self.file_path), 'layer': self.layer, 'where': self.where, 'bbox': self.bbox}
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def open(self, columns=None):
+        """
+        Opens the layer for reading as a stream of record batches.
+
+        Args:
+            columns (list, optional): Names of the fields to read. Defaults to every field.
+
+        Yields:
+            tuple: (metadata dict with 'crs', 'fields' and 'geometry_field', iterator of pyarrow.RecordBatch).
+        """
+        with open_arrow(
+            self.file_path,
+            layer=self.layer,
+            columns=columns,
+            where=self.where,
+            bbox=self.bbox,
+            batch_size=self.batch_size,
+            use_pyarrow=True
+        ) as (meta, reader):
+            meta = dict(meta)
+            meta['geometry_field'] = meta.get('geometry_name') or 'wkb_geometry'
+            logger.debug(f"Opened layer {self.layer or 0} of {self.file_path} (crs {meta.get('crs')}, batches of {self.batch_size})")
+            yield meta, reader
+
+def build_geometry_transform(source_crs, target_srid):
+    """
+    Builds a function that reprojects geometries from a layer's coordinate system to a column's SRID.
+
+    Args:
+        source_crs (str): Coordinate system of the layer, such as 'EPSG:4269', or None if unknown.
+        target_srid (int): SRID of the target column, or None if the column does not declare one.
+
+    Returns:
+        callable: Function taking and returning an array of shapely geometries, or None if no reprojection is needed.
+    """
+    if not source_crs or not target_srid:
+        if target_srid:
+            logger.warning(f"Layer has no coordinate system; geometries are assumed to be in SRID {target_srid}")
+        return None
+    source = CRS.from_user_input(source_crs)
+    target = CRS.from_epsg(target_srid)
+    if source == target:
+        return None
+    transformer = Transformer.from_crs(source, target, always_xy=True)
+    logger.debug(f"Reprojecting geometries from {source_crs} to EPSG:{target_srid}")
+
+    def transform(geometries):
+        return shapely.transform(geometries, transformer.transform, interleaved=False)
+
+    return transform
@@ -1,11 +1,12 @@
 import logging
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.engine import Engine
 
 from modules.infrastructure.program_support.logger_config import configure_logging, LOG_DIVISION
 from modules.infrastructure.program_support.settings_config import SettingsManager
 from modules.infrastructure.program_support.startup_config import Startup
 from modules.data_management.sql_utils.sql_ops import create_engine_with_extensions
+from modules.data_management.sql_utils.sql_session_profiles import configure_session_profiles, with_session_profile
 from modules.data_management.data_managers.data_source_manager import DataSourceManager
 from modules.data_management.data_managers.data_processing_manager import DataProcessingManager
 from modules.data_management.data_managers.intersection_tables_manager import IntersectionTablesManager
@@ -81,12 +82,14 @@ def run_startup_tasks(advanced_settings: Dict[str, Any]) -> None:
         logger.critical(f"Failed to run one or more critical startup tasks; ending program\n {e}")
         raise
 
-def connect_to_database(database_url: str) -> Engine:
+def connect_to_database(database_url: str, session_profiles: Optional[Dict[str, Any]] = None) -> Engine:
     """
     Create and return a database connection.
 
     Args:
         database_url: SQLAlchemy database URL.
+        session_profiles: Session settings of each stage's profile (bulk_load, prepare, intersect, publish),
+            applied with SET LOCAL to every transaction of the stage.
 
     Returns:
         SQLAlchemy Engine instance.
@@ -97,6 +100,7 @@ def connect_to_database(database_url: str) -> Engine:
     logger.info("Attempting to connect to database...\n|")
     try:
         db_engine = create_engine_with_extensions(database_url)
+        configure_session_profiles(db_engine, session_profiles)
         logger.info("Database connection successful")
         logger.info(LOG_DIVISION)
         return db_engine
@@ -108,7 +112,11 @@ def collect_primary_data(
     source_data_path: str,
     source_data_config: str,
     db_engine: Engine,
-    sources_to_collect: List[str]
+    sources_to_collect: List[str],
+    force_collect: Optional[List[str]] = None,
+    collection_settings: Optional[Dict[str, Any]] = None,
+    prepared_data_config: Optional[str] = None,
+    intersection_tables_config: Optional[str] = None
 ) -> DataSourceManager:
     """
     Collect primary data sources.
@@ -118,6 +126,10 @@ def collect_primary_data(
         source_data_config: Path to source data config YAML.
         db_engine: SQLAlchemy Engine.
         sources_to_collect: List of source names to collect.
+        force_collect: List of source names to collect even if their hosted layer is unchanged.
+        collection_settings: Collection settings (max_parallel_sources, max_requests_total, max_requests_per_host, requests_per_second_per_host).
+        prepared_data_config: Path to prepared data config YAML, used to find the sources hazards are prepared from.
+        intersection_tables_config: Path to intersection tables config YAML, used to derive each hazard source's screening tolerance.
 
     Returns:
         DataSourceManager instance.
@@ -130,9 +142,12 @@ def collect_primary_data(
         data_source_manager = DataSourceManager(
             data_sources_folder=source_data_path,
             source_data_config_path=source_data_config,
-            db_engine=db_engine
+            db_engine=with_session_profile(db_engine, 'bulk_load'),
+            collection_settings=collection_settings,
+            prepared_data_config_path=prepared_data_config,
+            intersection_config_path=intersection_tables_config
         )
-        data_source_manager.collect_data_sources(sources_to_collect)
+        data_source_manager.collect_data_sources(sources_to_collect, force_sources=force_collect)
         logger.info(f"Primary data collection complete")
         logger.info(LOG_DIVISION)
         return data_source_manager
@@ -143,7 +158,9 @@ def collect_primary_data(
 def prepare_data(
     prepared_data_config: str,
     db_engine: Engine,
-    data_to_prepare: List[str]
+    data_to_prepare: List[str],
+    preparation_settings: Optional[Dict[str, Any]] = None,
+    force_prepare: Optional[List[str]] = None
 ) -> DataProcessingManager:
     """
     Prepare primary data sources for further processing.
@@ -152,6 +169,8 @@ def prepare_data(
         prepared_data_config: Path to prepared data config YAML.
         db_engine: SQLAlchemy Engine.
         data_to_prepare: List of data names to prepare.
+        preparation_settings: Preparation settings (max_parallel_preparations).
+        force_prepare: List of data names to prepare even if their SQL and source tables are unchanged.
 
     Returns:
         DataProcessingManager instance.
@@ -163,9 +182,10 @@ def prepare_data(
     try:
         data_processing_manager = DataProcessingManager(
             prepared_data_config_path=prepared_data_config,
-            db_engine=db_engine
+            db_engine=with_session_profile(db_engine, 'prepare'),
+            preparation_settings=preparation_settings
         )
-        data_processing_manager.prepare_data(data_to_prepare)
+        data_processing_manager.prepare_data(data_to_prepare, force_names=force_prepare)
         logger.info(f"Data preparing complete")
         logger.info(LOG_DIVISION)
         return data_processing_manager
@@ -199,7 +219,7 @@ def intersect_data(
         intersection_tables_manager = IntersectionTablesManager(
             intersection_tables_config_path=intersection_tables_config_path,
             intersection_col_names=intersection_col_names,
-            db_engine=db_engine
+            db_engine=with_session_profile(db_engine, 'intersect')
         )
         tables_to_update = [
             table_name
@@ -244,7 +264,7 @@ def build_and_publish_tables(
     try:
         publishing_manager = PublishingManager(
             publishing_config_path=publishing_config_path,
-            db_engine=db_engine
+            db_engine=with_session_profile(db_engine, 'publish')
         )
         tables_to_rebuild = [
             table_name
@@ -0,0 +1,73 @@
+"""
+benchmark_collectors.py
+
+Benchmarks the threaded and asyncio feature layer collectors against a local MockFeatureServer.
+
+Usage:
+    python -m modules.testing.benchmark_collectors <database_url> [--features N] [--latency S] [--batch-size N]
+"""
+
+import argparse
+import logging
+import time
+
+from modules.data_management.sql_utils.sql_ops import create_engine_with_extensions, drop_and_rebuild_table
+from modules.infrastructure.other_ops.arcgis_operations import ArcGISFeatureLayerQuery
+from modules.infrastructure.other_ops.arcgis_async_operations import AsyncArcGISFeatureLayerQuery
+from modules.testing.mock_feature_server import MockFeatureServer
+
+BENCHMARK_TABLE = 'benchmark_collector_source'
+BENCHMARK_COLUMNS = {'OBJECTID': 'int8', 'value': 'float8', 'geometry': 'Geometry(MULTIPOLYGON, 4326)'}
+
+def run_benchmark(name, query, db_engine):
+    """
+    Runs one collector against a freshly rebuilt benchmark table and prints its throughput.
+
+    Args:
+        name (str): Name of the collector, used in the output.
+        query: Collector instance with a fetch_data method.
+        db_engine (Engine): SQLAlchemy engine connected to the database.
+    """
+    drop_and_rebuild_table(db_engine, BENCHMARK_TABLE, BENCHMARK_COLUMNS)
+    start_time = time.perf_counter()
+    success = query.fetch_data()
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<10} success={success} features={query.total_features} seconds={elapsed:.2f} features/s={query.total_features / elapsed:.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the feature layer collectors against a local mock FeatureServer.")
+    parser.add_argument('database_url', help="SQLAlchemy URL of a PostGIS database to load into")
+    parser.add_argument('--features', type=int, default=20000, help="Number of features served by the mock layer")
+    parser.add_argument('--latency', type=float, default=0.05, help="Delay in seconds added to every response")
+    parser.add_argument('--batch-size', type=int, default=250, help="Features per page")
+    parser.add_argument('--threads', type=int, default=10, help="Simultaneous requests for the threaded collector")
+    parser.add_argument('--concurrency', type=int, default=100, help="Concurrent requests for the asyncio collector")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db_engine = create_engine_with_extensions(args.database_url)
+    columns = [column for column in BENCHMARK_COLUMNS]
+    query_params = {'where': '1=1', 'outFields': 'OBJECTID, value', 'outSR': 4326, 'f': 'geojson'}
+
+    with MockFeatureServer(num_features=args.features, latency=args.latency) as server:
+        run_benchmark('threaded', ArcGISFeatureLayerQuery(
+            url=server.query_url,
+            query_params=query_params.copy(),
+            table_name=BENCHMARK_TABLE,
+            table_columns=columns,
+            db_engine=db_engine,
+            batch_size=args.batch_size,
+            max_simultaneous_requests=args.threads
+        ), db_engine)
+        run_benchmark('asyncio', AsyncArcGISFeatureLayerQuery(
+            url=server.query_url,
+            query_params=query_params.copy(),
+            table_name=BENCHMARK_TABLE,
+            table_columns=columns,
+            db_engine=db_engine,
+            batch_size=args.batch_size,
+            max_concurrent_requests=args.concurrency
+        ), db_engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+mock_feature_server.py
+
+Local stand-in for an ArcGIS FeatureServer layer. Serves synthetic polygon features from the query endpoint
+as GeoJSON or PBF with a configurable response delay, so the feature layer collectors can be exercised and
+benchmarked offline.
+"""
+
+import json
+import math
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class MockFeatureServer:
+    """
+    Serves a synthetic feature layer over HTTP on a background thread.
+
+    Feature i is a polygon centred on a 1 x 1 degree grid cell with OBJECTID i + 1, a numeric 'value' attribute
+    and a text 'zone' attribute, which is null for every 97th feature.
+
+    Attributes:
+        num_features (int): Number of features in the layer.
+        latency (float): Delay in seconds added to every query response.
+        vertices_per_polygon (int): Number of vertices in each polygon ring.
+        host (str): Host to bind to.
+        port (int): Port to bind to. 0 picks a free port.
+        last_edit_date (int): Last edit date reported in the layer metadata, in epoch milliseconds.
+    """
+    MAX_RECORD_COUNT = 2000
+
+    def __init__(self, num_features=10000, latency=0.05, vertices_per_polygon=64, host='127.0.0.1', port=0, last_edit_date=1700000000000):
+        """
+        Initializes the MockFeatureServer.
+
+        Args:
+            num_features (int): Number of features in the layer.
+            latency (float): Delay in seconds added to every query response.
+            vertices_per_polygon (int): Number of vertices in each polygon ring.
+            host (str): Host to bind to.
+            port (int): Port to bind to. 0 picks a free port.
+            last_edit_date (int): Last edit date reported in the layer metadata, in epoch milliseconds.
+        """
+        self.num_features = num_features
+        self.latency = latency
+        self.vertices_per_polygon = vertices_per_polygon
+        self.host = host
+        self.port = port
+        self.last_edit_date = last_edit_date
+        self._server = None
+        self._thread = None
+
+    @property
+    def query_url(self):
+        """
+        URL of the layer's query endpoint.
+
+        Returns:
+            str: Query URL.
+        """
+        return f"http://{self.host}:{self.port}/arcgis/rest/services/Mock/FeatureServer/0/query"
+
+    def start(self):
+        """
+        Starts serving requests on a background thread.
+
+        Returns:
+            MockFeatureServer: This instance.
+        """
+        layer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                self._respond(url.path, parse_qs(url.query))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self._respond(urlparse(self.path).path, parse_qs(self.rfile.read(length).decode('utf-8')))
+
+            def _respond(self, path, query):
+                params = {key: values[-1] for key, values in query.items()}
+                response = layer.handle_query(params) if path.endswith('/query') else layer.layer_metadata()
+                is_pbf = isinstance(response, bytes)
+                body = response if is_pbf else json.dumps(response).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-protobuf' if is_pbf else 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def layer_metadata(self):
+        """
+        Builds the layer metadata returned by the layer endpoint.
+
+        Returns:
+            dict: JSON response body.
+        """
+        return {
+            'name': 'Mock',
+            'type': 'Feature Layer',
+            'objectIdField': 'OBJECTID',
+            'maxRecordCount': self.MAX_RECORD_COUNT,
+            'advancedQueryCapabilities': {'supportsPagination': True},
+            'supportedQueryFormats': 'JSON, geoJSON, PBF',
+            'editingInfo': {'lastEditDate': self.last_edit_date, 'dataLastEditDate': self.last_edit_date}
+        }
+
+    def handle_query(self, params):
+        """
+        Builds the response to a query request.
+
+        Args:
+            params (dict): Query parameters of the request.
+
+        Returns:
+            dict: JSON response body, or bytes for a PBF feature query.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        indexes = self._matching_indexes(params)
+        if str(params.get('returnCountOnly', '')).lower() == 'true':
+            return {'type': 'FeatureCollection', 'features': [], 'properties': {'count': len(indexes)}}
+        if str(params.get('returnIdsOnly', '')).lower() == 'true':
+            return {'objectIdFieldName': 'OBJECTID', 'objectIds': [index + 1 for index in indexes]}
+        if str(params.get('returnExtentOnly', '')).lower() == 'true':
+            return {'extent': self._extent(indexes)}
+        if str(params.get('returnDistinctValues', '')).lower() == 'true':
+            return self._distinct_values(indexes, params)
+
+        offset = int(params.get('resultOffset', 0))
+        count = min(int(params.get('resultRecordCount', self.MAX_RECORD_COUNT)), self.MAX_RECORD_COUNT)
+        page = indexes[offset:offset + count]
+        if params.get('f') == 'pbf':
+            return self._pbf_feature_collection(page)
+        return {
+            'type': 'FeatureCollection',
+            'features': [self._feature(index) for index in page],
+            'properties': {'exceededTransferLimit': offset + count < len(indexes)}
+        }
+
+    def _matching_indexes(self, params):
+        """
+        Applies the objectIds parameter, an envelope geometry filter and 'OBJECTID BETWEEN a AND b', "zone = 'Z1'"
+        and 'zone IS NULL' conditions in the where clause, if present.
+
+        Args:
+            params (dict): Query parameters of the request.
+
+        Returns:
+            list: Zero-based indexes of the matching features.
+        """
+        indexes = range(self.num_features)
+        if params.get('objectIds'):
+            requested = {int(object_id) - 1 for object_id in params['objectIds'].split(',')}
+            indexes = [index for index in indexes if index in requested]
+        between = re.search(r'OBJECTID BETWEEN (\d+) AND (\d+)', params.get('where', ''), re.IGNORECASE)
+        if between:
+            low, high = int(between.group(1)) - 1, int(between.group(2)) - 1
+            indexes = [index for index in indexes if low <= index <= high]
+        zone = re.search(r"zone\s*=\s*'([^']*)'", params.get('where', ''), re.IGNORECASE)
+        if zone:
+            indexes = [index for index in indexes if self._zone(index) == zone.group(1)]
+        if re.search(r'zone IS NULL', params.get('where', ''), re.IGNORECASE):
+            indexes = [index for index in indexes if self._zone(index) is None]
+        if params.get('geometry'):
+            xmin, ymin, xmax, ymax = (float(coordinate) for coordinate in params['geometry'].split(','))
+            indexes = [
+                index for index in indexes
+                if self._bounds(index)[0] <= xmax and self._bounds(index)[2] >= xmin
+                and self._bounds(index)[1] <= ymax and self._bounds(index)[3] >= ymin
+            ]
+        return list(indexes)
+
+    def _distinct_values(self, indexes, params):
+        """
+        Builds the response to a returnDistinctValues query on one field, paged by resultOffset.
+
+        Args:
+            indexes (list): Zero-based indexes of the matching features.
+            params (dict): Query parameters of the request.
+
+        Returns:
+            dict: JSON response body.
+        """
+        field = params.get('outFields', 'zone')
+        values = sorted({self._feature(index)['properties'][field] for index in indexes}, key=lambda value: (value is not None, value))
+        offset = int(params.get('resultOffset', 0))
+        page = values[offset:offset + self.MAX_RECORD_COUNT]
+        return {
+            'features': [{'attributes': {field: value}} for value in page],
+            'exceededTransferLimit': offset + len(page) < len(values)
+        }
+
+    def _extent(self, indexes):
+        """
+        Computes the extent of the features at the given indexes.
+
+        Args:
+            indexes (list): Zero-based feature indexes.
+
+        Returns:
+            dict: Esri envelope, with 'NaN' coordinates if there are no features.
+        """
+        if not indexes:
+            return {'xmin': 'NaN', 'ymin': 'NaN', 'xmax': 'NaN', 'ymax': 'NaN', 'spatialReference': {'wkid': 4326}}
+        bounds = [self._bounds(index) for index in indexes]
+        return {
+            'xmin': min(bound[0] for bound in bounds),
+            'ymin': min(bound[1] for bound in bounds),
+            'xmax': max(bound[2] for bound in bounds),
+            'ymax': max(bound[3] for bound in bounds),
+            'spatialReference': {'wkid': 4326, 'latestWkid': 4326}
+        }
+
+    @staticmethod
+    def _center(index):
+        """
+        Computes the centre of the feature at the given index.
+
+        Args:
+            index (int): Zero-based feature index.
+
+        Returns:
+            tuple: (x, y) in degrees.
+        """
+        return -125 + (index % 60) + 0.5, 25 + (index // 60) % 25 + 0.5
+
+    def _bounds(self, index):
+        """
+        Computes the bounding box of the feature at the given index.
+
+        Args:
+            index (int): Zero-based feature index.
+
+        Returns:
+            tuple: (xmin, ymin, xmax, ymax) in degrees.
+        """
+        center_x, center_y = self._center(index)
+        return center_x - 0.4, center_y - 0.4, center_x + 0.4, center_y + 0.4
+
+    @staticmethod
+    def _zone(index):
+        """
+        Gets the 'zone' attribute of the feature at the given index.
+
+        Args:
+            index (int): Zero-based feature index.
+
+        Returns:
+            str: Zone name, or None for every 97th feature.
+        """
+        return None if index % 97 == 0 else f"Z{(index // 1000) % 5}"
+
+    def _feature(self, index):
+        """
+        Builds the GeoJSON feature at the given index.
+
+        Args:
+            index (int): Zero-based feature index.
+
+        Returns:
+            dict: GeoJSON feature.
+        """
+        center_x, center_y = self._center(index)
+        ring = [
+            [round(center_x + 0.4 * math.cos(2 * math.pi * i / self.vertices_per_polygon), 5),
+             round(center_y + 0.4 * math.sin(2 * math.pi * i / self.vertices_per_polygon), 5)]
+            for i in range(self.vertices_per_polygon)
+        ]
+        ring.append(ring[0])
+        return {
+            'type': 'Feature',
+            'id': index + 1,
+            'geometry': {'type': 'MultiPolygon', 'coordinates': [[ring]]},
+            'properties': {'OBJECTID': index + 1, 'value': round((index * 7919 % 1000) / 10, 1), 'zone': self._zone(index)}
+        }
+
+    def _pbf_feature_collection(self, indexes):
+        """
+        Encodes the features at the given indexes as an Esri PBF feature collection, quantized to 1e-6 degrees
+        from an upper left origin with clockwise exterior rings.
+
+        Args:
+            indexes (list): Zero-based feature indexes.
+
+        Returns:
+            bytes: Encoded FeatureCollectionPBuffer.
+        """
+        scale, left, top = 1e-6, -180.0, 90.0
+        field_list = (
+            _pbf_message(13, _pbf_message(1, b'OBJECTID') + _pbf_varint_field(2, 6))
+            + _pbf_message(13, _pbf_message(1, b'value') + _pbf_varint_field(2, 3))
+            + _pbf_message(13, _pbf_message(1, b'zone') + _pbf_varint_field(2, 4))
+        )
+        features = []
+        for index in indexes:
+            feature = self._feature(index)
+            coords = []
+            lengths = []
+            for polygon in feature['geometry']['coordinates']:
+                for ring in polygon:
+                    ring = list(reversed(ring))
+                    lengths.append(len(ring))
+                    previous_x = previous_y = 0
+                    for x, y in ring:
+                        quantized_x, quantized_y = round((x - left) / scale), round((top - y) / scale)
+                        coords.extend((quantized_x - previous_x, quantized_y - previous_y))
+                        previous_x, previous_y = quantized_x, quantized_y
+            geometry = (
+                _pbf_message(2, b''.join(_pbf_varint(length) for length in lengths))
+                + _pbf_message(3, b''.join(_pbf_varint((value << 1) ^ (value >> 63)) for value in coords))
+            )
+            attributes = (
+                _pbf_message(1, _pbf_varint_field(4, (feature['properties']['OBJECTID'] << 1)))
+                + _pbf_message(1, _pbf_key(3, 1) + struct.pack('<d', feature['properties']['value']))
+                + _pbf_message(1, _pbf_message(1, feature['properties']['zone'].encode('utf-8')) if feature['properties']['zone'] else b'')
+            )
+            features.append(_pbf_message(15, attributes + _pbf_message(2, geometry)))
+        transform = _pbf_message(12, (
+            _pbf_varint_field(1, 0)
+            + _pbf_message(2, _pbf_key(1, 1) + struct.pack('<d', scale) + _pbf_key(2, 1) + struct.pack('<d', scale))
+            + _pbf_message(3, _pbf_key(1, 1) + struct.pack('<d', left) + _pbf_key(2, 1) + struct.pack('<d', top))
+        ))
+        feature_result = (
+            _pbf_message(1, b'OBJECTID') + _pbf_varint_field(7, 3) + transform + field_list + b''.join(features)
+        )
+        return _pbf_message(2, _pbf_message(1, feature_result))
+
+def _pbf_varint(value):
+    """
+    Encodes a non-negative integer as a protobuf varint.
+
+    Args:
+        value (int): Value to encode.
+
+    Returns:
+        bytes: Encoded varint.
+    """
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+def _pbf_key(field_number, wire_type):
+    """
+    Encodes a protobuf field key.
+
+    Args:
+        field_number (int): Field number.
+        wire_type (int): Wire type.
+
+    Returns:
+        bytes: Encoded key.
+    """
+    return _pbf_varint((field_number << 3) | wire_type)
+
+def _pbf_varint_field(field_number, value):
+    """
+    Encodes a varint field.
+
+    Args:
+        field_number (int): Field number.
+        value (int): Non-negative value.
+
+    Returns:
+        bytes: Encoded field.
+    """
+    return _pbf_key(field_number, 0) + _pbf_varint(value)
+
+def _pbf_message(field_number, payload):
+    """
+    Encodes a length-delimited field.
+
+    Args:
+        field_number (int): Field number.
+        payload (bytes): Field contents.
+
+    Returns:
+        bytes: Encoded field.
+    """
+    return _pbf_key(field_number, 2) + _pbf_varint(len(payload)) + payload
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.engine.default import DefaultDialect
+from sqlalchemy.pool import StaticPool
+
+
+class RecordingCursor:
+    """DBAPI cursor that records the arguments of each execute call and returns a plan for EXPLAIN."""
+    def __init__(self, calls):
+        self.calls = calls
+        self.description = None
+        self.rowcount = -1
+        self.rows = []
+
+    def execute(self, *args):
+        self.calls.append(args)
+        if args[0].startswith('EXPLAIN'):
+            self.description = [('QUERY PLAN', None, None, None, None, None, None)]
+            self.rows = [('Seq Scan on t  (cost=0.00..1.00 rows=1 width=4) (actual time=0.01..0.01 rows=2 loops=1)',)]
+        else:
+            self.description = None
+            self.rowcount = 3
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def cursor(self):
+        return RecordingCursor(self.calls)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def recording_engine():
+    """Engine with a pyformat dialect, like psycopg2's, over a DBAPI connection that records execute calls."""
+    calls = []
+    dialect = DefaultDialect(paramstyle='pyformat', dbapi=SimpleNamespace(paramstyle='pyformat', Error=Exception))
+    engine = Engine(StaticPool(lambda: RecordingConnection(calls)), dialect, make_url('postgresql://'))
+    return engine, calls
@@ -0,0 +1,135 @@
+"""
+The PBF responses in tests/data/pbf were encoded with protoc from the .textproto files next to them, using Esri's
+FeatureCollection.proto. See the header of each .textproto for the command.
+"""
+
+import os
+
+import pytest
+import shapely
+
+from modules.infrastructure.other_ops.feature_decoders import (
+    _read_packed_varints,
+    _read_varint,
+    _zigzag,
+    decode_page,
+    pbf_features_to_rows,
+)
+
+PBF_FOLDER = os.path.join(os.path.dirname(__file__), 'data', 'pbf')
+
+POLYGON_COLUMNS = ['OBJECTID', 'name', 'area', 'depth', 'code', 'count', 'edited', 'big', 'huge', 'active', 'note', 'not_a_field', 'geometry']
+
+
+def read_pbf(name):
+    with open(os.path.join(PBF_FOLDER, f'{name}.pbf'), 'rb') as pbf_file:
+        return pbf_file.read()
+
+
+def upper_left(ring):
+    """Dequantizes a ring of the polygons response: x = -100 + qx * 0.001, y = 40 - qy * 0.001."""
+    return [(-100 + qx * 0.001, 40 - qy * 0.001) for qx, qy in ring]
+
+
+def assert_geometry(ewkb, expected, srid=4326):
+    geometry = shapely.from_wkb(ewkb)
+    assert shapely.get_srid(geometry) == srid
+    assert geometry.equals_exact(expected, tolerance=1e-9), geometry.wkt
+
+
+def test_polygon_attributes_of_each_value_type():
+    rows = pbf_features_to_rows(read_pbf('polygons_upper_left'), POLYGON_COLUMNS)
+
+    assert [row[:-1] for row in rows] == [
+        (1, 'Zone "A"; it\'s', 1.5, 2.25, -7, -9000000000, 1700000000000, -5, 18000000000000000000, True, None, None),
+        (2, '', None, None, None, None, None, None, None, False, None, None),
+        (3, 'Ünïcode', -0.25, -0.001, 7, 9000000000, 0, 5, 0, False, 'x', None),
+    ]
+    assert isinstance(rows[0][9], bool)
+    assert isinstance(rows[0][0], int)
+
+
+def test_multipart_polygon_with_hole_quantized_from_upper_left():
+    rows = pbf_features_to_rows(read_pbf('polygons_upper_left'), POLYGON_COLUMNS)
+
+    exterior = upper_left([(10, 20), (10, 10), (20, 10), (20, 20), (10, 20)])
+    hole = upper_left([(12, 18), (18, 18), (18, 12), (12, 12), (12, 18)])
+    second = upper_left([(30, 20), (30, 10), (40, 10), (40, 20), (30, 20)])
+    assert_geometry(rows[0][-1], shapely.MultiPolygon([(exterior, [hole]), (second, [])]))
+
+
+def test_null_geometry():
+    rows = pbf_features_to_rows(read_pbf('polygons_upper_left'), POLYGON_COLUMNS)
+    assert rows[1][-1] is None
+
+
+def test_unclosed_ring_is_closed():
+    rows = pbf_features_to_rows(read_pbf('polygons_upper_left'), POLYGON_COLUMNS)
+    triangle = upper_left([(0, 5), (0, 0), (5, 0), (0, 5)])
+    assert_geometry(rows[2][-1], shapely.MultiPolygon([(triangle, [])]))
+
+
+def test_points_with_z_quantized_from_lower_left():
+    rows = pbf_features_to_rows(read_pbf('points_z_lower_left'), ['OBJECTID', 'geometry', 'label'], srid=26915)
+
+    assert [(row[0], row[2]) for row in rows] == [(10, 'a'), (11, 'b'), (12, 'c')]
+    assert_geometry(rows[0][1], shapely.Point(500002, 4000003), srid=26915)
+    assert rows[1][1] is None
+    assert_geometry(rows[2][1], shapely.Point(500500, 4001000), srid=26915)
+
+
+def test_multipart_polyline_quantized_from_lower_left():
+    rows = pbf_features_to_rows(read_pbf('polylines_lower_left'), ['OBJECTID', 'geometry'])
+
+    assert [row[0] for row in rows] == [1, 2]
+    assert_geometry(rows[0][1], shapely.MultiLineString([[(-10, 20), (-9, 21), (-8, 20)], [(-5, 25), (-4, 27)]]))
+    assert_geometry(rows[1][1], shapely.MultiLineString([[(15, 20.25), (2.5, 20.5)]]))
+
+
+def test_decode_page_pbf_as_copy_lines():
+    content = read_pbf('polylines_lower_left')
+    lines, error, size = decode_page(content, ['OBJECTID', 'geometry'], 4326, 'pbf', copy_lines=True)
+
+    assert error is None
+    assert size == len(content)
+    assert [line.split(b'\t')[0] for line in lines] == [b'1', b'2']
+    assert all(line.endswith(b'\n') for line in lines)
+
+
+def test_decode_page_json_error_for_pbf_request():
+    rows, error, _ = decode_page(b'{"error": {"code": 400, "message": "Invalid query"}}', ['geometry'], 4326, 'pbf')
+    assert rows == []
+    assert error == {'code': 400, 'message': 'Invalid query'}
+
+
+def test_response_without_feature_result():
+    with pytest.raises(ValueError):
+        pbf_features_to_rows(b'\x0a\x031.0', ['geometry'])
+
+
+@pytest.mark.parametrize('encoded, value', [
+    (b'\x00', 0),
+    (b'\x7f', 127),
+    (b'\x80\x01', 128),
+    (b'\xac\x02', 300),
+    (b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\x01', 2 ** 64 - 1),
+])
+def test_read_varint(encoded, value):
+    assert _read_varint(b'\x05' + encoded, 1) == (value, len(encoded) + 1)
+
+
+def test_read_truncated_varint():
+    with pytest.raises(ValueError):
+        _read_varint(b'\x80\x80', 0)
+
+
+@pytest.mark.parametrize('encoded, value', [(0, 0), (1, -1), (2, 1), (3, -2), (4294967294, 2147483647), (4294967295, -2147483648)])
+def test_zigzag(encoded, value):
+    assert _zigzag(encoded) == value
+
+
+def test_read_packed_varints():
+    content = b'\x01\x96\x01\x00\xac\x02'
+    assert _read_packed_varints(content, 0, len(content)) == [1, 150, 0, 300]
+    with pytest.raises(ValueError):
+        _read_packed_varints(content, 0, 2)
@@ -0,0 +1,79 @@
+import shapely
+
+from modules.data_management.sql_utils.sql_ops import geojson_features_to_rows, geojson_geometries_to_ewkb
+
+
+def _wkt(ewkb_values):
+    return [None if value is None else shapely.from_wkb(value).wkt for value in ewkb_values]
+
+
+def test_empty_geometries_become_empty_ewkb():
+    geometries = [
+        {'type': 'Point', 'coordinates': []},
+        {'type': 'LineString', 'coordinates': []},
+        {'type': 'Polygon', 'coordinates': []},
+        {'type': 'MultiPoint', 'coordinates': []},
+        {'type': 'MultiLineString', 'coordinates': []},
+        {'type': 'MultiPolygon', 'coordinates': []},
+    ]
+    assert _wkt(geojson_geometries_to_ewkb(geometries)) == [
+        'POINT EMPTY', 'LINESTRING EMPTY', 'POLYGON EMPTY',
+        'MULTIPOINT EMPTY', 'MULTILINESTRING EMPTY', 'MULTIPOLYGON EMPTY',
+    ]
+
+
+def test_empty_geometries_mixed_with_others_of_their_type():
+    square = [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+    geometries = [
+        {'type': 'Point', 'coordinates': [1, 2]},
+        {'type': 'Point', 'coordinates': []},
+        {'type': 'Polygon', 'coordinates': []},
+        {'type': 'Polygon', 'coordinates': square},
+        {'type': 'MultiPolygon', 'coordinates': [square]},
+        {'type': 'MultiPolygon', 'coordinates': []},
+        None,
+    ]
+    assert _wkt(geojson_geometries_to_ewkb(geometries)) == [
+        'POINT (1 2)',
+        'POINT EMPTY',
+        'POLYGON EMPTY',
+        'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))',
+        'MULTIPOLYGON (((0 0, 1 0, 1 1, 0 1, 0 0)))',
+        'MULTIPOLYGON EMPTY',
+        None,
+    ]
+
+
+def test_multi_geometries_of_only_empty_parts():
+    geometries = [
+        {'type': 'MultiPolygon', 'coordinates': [[]]},
+        {'type': 'MultiLineString', 'coordinates': [[]]},
+    ]
+    wkb_values = geojson_geometries_to_ewkb(geometries)
+    assert all(shapely.from_wkb(value).is_empty for value in wkb_values)
+
+
+def test_ewkb_embeds_srid():
+    wkb_value = geojson_geometries_to_ewkb([{'type': 'Point', 'coordinates': []}], srid=3857)[0]
+    assert shapely.get_srid(shapely.from_wkb(wkb_value)) == 3857
+
+
+def test_features_to_rows_with_empty_geometry():
+    features = [{'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': []}, 'properties': {'name': 'a'}}]
+    rows = geojson_features_to_rows(features, ['name', 'geometry'])
+    assert rows[0][0] == 'a'
+    assert shapely.from_wkb(rows[0][1]).wkt == 'POLYGON EMPTY'
+
+
+def test_empty_parts_are_dropped():
+    square = [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+    geometries = [
+        {'type': 'MultiPolygon', 'coordinates': [[], square]},
+        {'type': 'MultiLineString', 'coordinates': [[], [[0, 0], [1, 1]]]},
+        {'type': 'Polygon', 'coordinates': [square[0], []]},
+    ]
+    assert _wkt(geojson_geometries_to_ewkb(geometries)) == [
+        'MULTIPOLYGON (((0 0, 1 0, 1 1, 0 1, 0 0)))',
+        'MULTILINESTRING ((0 0, 1 1))',
+        'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))',
+    ]
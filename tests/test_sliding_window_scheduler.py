@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from modules.infrastructure.other_ops.arcgis_operations import SlidingWindowScheduler
+
+
+def run_with_timeout(scheduler, tasks, timeout=10):
+    """Consumes scheduler.run(tasks) on a separate thread so a hang fails the test instead of blocking it."""
+    results = []
+    errors = []
+
+    def consume():
+        try:
+            results.extend(scheduler.run(tasks))
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f'scheduler hung after {len(results)} results'
+    if errors:
+        raise errors[0]
+    return results
+
+
+@pytest.mark.parametrize('trial', range(20))
+def test_instant_worker_does_not_deadlock(trial):
+    scheduler = SlidingWindowScheduler(lambda task: task, max_in_flight=4)
+    results = run_with_timeout(scheduler, range(20))
+    assert sorted(results) == [(task, task) for task in range(20)]
+
+
+def test_long_run_of_instant_tasks():
+    scheduler = SlidingWindowScheduler(lambda task: task * 2, max_in_flight=2, results_queue_size=1)
+    results = run_with_timeout(scheduler, range(5000))
+    assert sorted(result for _, result in results) == [task * 2 for task in range(5000)]
+
+
+def test_in_flight_limit_and_backpressure():
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def worker(task):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.005)
+        with lock:
+            running[0] -= 1
+        return task
+
+    scheduler = SlidingWindowScheduler(worker, max_in_flight=3, results_queue_size=1, max_workers=6)
+    consumed = 0
+    for _ in scheduler.run(range(30)):
+        consumed += 1
+        time.sleep(0.01)
+    assert consumed == 30
+    assert running[1] <= 3
+
+
+def test_set_max_in_flight_is_capped_at_max_workers():
+    scheduler = SlidingWindowScheduler(lambda task: task, max_in_flight=2, max_workers=4)
+    results = []
+    for task, result in scheduler.run(range(10)):
+        scheduler.set_max_in_flight(10)
+        results.append(result)
+    assert scheduler.max_in_flight == 4
+    assert sorted(results) == list(range(10))
+
+
+def test_worker_exception_is_raised_to_consumer():
+    def worker(task):
+        if task == 3:
+            raise ValueError('bad page')
+        return task
+
+    with pytest.raises(ValueError, match='bad page'):
+        run_with_timeout(SlidingWindowScheduler(worker, max_in_flight=2), range(10))
+
+
+def test_consumer_stopping_early_releases_blocked_workers():
+    scheduler = SlidingWindowScheduler(lambda task: task, max_in_flight=4, results_queue_size=1)
+
+    def consume_one():
+        for _ in scheduler.run(range(100)):
+            break
+
+    thread = threading.Thread(target=consume_one, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
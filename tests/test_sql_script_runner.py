@@ -0,0 +1,111 @@
+import pytest
+
+from modules.data_management.sql_utils.sql_script_runner import _EXPLAINABLE, SqlScriptRunner, split_sql_statements
+
+
+def test_splits_at_semicolons_and_drops_empty_statements():
+    assert split_sql_statements("SELECT 1;\n\n;SELECT 2;  ") == ['SELECT 1', 'SELECT 2']
+
+
+def test_semicolons_in_string_literals_and_identifiers():
+    script = """SELECT 'a;b', 'it''s;' FROM "odd;name"; SELECT 2"""
+    assert split_sql_statements(script) == ["""SELECT 'a;b', 'it''s;' FROM "odd;name\"""", 'SELECT 2']
+
+
+def test_escape_string_literals():
+    script = r"SELECT E'don\'t;', e'\\'; SELECT 'plain\'; SELECT 3"
+    assert split_sql_statements(script) == [r"SELECT E'don\'t;', e'\\'", r"SELECT 'plain\'", 'SELECT 3']
+
+
+def test_identifier_ending_in_e_is_not_an_escape_string():
+    script = r"SELECT name'\'; SELECT 2"
+    assert split_sql_statements(script) == [r"SELECT name'\'", 'SELECT 2']
+
+
+def test_dollar_quoted_bodies():
+    script = (
+        "DO $$ BEGIN PERFORM 1; END $$;\n"
+        "DO $body$ BEGIN RAISE NOTICE '$$;'; END $body$;\n"
+        "SELECT $a$ x; $b$ y; $b$ $a$"
+    )
+    assert split_sql_statements(script) == [
+        'DO $$ BEGIN PERFORM 1; END $$',
+        "DO $body$ BEGIN RAISE NOTICE '$$;'; END $body$",
+        'SELECT $a$ x; $b$ y; $b$ $a$',
+    ]
+
+
+def test_positional_parameters_are_not_dollar_quotes():
+    script = "PREPARE p AS SELECT $1 + $2; EXECUTE p(1, 2); SELECT col$1$ FROM t"
+    assert split_sql_statements(script) == ['PREPARE p AS SELECT $1 + $2', 'EXECUTE p(1, 2)', 'SELECT col$1$ FROM t']
+
+
+def test_comments_are_removed():
+    script = (
+        "SELECT 1; -- trailing; comment\n"
+        "/* block; /* nested; */ still comment; */ SELECT 2;\n"
+        "SELECT '-- not a comment', '/* nor this */'"
+    )
+    assert split_sql_statements(script) == ['SELECT 1', 'SELECT 2', "SELECT '-- not a comment', '/* nor this */'"]
+
+
+@pytest.mark.parametrize('script', ["SELECT 'open", 'SELECT "open', 'DO $x$ BEGIN END', 'SELECT 1 /* /* */'])
+def test_unterminated_text_raises(script):
+    with pytest.raises(ValueError):
+        split_sql_statements(script)
+
+
+@pytest.mark.parametrize('statement', [
+    'SELECT 1',
+    'with t AS (SELECT 1) SELECT * FROM t',
+    'INSERT INTO t SELECT 1',
+    'UPDATE t SET a = 1',
+    'DELETE FROM t',
+    'CREATE TABLE t AS SELECT 1',
+    'CREATE TABLE t(a, b) AS SELECT 1, 2',
+    'CREATE TABLE IF NOT EXISTS public.t (a) AS (SELECT 1)',
+    'CREATE UNLOGGED TABLE "My Table" AS\nWITH x AS (SELECT 1) SELECT * FROM x',
+    'CREATE TEMP TABLE t ON COMMIT DROP AS SELECT 1',
+    'CREATE TABLE t WITH (fillfactor=70) TABLESPACE fast AS TABLE s',
+    'CREATE MATERIALIZED VIEW v AS SELECT 1',
+    'CREATE MATERIALIZED VIEW IF NOT EXISTS s.v (a) AS VALUES (1)',
+])
+def test_explainable_statements(statement):
+    assert _EXPLAINABLE.match(statement)
+
+
+@pytest.mark.parametrize('statement', [
+    'CREATE TABLE t (a int, b int GENERATED ALWAYS AS (a * 2) STORED)',
+    'CREATE TABLE t (a int DEFAULT 1) PARTITION BY RANGE (a)',
+    'CREATE TABLE tAS SELECT 1',
+    'CREATE INDEX idx ON t (a)',
+    'CREATE VIEW v AS SELECT 1',
+    'ALTER TABLE t ADD COLUMN b int',
+    'DROP TABLE IF EXISTS t',
+    'ANALYZE t',
+    'DO $$ BEGIN END $$',
+    'SELECTED',
+])
+def test_statements_explain_rejects(statement):
+    assert not _EXPLAINABLE.match(statement)
+
+
+PERCENT_SCRIPT = "UPDATE t SET a = format('%I.%s', b, c) WHERE d LIKE 'x%'; DO $$ BEGIN RAISE NOTICE 'done %', 1; END $$"
+
+
+def test_statements_are_executed_without_parameters(recording_engine):
+    engine, calls = recording_engine
+    runner = SqlScriptRunner(engine)
+    assert runner.run(PERCENT_SCRIPT, 'percent script')
+    assert calls == [(statement,) for statement in split_sql_statements(PERCENT_SCRIPT)]
+    assert runner.results[0].rows == 3
+
+
+def test_explained_statements_are_executed_without_parameters(recording_engine):
+    engine, calls = recording_engine
+    runner = SqlScriptRunner(engine, explain_threshold_seconds=0)
+    assert runner.run(PERCENT_SCRIPT, 'percent script')
+    statements = split_sql_statements(PERCENT_SCRIPT)
+    assert calls == [(f"EXPLAIN (ANALYZE, BUFFERS) {statements[0]}",), (statements[1],)]
+    assert runner.results[0].rows == 2
+    assert runner.results[0].plan is not None
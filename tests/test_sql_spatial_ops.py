@@ -0,0 +1,40 @@
+import pytest
+
+from modules.data_management.sql_utils.sql_script_runner import SqlScriptRunner, split_sql_statements
+from modules.data_management.sql_utils.sql_spatial_ops import subdivision_sql
+
+
+def test_subdivision_script_is_a_do_block_and_analyze():
+    statements = split_sql_statements(subdivision_sql('hand', max_vertices=64))
+
+    assert len(statements) == 2
+    assert statements[0].startswith('DO $subdivide$')
+    assert statements[0].endswith('$subdivide$')
+    assert "to_regclass('hand')" in statements[0]
+    assert 'ST_Subdivide(%3$I, 64)' in statements[0]
+    assert "'idx_hand_geometry_transformed'" in statements[0]
+    assert statements[1] == 'ANALYZE hand'
+
+
+def test_subdivision_script_for_a_schema_qualified_table():
+    statements = split_sql_statements(subdivision_sql('hazards.hand', geometry_column='geom', id_column='gid'))
+
+    assert len(statements) == 2
+    assert "to_regclass('hazards.hand')" in statements[0]
+    assert "attname = 'gid'" in statements[0]
+    assert "'idx_hazards_hand_geom'" in statements[0]
+    assert statements[1] == 'ANALYZE hazards.hand'
+
+
+def test_subdivision_script_runs_without_parameters(recording_engine):
+    engine, calls = recording_engine
+    script = subdivision_sql('drought_seasonal')
+
+    assert SqlScriptRunner(engine).run(script, 'subdivide drought_seasonal')
+    assert calls == [(statement,) for statement in split_sql_statements(script)]
+
+
+@pytest.mark.parametrize('max_vertices', [4, 0, '3'])
+def test_subdivision_rejects_too_few_vertices(max_vertices):
+    with pytest.raises(ValueError):
+        subdivision_sql('hand', max_vertices=max_vertices)